@@ -0,0 +1,104 @@
+"""
+Benchmark: letture del Knowledge Graph via SQLite vs mirror in RAM.
+
+Popola un GraphDB temporaneo con un grafo sintetico e misura le letture usate da CLAM
+(renderer, lookup di entità, telemetria, traversata GraphRAG) nei due percorsi.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.graph_mirror_bench --triples 50000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from clam.config import CONFIG
+from clam.core.models import LogicalTriple
+from clam.memory.graph_db import GraphDB
+
+PREDICATES = ["ha_conosciuto", "vive_a", "ha_hobby", "ama", "ha_visitato", "usa_tecnologia", "fatto_generico"]
+
+
+async def populate(gdb: GraphDB, n_triples: int, n_entities: int) -> None:
+    rng = random.Random(42)
+    entities = ["Utente", "CLAM"] + [f"Entità {i}" for i in range(n_entities)]
+    async with gdb.batch():
+        for _ in range(n_triples):
+            # Distribuzione sbilanciata: pochi hub (Utente, CLAM) e una coda lunga di entità
+            subject = entities[min(int(rng.expovariate(0.05)), len(entities) - 1)]
+            await gdb.add_triple(LogicalTriple(
+                subject=subject,
+                predicate=rng.choice(PREDICATES),
+                object_=rng.choice(entities),
+                confidence=rng.randint(1, 5),
+            ))
+
+
+async def measure(label: str, fn: Callable[[], Awaitable[object]], repeat: int) -> float:
+    await fn()  # warm-up
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def run(n_triples: int, n_entities: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        CONFIG.memory.long_term.graph_db = os.path.join(tmp, "bench_graph.sqlite")
+        CONFIG.memory.graph.mirror = False
+        gdb = GraphDB()
+        await gdb.connect()
+        print(f"[Bench] Popolamento: {n_triples} triple su {n_entities} entità...")
+        await populate(gdb, n_triples, n_entities)
+        await gdb.disconnect()
+
+        workloads: Dict[str, Callable[[GraphDB], Callable[[], Awaitable[object]]]] = {
+            "get_all_triples": lambda g: g.get_all_triples,
+            "count_triples": lambda g: g.count_triples,
+            "telemetry (50, projected)": lambda g: lambda: g.query_triples(
+                columns=["subject", "predicate", "object_"], limit=50),
+            "query (predicate, min_conf)": lambda g: lambda: g.query_triples(predicate="ama", min_confidence=4),
+            "entity exact (Utente)": lambda g: lambda: g.get_triples_by_entity("Utente"),
+            "entity prefix ('entità 1')": lambda g: lambda: g.get_triples_by_entity("entità 1", match="prefix"),
+            "find_entities_in_text": lambda g: lambda: g.find_entities_in_text(
+                "Ieri ho parlato con Entità 12 e Entità 7 di CLAM"),
+            "traverse (depth 2)": lambda g: lambda: g.traverse(["Utente", "CLAM"]),
+        }
+
+        results: Dict[str, Dict[str, float]] = {}
+        for mirror in (False, True):
+            CONFIG.memory.graph.mirror = mirror
+            gdb = GraphDB()
+            start = time.perf_counter()
+            await gdb.connect()
+            connect_ms = (time.perf_counter() - start) * 1000
+            path = "mirror" if mirror else "sqlite"
+            results.setdefault("connect", {})[path] = connect_ms
+            for name, factory in workloads.items():
+                results.setdefault(name, {})[path] = await measure(name, factory(gdb), repeat)
+            await gdb.disconnect()
+
+        print(f"\n{'workload':<30} {'sqlite ms':>12} {'mirror ms':>12} {'speedup':>10}")
+        for name, row in results.items():
+            speedup = row["sqlite"] / row["mirror"] if row["mirror"] else float("inf")
+            print(f"{name:<30} {row['sqlite']:>12.3f} {row['mirror']:>12.3f} {speedup:>9.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GraphDB: SQLite vs mirror in RAM")
+    parser.add_argument("--triples", type=int, default=20000)
+    parser.add_argument("--entities", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.triples, args.entities, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
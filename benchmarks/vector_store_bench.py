@@ -0,0 +1,150 @@
+"""
+Benchmark: backend vettoriali della LTM (ChromaDB vs nativo memmap + NumPy/HNSW).
+
+Per ogni provider, in processi separati (così avvio e RSS non si sporcano a vicenda):
+  1. popolamento della collezione semantica con vettori casuali (non misurato nel confronto);
+  2. avvio a freddo: import del modulo + LongTermMemory() + connect();
+  3. latenza mediana/p95 delle query top-k;
+  4. RSS del processo dopo le query.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.vector_store_bench --vectors 20000 --dim 384 --queries 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+PROVIDERS = ("chromadb", "native")
+
+
+def _rss_mb() -> float:
+    """RSS corrente (Linux: /proc), altrimenti il picco riportato da getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _configure(provider: str, workdir: str) -> None:
+    from clam.config import CONFIG
+    settings = CONFIG.memory.long_term
+    settings.provider = provider
+    settings.path = os.path.join(workdir, provider)
+    settings.lexical_index_path = os.path.join(workdir, f"{provider}_lexical.sqlite")
+    settings.recency_index_path = os.path.join(workdir, f"{provider}_recency.sqlite")
+    settings.link_index_path = os.path.join(workdir, f"{provider}_links.sqlite")
+    settings.embedding_cache_path = None
+
+
+async def _populate(provider: str, workdir: str, vectors: int, dim: int) -> None:
+    import numpy as np
+    _configure(provider, workdir)
+    from clam.core.models import VectorDBNode
+    from clam.memory.long_term import LongTermMemory
+
+    rng = np.random.default_rng(42)
+    ltm = LongTermMemory()
+    await ltm.connect()
+    step = 5000
+    for start in range(0, vectors, step):
+        count = min(step, vectors - start)
+        nodes = [
+            VectorDBNode(id_concetto=f"fact-{i}", descrizione=f"Fatto sintetico numero {i}", metadata={"n": i})
+            for i in range(start, start + count)
+        ]
+        await ltm.add_nodes("semantic", nodes, embeddings=rng.standard_normal((count, dim), dtype=np.float32))
+    ltm.close()
+
+
+async def _measure(provider: str, workdir: str, dim: int, queries: int, top_k: int) -> Dict[str, float]:
+    start = time.perf_counter()
+    _configure(provider, workdir)
+    from clam.memory.long_term import LongTermMemory
+    ltm = LongTermMemory()
+    await ltm.connect()
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    import numpy as np
+    rng = np.random.default_rng(7)
+    timings: List[float] = []
+    for _ in range(queries):
+        vector = rng.standard_normal(dim, dtype=np.float32)
+        t0 = time.perf_counter()
+        ltm.store.query("semantic", [vector], n_results=top_k)
+        timings.append((time.perf_counter() - t0) * 1000)
+    # La prima query paga le inizializzazioni pigre (norme, caricamento dei segmenti di Chroma)
+    first_query_ms = timings[0]
+    timings.sort()
+    result = {
+        "startup_ms": startup_ms,
+        "first_query_ms": first_query_ms,
+        "query_p50_ms": statistics.median(timings),
+        "query_p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "rss_mb": _rss_mb(),
+        "count": await ltm.count("semantic"),
+    }
+    ltm.close()
+    return result
+
+
+def _child(args: argparse.Namespace) -> None:
+    if args.phase == "populate":
+        asyncio.run(_populate(args.provider, args.workdir, args.vectors, args.dim))
+    else:
+        print(json.dumps(asyncio.run(_measure(args.provider, args.workdir, args.dim, args.queries, args.top_k))))
+
+
+def _spawn(phase: str, provider: str, workdir: str, args: argparse.Namespace) -> str:
+    cmd = [
+        sys.executable, "-m", "benchmarks.vector_store_bench", "--phase", phase, "--provider", provider,
+        "--workdir", workdir, "--vectors", str(args.vectors), "--dim", str(args.dim),
+        "--queries", str(args.queries), "--top-k", str(args.top_k),
+    ]
+    return subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LTM: ChromaDB vs backend nativo")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--providers", default=",".join(PROVIDERS))
+    # Interni: fasi eseguite nei processi figli
+    parser.add_argument("--phase", choices=["populate", "measure"], help=argparse.SUPPRESS)
+    parser.add_argument("--provider", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        _child(args)
+        return
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for provider in args.providers.split(","):
+            print(f"[Bench] {provider}: popolamento di {args.vectors} vettori da {args.dim} dimensioni...")
+            _spawn("populate", provider, workdir, args)
+            results[provider] = json.loads(_spawn("measure", provider, workdir, args).strip().splitlines()[-1])
+
+    metrics = ["startup_ms", "first_query_ms", "query_p50_ms", "query_p95_ms", "rss_mb"]
+    print(f"\n{'provider':<12}" + "".join(f"{m:>16}" for m in metrics))
+    for provider, row in results.items():
+        print(f"{provider:<12}" + "".join(f"{row[m]:>16.2f}" for m in metrics))
+
+
+if __name__ == "__main__":
+    main()
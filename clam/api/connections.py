@@ -0,0 +1,280 @@
+"""
+Connessioni WebSocket della dashboard: una coda di uscita limitata e un writer per client.
+
+Prima `broadcast` attendeva `send_json` client per client: una scheda del browser lenta o
+bloccata rallentava tutti gli altri (e i motori che pubblicano telemetria). Ora:
+
+- ogni messaggio viene serializzato una volta sola e la stessa stringa JSON finisce nella coda
+  di ogni destinatario; `broadcast`/`send` non attendono mai la rete;
+- un task writer per client svuota la sua coda, con un timeout sul singolo invio;
+- a coda piena si libera spazio per classe di messaggio:
+    * console_log: il più vecchio in coda viene scartato (log best-effort);
+    * telemetria (snapshot/delta di un topic): i messaggi in coda del topic vengono buttati e al
+      client si rimanda uno snapshot fresco (resync); uno snapshot sostituisce sempre quelli
+      vecchi dello stesso topic ancora in coda;
+    * altri messaggi (e gli snapshot, al più uno per topic): mai scartati, anche oltre il limite;
+- un client che non svuota la coda (il messaggio più vecchio in attesa da oltre
+  ws_max_lag_seconds) o con un invio bloccato oltre ws_send_timeout_seconds viene disconnesso.
+
+`get_stats()` riporta per client il ritardo (età del più vecchio messaggio in coda), la coda
+e i contatori di messaggi inviati, scartati e fusi.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional
+
+from fastapi import WebSocket
+
+from clam.config import CONFIG
+
+# Codice di chiusura per i client troppo lenti (RFC 6455: "Try Again Later")
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class Outbound(NamedTuple):
+    """Messaggio in coda: classe (per le politiche di scarto), topic, JSON già serializzato, istante di accodamento."""
+    kind: str          # "console" | "snapshot" | "delta" | "control"
+    topic: Optional[str]
+    payload: str
+    enqueued_at: float
+
+
+TELEMETRY_KINDS = ("snapshot", "delta")
+
+
+def classify(message: dict) -> tuple:
+    kind = message.get("type")
+    if kind == "console_log":
+        return "console", None
+    if kind in TELEMETRY_KINDS:
+        return kind, message.get("topic")
+    return "control", None
+
+
+class ClientConnection:
+    """Un client WebSocket: iscrizioni ai topic, coda di uscita e task writer."""
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        client = websocket.client
+        self.name = f"{client.host}:{client.port}" if client else "?"
+        self.connected_at = datetime.now(timezone.utc).isoformat()
+        self.topics: set[str] = set()
+        self.queue: Deque[Outbound] = deque()
+        self.queued_bytes = 0
+        # Topic per cui è stato chiesto uno snapshot: i delta nel frattempo sono inutili
+        self.resyncing: set[str] = set()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    @property
+    def lag_seconds(self) -> float:
+        """Età del messaggio più vecchio in attesa (0 = coda vuota)."""
+        return time.monotonic() - self.queue[0].enqueued_at if self.queue else 0.0
+
+    def _remove_topic(self, topic: Optional[str]) -> int:
+        """Toglie dalla coda la telemetria di un topic. Restituisce quanti messaggi ha rimosso."""
+        kept = deque(item for item in self.queue if not (item.kind in TELEMETRY_KINDS and item.topic == topic))
+        removed = len(self.queue) - len(kept)
+        if removed:
+            self.queue = kept
+            self.queued_bytes = sum(len(item.payload) for item in kept)
+        return removed
+
+    def enqueue(self, item: Outbound) -> None:
+        if self.closed:
+            return
+        if item.kind == "snapshot":
+            self.coalesced += self._remove_topic(item.topic)
+            self.resyncing.discard(item.topic)
+        elif item.kind == "delta" and item.topic in self.resyncing:
+            self.coalesced += 1
+            return
+        if len(self.queue) >= self.manager.queue_size and not self._make_room(item):
+            return
+        self.queue.append(item)
+        self.queued_bytes += len(item.payload)
+        self._ready.set()
+        if self.lag_seconds > self.manager.max_lag:
+            self.manager.drop_slow(self, f"ritardo {self.lag_seconds:.1f} s")
+
+    def _make_room(self, item: Outbound) -> bool:
+        """Coda piena: libera spazio secondo la classe dei messaggi. False = `item` non va accodato."""
+        for index, queued in enumerate(self.queue):
+            if queued.kind == "console":
+                del self.queue[index]
+                self.queued_bytes -= len(queued.payload)
+                self.dropped += 1
+                return True
+        if item.kind == "console":
+            self.dropped += 1
+            return False
+        if item.kind == "snapshot":
+            # Ha già sostituito la telemetria del suo topic: al più uno per topic oltre il limite
+            return True
+        if item.kind == "delta":
+            # Il client è indietro su questo topic: via i messaggi in coda, al loro posto uno snapshot
+            self.coalesced += self._remove_topic(item.topic) + 1
+            if item.topic not in self.resyncing:
+                self.resyncing.add(item.topic)
+                self.resyncs += 1
+                self.manager.request_resync(self.websocket, item.topic)
+            return False
+        return True
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                item = self.queue.popleft()
+                self.queued_bytes -= len(item.payload)
+                self.max_lag_ms = max(self.max_lag_ms, (time.monotonic() - item.enqueued_at) * 1000)
+                await asyncio.wait_for(self.websocket.send_text(item.payload), self.manager.send_timeout)
+                self.sent += 1
+                self.sent_bytes += len(item.payload)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.manager.drop_slow(self, f"invio bloccato da oltre {self.manager.send_timeout:g} s")
+        except Exception:
+            self.manager.disconnect(self.websocket)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+        self.queue.clear()
+        self.queued_bytes = 0
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def get_stats(self) -> dict:
+        return {
+            "client": self.name,
+            "connected_at": self.connected_at,
+            "topics": sorted(self.topics),
+            "queued": len(self.queue),
+            "queued_bytes": self.queued_bytes,
+            "lag_ms": round(self.lag_seconds * 1000, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "sent": self.sent,
+            "sent_bytes": self.sent_bytes,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "resyncs": self.resyncs,
+        }
+
+
+class ConnectionManager:
+    """
+    Gestisce l'elenco delle connessioni WebSocket attive per fare PUSH statelet al frontend Vis.js.
+    Ogni client è iscritto a un insieme di topic di telemetria ('stm', 'ltm', 'graph').
+    """
+
+    def __init__(self):
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.queue_size = CONFIG.api.ws_queue_size
+        self.send_timeout = CONFIG.api.ws_send_timeout_seconds
+        self.max_lag = CONFIG.api.ws_max_lag_seconds
+        # Chiamato quando un client perde messaggi di telemetria: deve ricevere uno snapshot del topic
+        self.resync_handler: Optional[Callable[[WebSocket, List[str]], None]] = None
+        self.slow_disconnects = 0
+        self.serialized = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = ClientConnection(websocket, self)
+        self.clients[websocket] = client
+        client.start()
+        print(f"[WebSocket] Nuovo client frontend connesso. Totale: {len(self.clients)}")
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None and not client.closed:
+            asyncio.get_running_loop().create_task(client.close())
+
+    def drop_slow(self, client: ClientConnection, reason: str) -> None:
+        """Disconnette un consumer persistentemente lento: gli altri client non ne risentono comunque."""
+        if self.clients.pop(client.websocket, None) is None:
+            return
+        self.slow_disconnects += 1
+        queued = len(client.queue)
+        asyncio.get_running_loop().create_task(client.close(SLOW_CLIENT_CLOSE_CODE))
+        print(f"[WebSocket] 🐢 Client {client.name} disconnesso: troppo lento ({reason}, {queued} messaggi in coda)")
+
+    def request_resync(self, websocket: WebSocket, topic: str) -> None:
+        if self.resync_handler is not None:
+            self.resync_handler(websocket, [topic])
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.topics.update(topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.topics.difference_update(topics)
+
+    def topics_of(self, websocket: WebSocket) -> set[str]:
+        client = self.clients.get(websocket)
+        return client.topics if client is not None else set()
+
+    def subscribers(self, topic: str) -> List[WebSocket]:
+        return [ws for ws, client in self.clients.items() if topic in client.topics]
+
+    def _outbound(self, message: dict) -> Outbound:
+        kind, topic = classify(message)
+        self.serialized += 1
+        return Outbound(kind, topic, json.dumps(message, ensure_ascii=False), time.monotonic())
+
+    def send(self, websocket: WebSocket, message: dict):
+        """Accoda un messaggio per un solo client (non attende l'invio)."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(self._outbound(message))
+
+    def broadcast(self, message: dict, topic: Optional[str] = None):
+        """
+        Accoda un messaggio per tutti i client (topic=None, es. console_log) o solo per gli iscritti
+        al topic. Serializzato una volta, la stessa stringa va in ogni coda; non attende la rete.
+        """
+        targets = list(self.clients.values())
+        if topic is not None:
+            targets = [client for client in targets if topic in client.topics]
+        if not targets:
+            return
+        item = self._outbound(message)
+        for client in targets:
+            client.enqueue(item)
+
+    def get_stats(self) -> dict:
+        return {
+            "clients": [client.get_stats() for client in self.clients.values()],
+            "queue_size": self.queue_size,
+            "serialized_messages": self.serialized,
+            "slow_disconnects": self.slow_disconnects,
+        }
@@ -1,11 +1,13 @@
 import asyncio
 import os
+from datetime import datetime, timezone
 import yaml
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import uvicorn
 from contextlib import asynccontextmanager
 
@@ -14,13 +16,21 @@ from clam.llm.ollama_client import OllamaClient
 from clam.memory.short_term import ShortTermBuffer
 from clam.memory.long_term import LongTermMemory
 from clam.memory.graph_db import GraphDB
+from clam.memory.change_feed import ChangeFeedGap
+from clam.memory.episodic import EpisodeWriter, window
+from clam.memory.bulk_io import ALL_SECTIONS, export_ndjson, import_ndjson, iter_lines
 from clam.engines.inference import InferenceEngine
 from clam.engines.critic import CriticEngine
 from clam.engines.gc import GarbageCollector
+from clam.engines.consolidation import ConsolidationEngine
+from clam.engines.episodic_compactor import EpisodicCompactor
 from clam.core.agent import ClamAgent
 from clam.core.models import LogicalTriple
 from clam.core.knowledge_renderer import KnowledgeRenderer
 from clam.core.knowledge_schema import normalize_predicate
+from clam.core.metrics import LoopLagMonitor
+from clam.api.connections import ConnectionManager
+from clam.api.telemetry import TOPICS, TelemetryHub, parse_topics
 
 # Iniziamo lo state globale
 stm = ShortTermBuffer()
@@ -31,34 +41,21 @@ llm = OllamaClient()
 inference_engine = InferenceEngine(llm, stm, ltm, gdb)
 critic_engine = CriticEngine(llm, stm)
 gc_engine = GarbageCollector(stm, ltm)
-agent = ClamAgent(llm, stm, ltm, gdb)
+episode_writer = EpisodeWriter(ltm) if CONFIG.memory.episodic.enabled else None
+episodic_compactor = EpisodicCompactor(llm, ltm)
+consolidation_engine = ConsolidationEngine(llm, ltm)
+agent = ClamAgent(llm, stm, ltm, gdb, episodes=episode_writer)
 knowledge_renderer = KnowledgeRenderer()
+loop_monitor = LoopLagMonitor(
+    CONFIG.api.loop_monitor_interval_ms / 1000, CONFIG.api.loop_stall_threshold_ms / 1000
+)
 
 # Path al file seed (relativo alla root del progetto)
 _PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 _SEED_FILE_PATH = os.path.join(_PROJECT_ROOT, "seed_truths.yaml")
 
-class ConnectionManager:
-    """Gestisce l'elenco delle connessioni WebSocket attive per fare PUSH statelet al frontend Vis.js"""
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"[WebSocket] Nuovo client frontend connesso. Totale: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in list(self.active_connections):
-            try:
-                await connection.send_json(message)
-            except Exception:
-                self.disconnect(connection)
-
 manager = ConnectionManager()
+telemetry = TelemetryHub(manager, stm, ltm, gdb)
 
 import sys
 class WSTerminal:
@@ -71,8 +68,9 @@ class WSTerminal:
         self.original_stdout.write(message)
         if message.strip():
             try:
-                loop = asyncio.get_running_loop()
-                loop.create_task(self.manager.broadcast({"type": "console_log", "message": message.strip()}))
+                asyncio.get_running_loop()  # Solo dal thread dell'event loop (non dai thread del pool)
+                # Solo accodamento: nessun task per riga di log, nessuna attesa sui client lenti
+                self.manager.broadcast({"type": "console_log", "message": message.strip()})
             except RuntimeError:
                 pass
 
@@ -91,23 +89,11 @@ async def background_loop():
     while True:
         try:
             await asyncio.sleep(15)  # Background loop: 15s
-            
-            # 1. Telemetria Visiva (Dashboard) — sempre attiva, non chiama l'LLM
-            nodes = await stm.get_all_nodes()
-            ltm_data = await ltm.get_recent_semantic(limit=50)
-            triples = await gdb.get_all_triples()
-            
-            await manager.broadcast({
-                "type": "telemetry",
-                "stm_count": len(nodes),
-                "nodes": [n.model_dump() for n in nodes],
-                "ltm_count": len(ltm_data.get("ids", [])),
-                "ltm_data": ltm_data,
-                "graph_count": len(triples),
-                "triples": [t.model_dump() for t in triples]
-            })
-            
-            # 2. Motori iterativi — SOLO se l'utente NON sta aspettando una risposta
+
+            # La telemetria della dashboard non passa più di qui: TelemetryHub invia delta
+            # dai change feed degli store, solo quando qualcosa cambia (clam/api/telemetry.py).
+
+            # Motori iterativi — SOLO se l'utente NON sta aspettando una risposta
             if not _user_request_active:
                 # NOTA: Critic DISABILITATO — con qwen2.5:3b dice SEMPRE "Esito Negativo"
                 # e blocca Ollama ogni 15s impedendo le risposte all'utente.
@@ -115,6 +101,9 @@ async def background_loop():
                 # Riabilitare con un modello più grande (es. qwen3:8b).
                 # await critic_engine.run_scan()
                 await gc_engine.cycle()
+                if episode_writer is not None:
+                    await episodic_compactor.cycle()
+                await consolidation_engine.maybe_run()
             else:
                 print("[Core Loop] Motori in pausa — richiesta utente in corso...")
             
@@ -123,6 +112,20 @@ async def background_loop():
         except Exception as e:
             print(f"[Core Loop Error] Impossibile completare il ciclo asincrono: {e}")
 
+async def stm_snapshot_loop():
+    """Warm restart: salva periodicamente lo scratchpad su disco (solo se è cambiato)."""
+    interval = CONFIG.memory.short_term.snapshot_interval_seconds
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            report = await stm.snapshot()
+            if report:
+                print(f"[STM Snapshot] 💾 {report.nodes} nodi, {report.size_bytes / 1024:.1f} KB in {report.duration_ms:.1f} ms")
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"[STM Snapshot Error] Snapshot non riuscito: {e}")
+
 async def _load_seed_truths():
     """Carica i fatti fondamentali dal file seed_truths.yaml nel GraphDB."""
     if not os.path.exists(_SEED_FILE_PATH):
@@ -133,18 +136,18 @@ async def _load_seed_truths():
         data = yaml.safe_load(f)
 
     truths = data.get("seed_truths", [])
-    count = 0
+    triples = []
     for t in truths:
         sub = t.get("subject")
         pred = normalize_predicate(t.get("predicate", ""))
         obj = t.get("object")
         if sub and pred and obj:
-            triple = LogicalTriple(subject=sub, predicate=pred, object_=obj, confidence=5)
-            await gdb.add_triple(triple)
-            count += 1
+            triples.append(LogicalTriple(subject=sub, predicate=pred, object_=obj, confidence=5))
             print(f"[Seed] 🌱 Caricato: {sub} -> {pred} -> {obj}")
 
-    return count
+    # Inserimento massivo: un'unica transazione e un solo statement per tutto il seed
+    await gdb.add_triples(triples)
+    return len(triples)
 
 
 @asynccontextmanager
@@ -152,19 +155,51 @@ async def lifespan(app: FastAPI):
     # Setup FastAPI startup
     await stm.connect()
     await gdb.connect()
+    await ltm.connect()
+    if CONFIG.embedding.warmup:
+        try:
+            await ltm.warmup()
+        except Exception as e:
+            # Non bloccante: il modello verrà caricato alla prima richiesta
+            print(f"[LTM] ⚠️ Warm-up del modello di embedding fallito: {e}")
 
     # Auto-seed: se il GraphDB è vuoto, carica i fatti fondamentali
-    existing_triples = await gdb.get_all_triples()
-    if len(existing_triples) == 0:
+    if await gdb.count_triples() == 0:
         count = await _load_seed_truths()
         print(f"[Seed] ✅ Caricati {count} fatti fondamentali dal seed file")
 
     loop_task = asyncio.create_task(background_loop())
+    snapshot_task = asyncio.create_task(stm_snapshot_loop()) if stm.snapshot_path else None
+    monitor_task = asyncio.create_task(loop_monitor.run())
+    telemetry_task = asyncio.create_task(telemetry.run())
+    episode_task = asyncio.create_task(episode_writer.run()) if episode_writer else None
     yield
     # Shutdown
     loop_task.cancel()
-    await stm.disconnect()
-    await gdb.disconnect()
+    monitor_task.cancel()
+    telemetry_task.cancel()
+    if episode_task:
+        episode_task.cancel()
+        # I turni ancora in coda vengono scritti prima di chiudere la LTM
+        try:
+            await episode_writer.flush()
+        except Exception as e:
+            print(f"[Episodic Error] Flush finale non riuscito: {e}")
+    if snapshot_task:
+        snapshot_task.cancel()
+        # Flush finale: lo scratchpad sopravvive al riavvio (anche ai --reload di uvicorn).
+        # Un errore qui (disco pieno, permessi) non deve saltare la chiusura degli store.
+        try:
+            report = await stm.snapshot(force=True)
+            if report:
+                print(f"[STM Snapshot] 💾 Flush finale: {report.nodes} nodi, {report.size_bytes / 1024:.1f} KB in {report.duration_ms:.1f} ms")
+        except Exception as e:
+            print(f"[STM Snapshot Error] Flush finale non riuscito: {e}")
+    try:
+        await stm.disconnect()
+        await gdb.disconnect()
+    finally:
+        ltm.close()
 
 # Engine Core Interface
 app = FastAPI(title="CLAM OS - Brain Endpoint", lifespan=lifespan)
@@ -219,10 +254,36 @@ async def delete_memory_item(store: str, item_id: str):
 # ─────────────────────────────────────────────────────────────────
 
 @app.get("/api/knowledge/document")
-async def get_knowledge_document():
-    """Restituisce il documento di conoscenza strutturato come lo vedrà l'LLM."""
-    doc = await knowledge_renderer.render_knowledge_document(gdb)
-    return {"document": doc if doc else "Nessun fatto registrato."}
+async def get_knowledge_document(token_budget: Optional[int] = None):
+    """
+    Restituisce il documento di conoscenza strutturato come lo vedrà l'LLM.
+    Con `token_budget` il documento viene tagliato per priorità e le triple escluse sono in `omitted`.
+    """
+    if token_budget is None:
+        doc = await knowledge_renderer.render_knowledge_document(gdb)
+        return {"document": doc if doc else "Nessun fatto registrato."}
+    rendered = await knowledge_renderer.render_budgeted(gdb, token_budget=token_budget)
+    return {**rendered.model_dump(), "document": rendered.document or "Nessun fatto registrato."}
+
+class TraverseRequest(BaseModel):
+    seeds: List[str] = []
+    text: Optional[str] = None          # Entità citate nel testo aggiunte ai seed
+    max_depth: Optional[int] = None
+    predicates: Optional[List[str]] = None
+    max_fanout: Optional[int] = None
+    max_nodes: Optional[int] = None
+
+@app.post("/api/knowledge/traverse")
+async def traverse_knowledge_graph(req: TraverseRequest):
+    """GraphRAG: sottografo raggiungibile dai seed (e dalle entità citate in `text`) entro max_depth hop."""
+    seeds = list(req.seeds)
+    if req.text:
+        seeds += await gdb.find_entities_in_text(req.text)
+    subgraph = await gdb.traverse(
+        seeds, max_depth=req.max_depth, predicates=req.predicates,
+        max_fanout=req.max_fanout, max_nodes=req.max_nodes,
+    )
+    return subgraph.model_dump()
 
 class TripleRequest(BaseModel):
     subject: str
@@ -234,9 +295,10 @@ async def add_knowledge_triple(req: TripleRequest):
     """Aggiunge manualmente una tripla al Knowledge Graph con predicato normalizzato."""
     normalized_pred = normalize_predicate(req.predicate)
     triple = LogicalTriple(subject=req.subject, predicate=normalized_pred, object_=req.object_, confidence=5)
-    await gdb.add_triple(triple)
+    # Se il fatto esiste già viene fuso: l'id restituito è quello della riga memorizzata
+    stored_id = await gdb.add_triple(triple)
     print(f"[API] ➕ Tripla aggiunta: {req.subject} -> {normalized_pred} -> {req.object_}")
-    return {"status": "ok", "id": triple.id_tripla, "normalized_predicate": normalized_pred}
+    return {"status": "ok", "id": stored_id, "normalized_predicate": normalized_pred}
 
 @app.delete("/api/knowledge/triple/{triple_id}")
 async def delete_knowledge_triple(triple_id: str):
@@ -245,6 +307,26 @@ async def delete_knowledge_triple(triple_id: str):
     print(f"[API] 🗑️ Tripla eliminata: {triple_id}")
     return {"status": "ok"}
 
+@app.get("/api/knowledge/predicates")
+async def get_predicate_mappings():
+    """Mappature di predicati apprese dal normalizzatore e tasso di predicati non mappati."""
+    return {"mappings": await gdb.get_predicate_mappings(), "stats": gdb.get_stats()["predicates"]}
+
+@app.delete("/api/knowledge/predicates/{raw_predicate}")
+async def forget_predicate_mapping(raw_predicate: str):
+    """Dimentica una mappatura appresa sbagliata: il predicato verrà rivalutato da capo."""
+    if not await gdb.forget_predicate_mapping(raw_predicate):
+        raise HTTPException(status_code=404, detail=f"Nessuna mappatura appresa per '{raw_predicate}'")
+    print(f"[API] 🗑️ Mappatura del predicato dimenticata: {raw_predicate}")
+    return {"status": "ok"}
+
+@app.post("/api/knowledge/compact")
+async def compact_knowledge_graph():
+    """Fonde i duplicati del Knowledge Graph (utile su database creati prima della chiave canonica)."""
+    report = await gdb.compact()
+    print(f"[API] 🧹 Compattazione grafo: {report['before']} → {report['after']} triple")
+    return {"status": "ok", **report}
+
 @app.post("/api/knowledge/seed")
 async def load_seed_truths():
     """Carica (o ri-carica) i fatti fondamentali dal file seed_truths.yaml."""
@@ -262,13 +344,99 @@ async def reset_and_seed():
     print(f"[API] 🔄 Reset completo + Seed: {count} fatti caricati")
     return {"status": "ok", "loaded": count}
 
+@app.get("/api/stats")
+async def get_stats():
+    """Diagnostica runtime: contesa sui lock, snapshot dello scratchpad, ecc."""
+    return {
+        "graph": gdb.get_stats(),
+        "stm_snapshot": stm.last_snapshot.model_dump() if stm.last_snapshot else None,
+        "stm_change_feed": stm.changes.get_stats(),
+        "ltm": ltm.get_stats(),
+        "episodic": {
+            "writer": episode_writer.get_stats() if episode_writer else None,
+            "compactor": episodic_compactor.get_stats(),
+        },
+        "consolidation": consolidation_engine.last_report.model_dump() if consolidation_engine.last_report else None,
+        "telemetry": telemetry.get_stats(),
+        "websocket": manager.get_stats(),
+        "event_loop": loop_monitor.snapshot(),
+    }
+
+@app.post("/api/ltm/consolidate")
+async def consolidate_ltm():
+    """Esegue subito un ciclo di consolidamento della Memoria Semantica (fusione delle parafrasi)."""
+    report = await consolidation_engine.run()
+    return {"status": "ok", **report.model_dump()}
+
+class EpisodeSearchRequest(BaseModel):
+    query: str
+    n_results: int = 5
+    last_days: Optional[float] = None   # Finestra relativa ("ultima settimana" = 7)
+    since: Optional[str] = None         # Oppure istanti ISO 8601 UTC (until escluso)
+    until: Optional[str] = None
+    where: Optional[dict] = None        # Filtro sui metadati (sintassi di Chroma), es. {"type": "summary"}
+
+@app.post("/api/episodes/search")
+async def search_episodes(req: EpisodeSearchRequest):
+    """Ricerca nella Memoria Episodica, opzionalmente ristretta a una finestra temporale."""
+    since, until = (window(req.last_days) if req.last_days is not None else (req.since, req.until))
+    result = await ltm.search_episodic(req.query, n_results=req.n_results, where=req.where, since=since, until=until)
+    return {
+        "episodes": [
+            {"id": i, "text": d, "metadata": m, "distance": dist}
+            for i, d, m, dist in zip(result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0])
+        ]
+    }
+
+@app.get("/api/export")
+async def export_memories(include: str = ",".join(ALL_SECTIONS), embeddings: bool = False):
+    """Backup in streaming NDJSON di grafo, STM e LTM (include=triples,stm,ltm; embeddings=true per i vettori)."""
+    sections = [s.strip() for s in include.split(",") if s.strip()]
+    unknown = set(sections) - set(ALL_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Sezioni sconosciute: {', '.join(sorted(unknown))}")
+    filename = f"clam-export-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.ndjson"
+    return StreamingResponse(
+        export_ndjson(gdb, stm, ltm, include=sections, embeddings=embeddings),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/api/import")
+async def import_memories(request: Request, chunk_size: Optional[int] = None):
+    """Import in streaming di un file NDJSON (stesso formato di /api/export), letto dal body a blocchi."""
+    report = await import_ndjson(iter_lines(request.stream()), gdb, stm, ltm, chunk_size=chunk_size)
+    print(f"[API] 📥 Import: {report.imported} record in {report.duration_ms / 1000:.1f} s ({report.skipped} scartati)")
+    return {"status": "ok", **report.model_dump()}
+
+@app.get("/api/changes/{source}")
+async def get_changes(source: str, since: int = 0, limit: Optional[int] = None):
+    """
+    Delta incrementale di uno store ('graph', 'stm' o 'ltm'): eventi con seq > since.
+    410 se `since` è uscito dalla retention: il client deve rileggere lo stato completo e ripartire da last_seq.
+    """
+    feeds = {"graph": gdb.changes, "stm": stm.changes, "ltm": ltm.changes}
+    if source not in feeds:
+        raise HTTPException(status_code=404, detail=f"Store sconosciuto: '{source}'")
+    feed = feeds[source]
+    try:
+        events = feed.since(since, limit=limit)
+    except ChangeFeedGap as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return {"last_seq": feed.last_seq, "events": [e.model_dump() for e in events]}
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """Connessione pura TCP per il render visivo in Javascript senza delay da HTTP Polling."""
+async def websocket_endpoint(websocket: WebSocket, topics: str = ",".join(TOPICS)):
+    """
+    Connessione pura TCP per il render visivo in Javascript senza delay da HTTP Polling.
+    Snapshot dei topic richiesti (?topics=stm,ltm,graph) alla connessione, poi solo delta;
+    il client può cambiare iscrizioni o chiedere un resync con messaggi JSON (vedi clam/api/telemetry.py).
+    """
     await manager.connect(websocket)
     try:
+        await telemetry.attach(websocket, parse_topics(topics))
         while True:
-            await websocket.receive_text()
+            await telemetry.handle_message(websocket, await websocket.receive_text())
     except Exception:
         manager.disconnect(websocket)
 
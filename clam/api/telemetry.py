@@ -0,0 +1,218 @@
+"""
+Telemetria della dashboard guidata dai change feed degli store.
+
+Prima il background loop rileggeva ogni 15 s STM, LTM e grafo e spediva tutto a ogni client,
+anche se nulla era cambiato. Qui il protocollo è incrementale, per topic ('stm', 'ltm', 'graph'):
+
+- alla connessione (o su richiesta) il client riceve uno snapshot per topic:
+  {"type": "snapshot", "topic", "key", "seq", "count", "limit", "items"}
+- poi solo delta, e solo quando il feed dello store pubblica qualcosa:
+  {"type": "delta", "topic", "key", "prev_seq", "seq", "count", "upserts", "deletes"}
+  Le modifiche ravvicinate (entro telemetry_delta_interval_ms) viaggiano in un solo delta e
+  per ogni chiave resta l'ultima operazione.
+- `seq` è quello del change feed dello store. Il client applica un delta se prev_seq <= il suo
+  seq (upsert e delete sono idempotenti) e chiede un resync se prev_seq è più avanti.
+- Un clear/reset dello store, un buco nella retention del feed o un delta più grande della
+  finestra visualizzata diventano un nuovo snapshot per i client iscritti al topic.
+
+Messaggi dal client: {"type": "subscribe" | "unsubscribe" | "resync", "topics": [...]}
+(resync senza topics = tutti quelli sottoscritti).
+"""
+
+import asyncio
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from clam.config import CONFIG
+from clam.memory.change_feed import ChangeEvent, ChangeFeedGap
+
+TOPICS = ("stm", "ltm", "graph")
+
+# Chiave primaria e colonne che la dashboard disegna, per topic
+_KEYS = {"stm": "id_concetto", "ltm": "id_concetto", "graph": "id_tripla"}
+_COLUMNS = {
+    "stm": ("id_concetto", "descrizione", "confidence_score"),
+    "ltm": ("id_concetto", "descrizione"),
+    "graph": ("id_tripla", "subject", "predicate", "object_"),
+}
+
+
+def parse_topics(raw: Optional[Any]) -> List[str]:
+    """Topic validi da una lista o da una stringa separata da virgole (None = tutti)."""
+    if raw is None:
+        return list(TOPICS)
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    return [t for t in TOPICS if t in {str(r).strip() for r in raw}]
+
+
+class TelemetryHub:
+    """Trasforma i change feed di STM, LTM e GraphDB in snapshot e delta per i client WebSocket."""
+
+    def __init__(self, manager, stm, ltm, gdb):
+        self.manager = manager
+        self.stm = stm
+        self.ltm = ltm
+        self.gdb = gdb
+        self._feeds = {"stm": stm.changes, "ltm": ltm.changes, "graph": gdb.changes}
+        self.max_items = CONFIG.api.telemetry_max_items
+        self.ltm_items = CONFIG.api.telemetry_ltm_items
+        self.delta_interval = CONFIG.api.telemetry_delta_interval_ms / 1000
+        # Ultimo seq già trasformato in delta, per topic
+        self._cursors: Dict[str, int] = {}
+        self.snapshots_sent: Counter = Counter()
+        self.deltas_sent: Counter = Counter()
+        self.events_seen: Counter = Counter()
+        # Un client che ha perso telemetria (coda piena) riceve uno snapshot nuovo
+        manager.resync_handler = self.request_resync
+
+    def _window(self, topic: str) -> int:
+        return self.ltm_items if topic == "ltm" else self.max_items
+
+    async def snapshot(self, topic: str) -> Dict[str, Any]:
+        """Stato corrente (conteggio + finestra più recente) di un topic."""
+        # Seq letto PRIMA dello stato: un evento che arriva durante la lettura viene
+        # riapplicato dal delta successivo, cosa innocua (operazioni idempotenti).
+        seq = self._feeds[topic].last_seq
+        count = await self._count(topic)
+        if topic == "stm":
+            rows = await self.stm.query_nodes(
+                columns=["descrizione", "confidence_score"],
+                order_by="timestamp_creazione", descending=True, limit=self.max_items,
+            )
+        elif topic == "ltm":
+            recent = await self.ltm.get_recent_semantic(limit=self.ltm_items)
+            rows = [{"id_concetto": i, "descrizione": d} for i, d in zip(recent["ids"], recent["documents"])]
+        else:
+            rows = await self.gdb.query_triples(columns=["subject", "predicate", "object_"], limit=self.max_items)
+        items = [{c: row.get(c) for c in _COLUMNS[topic]} for row in rows]
+        return {"type": "snapshot", "topic": topic, "key": _KEYS[topic], "seq": seq, "count": count,
+                "limit": self._window(topic), "items": items}
+
+    async def send_snapshots(self, websocket, topics: Sequence[str]) -> None:
+        for topic in topics:
+            self.manager.send(websocket, await self.snapshot(topic))
+            self.snapshots_sent[topic] += 1
+
+    def request_resync(self, websocket, topics: Sequence[str]) -> None:
+        asyncio.get_running_loop().create_task(self.send_snapshots(websocket, topics))
+
+    async def attach(self, websocket, topics: Sequence[str]) -> None:
+        """Nuovo client: iscrizione ai topic e snapshot iniziale."""
+        self.manager.subscribe(websocket, topics)
+        await self.send_snapshots(websocket, topics)
+
+    async def handle_message(self, websocket, text: str) -> None:
+        """Messaggi di controllo dal client (subscribe / unsubscribe / resync). Quelli malformati sono ignorati."""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        kind = message.get("type")
+        if kind == "subscribe":
+            topics = [t for t in parse_topics(message.get("topics")) if t not in self.manager.topics_of(websocket)]
+            self.manager.subscribe(websocket, topics)
+            await self.send_snapshots(websocket, topics)
+        elif kind == "unsubscribe":
+            self.manager.unsubscribe(websocket, parse_topics(message.get("topics")))
+        elif kind == "resync":
+            subscribed = self.manager.topics_of(websocket)
+            requested = message.get("topics")
+            topics = [t for t in (parse_topics(requested) if requested is not None else TOPICS) if t in subscribed]
+            await self.send_snapshots(websocket, topics)
+
+    def _delta(self, topic: str, prev_seq: int, events: Sequence[ChangeEvent]) -> Optional[Dict[str, Any]]:
+        """Eventi -> delta compatto: per ogni chiave conta solo l'ultima operazione. None se non riguarda la dashboard."""
+        columns = _COLUMNS[topic]
+        latest: Dict[str, Optional[Dict[str, Any]]] = {}
+        for event in events:
+            # La dashboard mostra solo la Memoria Semantica: gli episodi non generano traffico
+            if topic == "ltm" and (event.data or {}).get("kind") != "semantic":
+                continue
+            latest.pop(event.key, None)  # la chiave va in coda: l'ordine segue l'ultima modifica
+            latest[event.key] = None if event.op == "delete" else {c: (event.data or {}).get(c) for c in columns}
+        if not latest:
+            return None
+        return {
+            "type": "delta",
+            "topic": topic,
+            "key": _KEYS[topic],
+            "prev_seq": prev_seq,
+            "seq": events[-1].seq,
+            "upserts": [item for item in latest.values() if item is not None],
+            "deletes": [key for key, item in latest.items() if item is None],
+        }
+
+    async def _count(self, topic: str) -> int:
+        if topic == "stm":
+            return await self.stm.count_nodes()
+        if topic == "ltm":
+            return await self.ltm.count("semantic")
+        return await self.gdb.count_triples()
+
+    async def _broadcast_snapshot(self, topic: str) -> int:
+        snapshot = await self.snapshot(topic)
+        self.manager.broadcast(snapshot, topic=topic)
+        self.snapshots_sent[topic] += 1
+        return snapshot["seq"]
+
+    async def _follow(self, topic: str) -> None:
+        feed = self._feeds[topic]
+        cursor = self._cursors[topic] = feed.last_seq
+        while True:
+            await feed.wait(cursor)
+            # Piccola attesa: un import o un ciclo del GC diventano un delta solo, non uno per riga
+            await asyncio.sleep(self.delta_interval)
+            if not self.manager.subscribers(topic):
+                # Nessuno ascolta: chi si iscriverà riceverà comunque uno snapshot
+                cursor = self._cursors[topic] = feed.last_seq
+                continue
+            try:
+                cursor = await self._publish(topic, cursor)
+            except Exception as e:
+                # Saltare gli eventi lascerebbe le dashboard indietro senza saperlo: si rimanda lo stato completo
+                print(f"[Telemetry Error] Delta '{topic}' non inviato, invio uno snapshot: {e}")
+                try:
+                    cursor = await self._broadcast_snapshot(topic)
+                except Exception as e:
+                    # Cursore invariato: al giro successivo (dopo delta_interval) si riprova
+                    print(f"[Telemetry Error] Snapshot '{topic}' non inviato: {e}")
+            self._cursors[topic] = cursor
+
+    async def _publish(self, topic: str, cursor: int) -> int:
+        """Invia ai client iscritti il delta (o lo snapshot) degli eventi dopo `cursor`. Restituisce il nuovo cursore."""
+        try:
+            events = self._feeds[topic].since(cursor)
+        except ChangeFeedGap:
+            return await self._broadcast_snapshot(topic)
+        self.events_seen[topic] += len(events)
+        if len(events) > self._window(topic) or any(e.op in ("clear", "reset") for e in events):
+            return await self._broadcast_snapshot(topic)
+        if not events:
+            return cursor
+        delta = self._delta(topic, cursor, events)
+        if delta is not None:
+            delta["count"] = await self._count(topic)
+            self.manager.broadcast(delta, topic=topic)
+            self.deltas_sent[topic] += 1
+        return events[-1].seq
+
+    async def run(self) -> None:
+        """Un follower per topic, fino alla cancellazione."""
+        await asyncio.gather(*(self._follow(topic) for topic in TOPICS))
+
+    def get_stats(self) -> dict:
+        return {
+            topic: {
+                "feed_seq": self._feeds[topic].last_seq,
+                "cursor": self._cursors.get(topic, 0),
+                "subscribers": len(self.manager.subscribers(topic)),
+                "events": self.events_seen[topic],
+                "deltas_sent": self.deltas_sent[topic],
+                "snapshots_sent": self.snapshots_sent[topic],
+            }
+            for topic in TOPICS
+        }
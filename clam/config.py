@@ -1,5 +1,6 @@
 import os
 import yaml
+from typing import Optional
 from pydantic import BaseModel
 
 class LLMConfig(BaseModel):
@@ -12,26 +13,131 @@ class ShortTermMemoryConfig(BaseModel):
     promotion_threshold: int
     decay_time_minutes: int
     min_score: int
+    # Warm restart: snapshot periodico dello scratchpad su file locale (None = disattivato).
+    snapshot_path: Optional[str] = "./data/stm_snapshot.sqlite"
+    snapshot_interval_seconds: int = 30
+    change_feed_retention: int = 1000  # Eventi di modifica trattenuti in RAM per i consumer incrementali
 
 class LongTermMemoryConfig(BaseModel):
-    provider: str
+    provider: str                     # Backend vettoriale: "chromadb" | "native" (memmap float32 + SQLite)
     path: str
     semantic_collection: str
     episodic_collection: str
     graph_db: str
+    executor_threads: int = 4         # Thread dedicati alle chiamate bloccanti di Chroma (embedding, HNSW)
+    write_chunk_size: int = 256       # Record per singola upsert: limita quanto a lungo il GIL resta occupato
+    # Cache degli embedding per testo: LRU in RAM + (opzionale) file SQLite persistente (None = solo RAM)
+    embedding_cache_size: int = 10000
+    embedding_cache_path: Optional[str] = "./data/embedding_cache.sqlite"
+    # Ricerca ibrida (vettoriale + BM25 su FTS5) fusa con Reciprocal Rank Fusion
+    lexical_index_path: str = "./data/ltm_lexical.sqlite"
+    hybrid_candidates: int = 20       # Candidati letti da ciascuna delle due classifiche
+    hybrid_top_k: int = 5             # Risultati restituiti (fatti LTM iniettati nel prompt)
+    rrf_k: int = 60                   # Costante RRF: più alta = peso più uniforme tra le posizioni
+    # Indice di recenza (seq + timestamp di ingestione) per "ultimi N", intervalli temporali e paginazione
+    recency_index_path: str = "./data/ltm_recency.sqlite"
+    time_filter_max_ids: int = 2000   # Filtro since/until: id della finestra passati al backend per interrogazione (pagina)
+    # Grafo dei z-links (legami Zettelkasten del GC) ed espansione ai vicini in hybrid_search
+    link_index_path: str = "./data/ltm_links.sqlite"
+    link_expand_hops: int = 1         # Salti nel grafo a partire dai risultati (0 = nessuna espansione)
+    link_expand_max: int = 3          # Vicini aggiunti al massimo
+    link_fanout: int = 5              # Legami più forti seguiti per documento e per salto
+    change_feed_retention: int = 1000 # Eventi di modifica trattenuti in RAM per i consumer incrementali
+    # Backend "native": forza bruta NumPy sotto la soglia, grafo HNSW sopra (se hnswlib è installato)
+    native_hnsw_threshold: int = 20000
+    native_hnsw_m: int = 16
+    native_hnsw_ef_construction: int = 200
+    native_hnsw_ef_search: int = 64
+
+class GraphDBConfig(BaseModel):
+    # Tuning SQLite del Knowledge Graph (journal in WAL).
+    read_pool_size: int = 4           # Connessioni read-only concorrenti (0 = tutto sul writer)
+    synchronous: str = "NORMAL"       # In WAL, NORMAL è durabile ai crash dell'app e molto più veloce di FULL
+    mmap_size_mb: int = 64
+    cache_size_mb: int = 16
+    fulltext_index: bool = True       # Indice FTS5 per get_triples_by_entity(match="fulltext")
+    keep_history: bool = True         # Conserva i valori sostituiti dei predicati funzionali
+    mirror: bool = True               # Copia in RAM del grafo: letture senza I/O, scritture write-through su SQLite
+    change_feed_retention: int = 1000 # Eventi di modifica trattenuti in RAM per i consumer incrementali
+    # GraphRAG multi-hop (GraphDB.traverse)
+    traversal_depth: int = 2          # Hop massimi dai seed
+    traversal_fanout: int = 50        # Archi seguiti per entità e per direzione (i più forti)
+    traversal_max_nodes: int = 500    # Tetto alle righe generate dalla ricorsione
+    # Documento di conoscenza nel system prompt (KnowledgeRenderer.render_budgeted)
+    document_token_budget: int = 1500 # Token massimi del documento (0 = nessun limite)
+    chars_per_token: float = 4.0      # Stima dei token senza tokenizer: caratteri per token
+    # Normalizzazione dei predicati (clam/core/predicate_normalizer.py)
+    predicate_fuzzy_matching: bool = True  # Token-set e distanza di edit oltre al lookup esatto
+    predicate_token_threshold: float = 0.75  # Jaccard minimo tra le parole del predicato e quelle di una chiave nota
+    predicate_max_edit_distance: int = 2     # Refusi ammessi (1 ogni 6 caratteri, al massimo questo)
+    predicate_cache_size: int = 10000        # Decisioni tenute in cache
+
+class EpisodicConfig(BaseModel):
+    # Memoria Episodica: turni di conversazione scritti in background (clam/memory/episodic.py)
+    enabled: bool = True
+    queue_size: int = 1000            # Turni in attesa di scrittura (oltre: scartati, la risposta non aspetta)
+    batch_size: int = 32              # Turni per singola upsert
+    flush_interval_seconds: float = 2.0  # Attesa massima prima di scrivere un blocco incompleto
+    prompt_top_k: int = 3             # Episodi passati inseriti nel prompt dell'agente (0 = nessuno)
+    # Compattazione: le settimane ISO più vecchie di così diventano riassunti (clam/engines/episodic_compactor.py)
+    compact_after_weeks: int = 4
+    summary_chunk_turns: int = 20     # Turni riassunti da una singola chiamata all'LLM
+    compact_max_turns: int = 2000     # Turni letti per partizione a ogni ciclo
+
+class ConsolidationConfig(BaseModel):
+    # Consolidamento offline della Memoria Semantica (clam/engines/consolidation.py)
+    enabled: bool = True
+    interval_minutes: float = 60.0    # Al più un ciclo ogni tanti minuti, solo con l'utente inattivo
+    similarity_threshold: float = 0.92  # Similarità coseno oltre la quale due fatti sono parafrasi
+    max_entries: int = 20000          # Fatti caricati (con embedding) a ogni ciclo
+    block_size: int = 1024            # Righe della matrice di similarità calcolate per blocco
+    max_cluster_size: int = 8         # Cluster più grandi (catene di similarità) non vengono fusi
 
 class MemoryConfig(BaseModel):
     short_term: ShortTermMemoryConfig
     long_term: LongTermMemoryConfig
+    graph: GraphDBConfig = GraphDBConfig()
+    episodic: EpisodicConfig = EpisodicConfig()
+    consolidation: ConsolidationConfig = ConsolidationConfig()
 
 class APIConfig(BaseModel):
     host: str
     port: int
+    # Telemetria della dashboard (clam/api/telemetry.py): snapshot alla connessione, poi delta dai change feed.
+    telemetry_max_items: int = 200   # Elementi per store (STM, Graph) nello snapshot e nella finestra del client
+    telemetry_ltm_items: int = 50    # Fatti LTM più recenti nello snapshot
+    telemetry_delta_interval_ms: int = 250  # Attesa per raccogliere in un solo delta le modifiche ravvicinate
+    # Code di uscita per client WebSocket (clam/api/connections.py)
+    ws_queue_size: int = 256         # Messaggi in coda per client prima di scartare/fondere
+    ws_send_timeout_seconds: float = 10.0  # Singolo invio bloccato oltre questo tempo = client disconnesso
+    ws_max_lag_seconds: float = 30.0 # Messaggio più vecchio in coda da oltre questo tempo = client disconnesso
+    # Monitor dell'event loop: un ritardo oltre la soglia è registrato come stallo.
+    loop_monitor_interval_ms: int = 100
+    loop_stall_threshold_ms: int = 100
+
+class BulkIOConfig(BaseModel):
+    # Import/export NDJSON in streaming (clam/memory/bulk_io.py)
+    chunk_size: int = 1000            # Record per transazione (GraphDB/STM) e per upsert su Chroma
+    page_size: int = 1000             # Record letti per pagina durante l'export
+    progress_every: int = 50000       # Ogni quanti record stampare l'avanzamento
+
+class EmbeddingConfig(BaseModel):
+    # Modello di embedding della LTM (clam/memory/embedding.py)
+    provider: str = "chroma_default"  # "chroma_default" (funzione implicita di Chroma) | "onnx"
+    model_dir: Optional[str] = None   # onnx: cartella con model.onnx + tokenizer.json (None = all-MiniLM-L6-v2 di Chroma)
+    quantize_int8: bool = False       # onnx: quantizzazione dinamica int8 dei pesi (richiede il pacchetto 'onnx')
+    intra_op_threads: int = 0         # onnx: thread per operatore (0 = tutti i core)
+    max_tokens: int = 256             # onnx: troncamento dei testi lunghi
+    batch_size: int = 32              # Testi per chiamata al modello
+    max_wait_ms: int = 5              # Attesa massima per riempire un batch con richieste concorrenti
+    warmup: bool = True               # Carica il modello all'avvio invece che alla prima richiesta
 
 class ClamConfig(BaseModel):
     llm: LLMConfig
     memory: MemoryConfig
     api: APIConfig
+    bulk_io: BulkIOConfig = BulkIOConfig()
+    embedding: EmbeddingConfig = EmbeddingConfig()
     # Language code for UI & LLM prompts. Default: 'en' so old config files still work.
     language: str = "en"
 
@@ -48,6 +154,20 @@ def load_config(config_path: str) -> ClamConfig:
         
     return ClamConfig(**data)
 
+def resolve_data_path(rel_path: str) -> str:
+    """
+    Converte un path del config.yaml (es. './data/graph.sqlite') in un path assoluto
+    ancorato alla root del progetto, creando la directory padre se manca.
+    """
+    if os.path.isabs(rel_path):
+        abs_path = rel_path
+    else:
+        if rel_path.startswith("./"):
+            rel_path = rel_path[2:]
+        abs_path = os.path.join(_root_dir, rel_path)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    return abs_path
+
 # Caricamento automatico path relativo alla root del progetto
 _root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _config_path = os.path.join(_root_dir, "config.yaml")
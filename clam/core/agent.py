@@ -1,10 +1,14 @@
 import asyncio
-from typing import Tuple, List, Dict
+from datetime import datetime, timezone
+from typing import Tuple, List, Dict, Optional
 from clam.llm.ollama_client import OllamaClient
 from clam.memory.short_term import ShortTermBuffer
 from clam.memory.long_term import LongTermMemory
 from clam.memory.graph_db import GraphDB
+from clam.memory.episodic import EpisodeWriter
 from clam.core.knowledge_renderer import KnowledgeRenderer
+from clam.core.knowledge_schema import ROOT_ENTITIES
+from clam.core.models import LogicalTriple
 from clam.core.locales import get_clam_system_prompt, get_debate_prompt, get_knowledge_strings
 from clam.config import CONFIG
 
@@ -19,14 +23,27 @@ ENABLE_INTERNAL_DEBATE = False
 
 class ClamAgent:
     """Il cuore operativo. Implementa il Knowledge Document strutturato per l'identità."""
-    def __init__(self, llm: OllamaClient, stm: ShortTermBuffer, ltm: LongTermMemory, gdb: GraphDB):
+    def __init__(
+        self,
+        llm: OllamaClient,
+        stm: ShortTermBuffer,
+        ltm: LongTermMemory,
+        gdb: GraphDB,
+        episodes: Optional[EpisodeWriter] = None,
+    ):
         self.llm = llm
         self.stm = stm
         self.ltm = ltm
         self.gdb = gdb
+        # Completed turns are queued here and written to episodic memory in the background
+        self.episodes = episodes
         self._chat_history: List[Dict[str, str]] = []
+        # Start time of each turn still in _chat_history (oldest first)
+        self._history_turn_times: List[str] = []
         # Il KnowledgeRenderer genera il documento strutturato dalle triple
         self._knowledge_renderer = KnowledgeRenderer()
+        # Triples cut from the last knowledge document by the token budget (most important first)
+        self.last_omitted_triples: List[LogicalTriple] = []
 
     async def _internal_debate(self, draft_response: str) -> str:
         debate_prompt = get_debate_prompt(CONFIG.language)
@@ -39,12 +56,25 @@ class ClamAgent:
     async def generate_reply(self, user_prompt: str) -> str:
         lang: str = CONFIG.language
         loc = get_knowledge_strings(lang)
+        turn_started = datetime.now(timezone.utc)
 
         # 1. Build the STRUCTURED KNOWLEDGE DOCUMENT from the Graph DB.
         # Instead of injecting raw triples ("Utente -> ha_nome -> Marcello"),
         # we generate a readable natural-language document organised by
         # ontological categories (Profile, Preferences, Experiences, CLAM Identity).
-        knowledge_document: str = await self._knowledge_renderer.render_knowledge_document(self.gdb, lang)
+        # GraphRAG: only the subgraph reachable from the identities and from the
+        # entities mentioned in the prompt is rendered, so the context grows with
+        # relevance rather than with the size of the graph.
+        seeds: List[str] = list(ROOT_ENTITIES) + await self.gdb.find_entities_in_text(user_prompt)
+        subgraph = await self.gdb.traverse(seeds)
+        # Token budget (memory.graph.document_token_budget): categories are filled by priority,
+        # the rest is replaced by an "N more facts omitted" marker and kept for on-demand retrieval.
+        rendered = await self._knowledge_renderer.render_budgeted(self.gdb, lang=lang, triples=subgraph.triples)
+        knowledge_document: str = rendered.document
+        self.last_omitted_triples = rendered.omitted
+        if rendered.omitted:
+            print(f"[ClamAgent] Knowledge document at ~{rendered.tokens}/{rendered.token_budget} tokens, "
+                  f"{len(rendered.omitted)} facts omitted")
 
         if knowledge_document:
             sep = "═" * 43
@@ -58,29 +88,27 @@ class ClamAgent:
         else:
             knowledge_document = ""
 
-        # 2. Full retrieval of everything CLAM knows about the user from LTM.
-        # In addition to structured facts from GraphDB, we also retrieve
-        # vector facts from ChromaDB for a complete picture.
-        all_ltm_facts = await self.ltm.get_recent_semantic(limit=20)
-        semantic_res = await self.ltm.search_semantic(user_prompt, n_results=3)
-
-        # Combine general facts with prompt-specific ones
-        all_facts_set: set[str] = set()
-        if all_ltm_facts and isinstance(all_ltm_facts, dict) and 'documents' in all_ltm_facts:
-            for doc in all_ltm_facts.get('documents', []):
-                if isinstance(doc, str):
-                    all_facts_set.add(doc)
-                elif isinstance(doc, list):
-                    all_facts_set.update(doc)
-        if semantic_res and isinstance(semantic_res, dict) and 'documents' in semantic_res and len(semantic_res['documents'][0]) > 0:
-            all_facts_set.update(semantic_res['documents'][0])
-
-        if all_facts_set:
-            facts = "\n".join([f"- {f}" for f in all_facts_set])
+        # 2. Hybrid retrieval from LTM: vector similarity catches paraphrases,
+        # BM25 catches exact names and numbers ("Marcello", "60"). The two
+        # rankings are fused (RRF) and only the top-k facts reach the prompt.
+        hits = await self.ltm.hybrid_search(user_prompt)
+        # Deduplicated, in fused-rank order (best first)
+        ranked_facts: List[str] = list(dict.fromkeys(hit.descrizione for hit in hits if hit.descrizione))
+
+        if ranked_facts:
+            facts = "\n".join([f"- {f}" for f in ranked_facts])
         else:
             facts = loc["no_observed"]
         context_block = f"\n--- {loc['observed_header']} ---\n{facts}\n-----------------------"
 
+        # 2b. Episodic recall: past turns that have already scrolled out of the chat
+        # history (or come from earlier sessions). The search stops where the history
+        # starts, so the model never sees the same turn twice.
+        episodes = await self._recall_episodes(user_prompt)
+        if episodes:
+            past = "\n\n".join(episodes)
+            context_block += f"\n--- {loc['episodes_header']} ---\n{past}\n-----------------------"
+
         # 3. Build the Unified System Prompt in the configured language
         system_prompt_template: str = get_clam_system_prompt(lang)
         system_prompt = system_prompt_template.format(
@@ -103,8 +131,33 @@ class ClamAgent:
         
         self._chat_history.append({"role": "user", "content": user_prompt})
         self._chat_history.append({"role": "assistant", "content": final_response})
+        self._history_turn_times.append(turn_started.isoformat())
         
         if len(self._chat_history) > MAX_CHAT_HISTORY_MESSAGES:
             self._chat_history = self._chat_history[-MAX_CHAT_HISTORY_MESSAGES:]
+            self._history_turn_times = self._history_turn_times[-(MAX_CHAT_HISTORY_MESSAGES // 2):]
+
+        # Fire and forget: the episode is written in batches by the EpisodeWriter task
+        if self.episodes is not None and final_response:
+            self.episodes.record_turn(
+                EpisodeWriter.format_turn(user_prompt, final_response, loc["episode_user"]), turn_started
+            )
         
         return final_response
+
+    async def _recall_episodes(self, user_prompt: str) -> List[str]:
+        top_k = CONFIG.memory.episodic.prompt_top_k
+        if self.episodes is None or top_k <= 0:
+            return []
+        # Over-fetch by the number of turns in the history and drop those: one
+        # index query instead of a brute-force scan of the window before them.
+        until = self._history_turn_times[0] if self._history_turn_times else None
+        result = await self.ltm.search_episodic(user_prompt, n_results=top_k + len(self._history_turn_times))
+        if not result.get("ids") or not result["ids"][0]:
+            return []
+        episodes = []
+        for document, metadata in zip(result["documents"][0], result["metadatas"][0]):
+            ingested_at = (metadata or {}).get("ingested_at")
+            if document and (until is None or ingested_at is None or ingested_at < until):
+                episodes.append(document)
+        return episodes[:top_k]
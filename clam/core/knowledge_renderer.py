@@ -12,167 +12,299 @@ Questo modulo è il ponte tra il database (struttura dati)
 e la context window dell'LLM (linguaggio naturale).
 """
 
-from typing import Dict, List, Set, Tuple
+import math
+from typing import Dict, List, Optional, Set, Tuple
+from clam.config import CONFIG
+from clam.core.locales import get_knowledge_strings
+from clam.memory.change_feed import ChangeFeedGap
 from clam.memory.graph_db import GraphDB
-from clam.core.models import LogicalTriple
+from clam.core.models import KnowledgeDocument, LogicalTriple
 from clam.core.knowledge_schema import (
+    CATEGORY_PRIORITY,
     KNOWLEDGE_CATEGORIES,
-    normalize_predicate,
     get_localized_categories,
+    is_single_valued,
+    route_triple,
 )
 
+# Cache key of a rendered section: (language, triple ids of a subgraph or None for the whole graph)
+SectionKey = Tuple[str, Optional[Tuple[str, ...]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate without a tokenizer (the model runs in Ollama): characters / chars_per_token."""
+    return math.ceil(len(text) / CONFIG.memory.graph.chars_per_token)
+
 
 class KnowledgeRenderer:
     """
     Genera un documento di conoscenza strutturato per categorie ontologiche.
     Il documento viene iniettato nel system prompt dell'LLM al posto
     della vecchia lista piatta di triple.
+
+    Il rendering è incrementale, categoria per categoria: le sezioni già generate
+    restano in cache e il change feed del GraphDB invalida solo le categorie toccate
+    dalle triple modificate. Il documento dell'intero grafo si appoggia a una copia
+    in RAM delle triple, aggiornata dallo stesso feed invece di rileggere il grafo.
+    Il costo di un render segue le triple cambiate, non la dimensione del grafo.
     """
 
-    async def render_knowledge_document(self, graph_db: GraphDB, lang: str = None) -> str:
+    # Oltre questo numero di sezioni in cache per categoria (lingue × sottografi distinti) la categoria si svuota.
+    MAX_CACHED_SECTIONS = 64
+
+    def __init__(self):
+        self._feed_seq: Optional[int] = None
+        self._sections: Dict[str, Dict[SectionKey, str]] = {cat: {} for cat in KNOWLEDGE_CATEGORIES}
+        # Copia dell'intero grafo per categoria (id_tripla -> tripla), caricata al primo render completo
+        self._graph: Optional[Dict[str, Dict[str, LogicalTriple]]] = None
+
+    async def render_knowledge_document(
+        self,
+        graph_db: GraphDB,
+        lang: str = None,
+        triples: Optional[List[LogicalTriple]] = None,
+    ) -> str:
         """
-        Full pipeline: reads all triples, normalises them,
+        Full pipeline: reads all triples (already canonical in GraphDB),
         organises them by category and generates the natural-language document.
 
         Args:
             graph_db: the graph database to read from.
             lang: language code for labels (e.g. 'en', 'it'). If None, uses CONFIG.language.
+            triples: optional pre-selected triples (e.g. a GraphDB.traverse() subgraph).
+                     If None, the whole graph is rendered.
+                     They must come from graph_db: the cache keys them by id.
 
         Returns:
             Empty string if no facts, otherwise the structured document.
         """
-        all_triples: List[LogicalTriple] = await graph_db.get_all_triples()
+        lang = lang or CONFIG.language
+        categorized = await self._categorized(graph_db, triples)
 
-        if not all_triples:
-            return ""
-
-        # Fetch the category dict with localised labels for the requested language
+        # 2. Render category by category, reusing every section whose triples did not change
         localized_categories: Dict[str, dict] = get_localized_categories(lang)
+        sections: List[str] = []
+        for cat_name, cat_data in localized_categories.items():
+            members: List[LogicalTriple] = categorized.get(cat_name, [])
+            if not members:
+                continue
+            key: SectionKey = (lang, None if triples is None else tuple(t.id_tripla for t in members))
+            cache = self._sections[cat_name]
+            section = cache.get(key)
+            if section is None:
+                section = self._render_section(cat_name, cat_data, self._display_order(members, triples is None))
+                if len(cache) >= self.MAX_CACHED_SECTIONS:
+                    cache.clear()
+                cache[key] = section
+            sections.append(section)
 
-        # 1. Normalise predicates and deduplicate by semantic content
-        normalized: List[LogicalTriple] = self._normalize_and_deduplicate(all_triples)
-
-        # 2. Group by ontological category
-        categorized: Dict[str, List[LogicalTriple]] = self._categorize_triples(normalized, localized_categories)
-
-        # 3. Render into natural-language document
-        document: str = self._render_document(categorized, localized_categories)
-
-        return document
+        return "\n\n".join(sections)
 
-    def _normalize_and_deduplicate(
-        self, triples: List[LogicalTriple]
-    ) -> List[LogicalTriple]:
+    async def render_budgeted(
+        self,
+        graph_db: GraphDB,
+        token_budget: Optional[int] = None,
+        lang: str = None,
+        triples: Optional[List[LogicalTriple]] = None,
+    ) -> KnowledgeDocument:
         """
-        Normalizza i predicati e rimuove duplicati semantici.
-        Due triple sono duplicate se hanno stesso (subject, predicate_normalizzato, object_).
-        In caso di duplicati, tiene quella con confidence più alto.
-        """
-        # Mappa: (subject_lower, pred_normalizzato, object_lower) → tripla migliore
-        best_triples: Dict[Tuple[str, str, str], LogicalTriple] = {}
+        Same document as render_knowledge_document, cut to fit a token budget.
 
-        for triple in triples:
-            normalized_pred: str = normalize_predicate(triple.predicate)
+        The budget is filled by category priority (CATEGORY_PRIORITY: identities first,
+        the experiences catch-all last) and, inside a category, by confidence then recency.
+        The first triple that does not fit closes the document: it and everything ranked
+        after it are omitted, a compact "N more facts omitted" marker is appended and the
+        omitted triples are returned (most important first) so the retriever can bring
+        them back on demand. Admitted triples keep the usual document layout and order.
 
-            # Chiave di de-duplicazione case-insensitive
-            dedup_key: Tuple[str, str, str] = (
-                triple.subject.strip().lower(),
-                normalized_pred,
-                triple.object_.strip().lower(),
+        Args:
+            token_budget: estimated tokens allowed. None uses memory.graph.document_token_budget;
+                          0 or less means no limit.
+        """
+        lang = lang or CONFIG.language
+        if token_budget is None:
+            token_budget = CONFIG.memory.graph.document_token_budget
+        document = await self.render_knowledge_document(graph_db, lang, triples)
+        categorized = await self._categorized(graph_db, triples)
+        total = sum(len(members) for members in categorized.values())
+        if token_budget <= 0 or estimate_tokens(document) <= token_budget:
+            return KnowledgeDocument(
+                document=document, tokens=estimate_tokens(document), token_budget=token_budget, rendered=total
             )
 
-            existing = best_triples.get(dedup_key)
-            if existing is None or triple.confidence > existing.confidence:
-                # Creiamo una copia con il predicato normalizzato
-                best_triples[dedup_key] = LogicalTriple(
-                    id_tripla=triple.id_tripla,
-                    subject=triple.subject,
-                    predicate=normalized_pred,
-                    object_=triple.object_,
-                    confidence=triple.confidence,
-                    timestamp=triple.timestamp,
-                )
-
-        return list(best_triples.values())
-
-    def _categorize_triples(
-        self, triples: List[LogicalTriple], categories: Dict[str, dict]
+        localized_categories: Dict[str, dict] = get_localized_categories(lang)
+        marker: str = get_knowledge_strings(lang)["omitted_marker"]
+        # Characters available to the triples: the marker (with the widest possible count) is reserved up front
+        available = int(token_budget * CONFIG.memory.graph.chars_per_token) - len("\n\n" + marker.format(n=total))
+
+        priority = CATEGORY_PRIORITY + tuple(c for c in localized_categories if c not in CATEGORY_PRIORITY)
+        ranked: List[Tuple[str, LogicalTriple]] = [
+            (cat_name, t)
+            for cat_name in priority
+            for t in sorted(categorized.get(cat_name, []), key=lambda t: (t.confidence, t.timestamp), reverse=True)
+        ]
+
+        used = 0
+        opened: Dict[str, Set[str]] = {}  # category -> predicates already on the page
+        admitted: Set[str] = set()
+        omitted: List[LogicalTriple] = []
+        for position, (cat_name, t) in enumerate(ranked):
+            cat_data = localized_categories[cat_name]
+            cost = self._line_cost(cat_name, cat_data, t, opened.get(cat_name, set()))
+            if cat_name not in opened:
+                cost += (2 if opened else 0) + len(cat_data["label"]) + 1  # section separator + "Label:"
+            if used + cost > available:
+                omitted = [t for _, t in ranked[position:]]
+                break
+            used += cost
+            opened.setdefault(cat_name, set()).add(t.predicate)
+            admitted.add(t.id_tripla)
+
+        sections: List[str] = []
+        for cat_name, cat_data in localized_categories.items():
+            members = [
+                t for t in self._display_order(categorized.get(cat_name, []), triples is None)
+                if t.id_tripla in admitted
+            ]
+            if members:
+                sections.append(self._render_section(cat_name, cat_data, members))
+        if omitted:
+            sections.append(marker.format(n=len(omitted)))
+        document = "\n\n".join(sections)
+        return KnowledgeDocument(
+            document=document,
+            tokens=estimate_tokens(document),
+            token_budget=token_budget,
+            rendered=len(admitted),
+            omitted=omitted,
+        )
+
+    async def _categorized(
+        self, graph_db: GraphDB, triples: Optional[List[LogicalTriple]]
     ) -> Dict[str, List[LogicalTriple]]:
+        """
+        Groups by ontological category: one routing-table lookup per triple.
+        No Python-side dedup needed: GraphDB stores one canonical row per
+        (subject, normalised predicate, object) and merges re-assertions on insert.
+        """
+        self._apply_changes(graph_db)
+        if triples is not None:
+            return self._categorize_triples(triples)
+        if self._graph is None:
+            await self._load_graph(graph_db)
+        return {cat: list(members.values()) for cat, members in self._graph.items()}
+
+    @staticmethod
+    def _display_order(members: List[LogicalTriple], whole_graph: bool) -> List[LogicalTriple]:
+        """Subgraph triples keep the caller's order; the whole graph follows GraphDB.get_all_triples (newest first)."""
+        if not whole_graph:
+            return members
+        return sorted(members, key=lambda t: (t.timestamp, t.id_tripla), reverse=True)
+
+    @staticmethod
+    def _line_cost(cat_name: str, cat_data: dict, triple: LogicalTriple, predicates_on_page: Set[str]) -> int:
+        """Characters a triple adds to its section, as laid out by _render_section."""
+        render_labels: Dict[str, str] = cat_data.get("render_labels", {})
+        if cat_name in ("esperienze_utente",):
+            prefix: str = render_labels.get(triple.predicate, "")
+            return len(f"\n  - {prefix} {triple.object_}" if prefix else f"\n  - {triple.object_}")
+        if triple.predicate in predicates_on_page:
+            # Functional predicates show a single value; multi-valued ones append to the same line
+            return 0 if is_single_valued(triple.predicate) else len(f", {triple.object_}")
+        readable_label: str = render_labels.get(triple.predicate, triple.predicate.replace("_", " ").title())
+        return len(f"\n  {readable_label}: {triple.object_}")
+
+    def _apply_changes(self, graph_db: GraphDB) -> None:
+        """Legge il delta del change feed: invalida le sezioni delle categorie toccate e aggiorna la copia del grafo."""
+        feed = graph_db.changes
+        if self._feed_seq is None:
+            self._feed_seq = feed.last_seq
+            return
+        try:
+            events = feed.since(self._feed_seq)
+        except ChangeFeedGap:
+            events = None
+        if events is None or any(e.op in ("clear", "reset") for e in events):
+            # Riscrittura massiva o delta perso: si riparte da zero
+            self._reset(feed.last_seq)
+            return
+
+        dirty: Set[str] = set()
+        for event in events:
+            row = event.data or {}
+            category = route_triple(row.get("subject", ""), row.get("predicate", ""))
+            dirty.add(category)
+            if self._graph is not None:
+                for previous, members in self._graph.items():
+                    if members.pop(event.key, None) is not None:
+                        dirty.add(previous)
+                        break
+                if event.op != "delete":
+                    self._graph[category][event.key] = LogicalTriple(**row)
+            self._feed_seq = event.seq
+        for category in dirty:
+            self._sections[category].clear()
+
+    def _reset(self, seq: int) -> None:
+        self._feed_seq = seq
+        self._graph = None
+        for cache in self._sections.values():
+            cache.clear()
+
+    async def _load_graph(self, graph_db: GraphDB) -> None:
+        # Gli eventi pubblicati durante la query restano nel delta del prossimo render:
+        # riapplicarli a triple già lette è idempotente, quindi nessuna modifica va persa
+        graph = {cat: {} for cat in KNOWLEDGE_CATEGORIES}
+        for triple in await graph_db.get_all_triples():
+            graph[route_triple(triple.subject, triple.predicate)][triple.id_tripla] = triple
+        self._graph = graph
+
+    def _categorize_triples(self, triples: List[LogicalTriple]) -> Dict[str, List[LogicalTriple]]:
         """
         Routes each triple into the correct ontological category
         based on (entity of subject + predicate).
         Orphan triples (unrecognised predicate) fall into 'esperienze_utente'.
         """
-        categorized: Dict[str, List[LogicalTriple]] = {
-            cat_name: [] for cat_name in categories
-        }
-
+        categorized: Dict[str, List[LogicalTriple]] = {cat_name: [] for cat_name in KNOWLEDGE_CATEGORIES}
         for triple in triples:
-            placed: bool = False
-            subject_lower: str = triple.subject.strip().lower()
-
-            for cat_name, cat_data in categories.items():
-                entity_lower: str = cat_data["entity"].lower()
-
-                if (
-                    subject_lower == entity_lower
-                    and triple.predicate in cat_data["predicates"]
-                ):
-                    categorized[cat_name].append(triple)
-                    placed = True
-                    break
-
-            if not placed:
-                categorized["esperienze_utente"].append(triple)
-
+            categorized[route_triple(triple.subject, triple.predicate)].append(triple)
         return categorized
 
-    def _render_document(
-        self, categorized: Dict[str, List[LogicalTriple]], categories: Dict[str, dict]
-    ) -> str:
+    def _render_section(self, cat_name: str, cat_data: dict, triples: List[LogicalTriple]) -> str:
         """
-        Generates the final document in structured natural language.
+        Generates one category section in structured natural language.
 
         'identity' and 'preference' categories are rendered as key-value pairs
         (e.g. Name: Marcello), while 'experiences' are rendered as bullet lists.
         """
-        sections: List[str] = []
-
-        for cat_name, cat_data in categories.items():
-            triples: List[LogicalTriple] = categorized.get(cat_name, [])
-
-            if not triples:
+        render_labels: Dict[str, str] = cat_data.get("render_labels", {})
+        label: str = cat_data["label"]
+
+        if cat_name in ("esperienze_utente",):
+            # Bullet list format for experiences
+            lines: List[str] = [f"{label}:"]
+            for t in triples:
+                prefix: str = render_labels.get(t.predicate, "")
+                if prefix:
+                    lines.append(f"  - {prefix} {t.object_}")
+                else:
+                    lines.append(f"  - {t.object_}")
+            return "\n".join(lines)
+
+        # Key-value format for identity and preferences.
+        # Functional predicates hold a single value (GraphDB supersedes the old one);
+        # multi-valued ones (e.g. hobby) are joined on one line.
+        lines = [f"{label}:"]
+        values_by_predicate: Dict[str, List[str]] = {}
+        for t in triples:
+            values = values_by_predicate.setdefault(t.predicate, [])
+            if is_single_valued(t.predicate) and values:
                 continue
+            values.append(t.object_)
 
-            render_labels: Dict[str, str] = cat_data.get("render_labels", {})
-            label: str = cat_data["label"]
-
-            if cat_name in ("esperienze_utente",):
-                # Bullet list format for experiences
-                lines: List[str] = [f"{label}:"]
-                for t in triples:
-                    prefix: str = render_labels.get(t.predicate, "")
-                    if prefix:
-                        lines.append(f"  - {prefix} {t.object_}")
-                    else:
-                        lines.append(f"  - {t.object_}")
-                sections.append("\n".join(lines))
-            else:
-                # Key-value format for identity and preferences
-                lines = [f"{label}:"]
-                seen_predicates: Set[str] = set()
-                for t in triples:
-                    if t.predicate in seen_predicates:
-                        continue
-                    seen_predicates.add(t.predicate)
-
-                    readable_label: str = render_labels.get(
-                        t.predicate, t.predicate.replace("_", " ").title()
-                    )
-                    lines.append(f"  {readable_label}: {t.object_}")
-                sections.append("\n".join(lines))
-
-        if not sections:
-            return ""
-
-        return "\n\n".join(sections)
+        for predicate, values in values_by_predicate.items():
+            readable_label: str = render_labels.get(
+                predicate, predicate.replace("_", " ").title()
+            )
+            lines.append(f"  {readable_label}: {', '.join(values)}")
+        return "\n".join(lines)
@@ -13,8 +13,9 @@ NB: le label localizzate (italiano, inglese, ecc.) vivono in locales.py.
     che è indipendente dalla lingua.
 """
 
-from typing import Dict, List
-from clam.core.locales import get_category_labels
+from typing import Dict, FrozenSet, List, Tuple
+from clam.core.locales import KNOWLEDGE_CATEGORY_LABELS, get_category_labels, get_predicate_synonyms
+from clam.core.predicate_normalizer import PredicateNormalizer
 from clam.config import CONFIG
 
 
@@ -23,11 +24,15 @@ from clam.config import CONFIG
 # The 'label' and 'render_labels' fields are intentionally left blank here;
 # they are fetched from locales.py at runtime via get_localized_categories().
 # 'entity' and 'predicates' are internal ontology keys that never change.
+# 'single_valued' lists the functional predicates of the category: a subject
+# has at most ONE current value for them (a new age replaces the old one).
+# Every other predicate is multi-valued (a user can have many hobbies).
 # ─────────────────────────────────────────────────────────────────────
 KNOWLEDGE_CATEGORIES: Dict[str, dict] = {
     "identita_utente": {
         "label": "",          # overridden by locales at runtime
         "predicates": ["ha_nome", "ha_eta", "ha_lavoro", "vive_a", "nazionalita"],
+        "single_valued": ["ha_nome", "ha_eta", "ha_lavoro", "vive_a", "nazionalita"],
         "entity": "Utente",
         "render_labels": {},  # overridden by locales at runtime
     },
@@ -37,6 +42,7 @@ KNOWLEDGE_CATEGORIES: Dict[str, dict] = {
             "preferisce_colore", "preferisce_animale", "preferisce_cibo",
             "preferisce_musica", "preferisce_film", "hobby"
         ],
+        "single_valued": [],
         "entity": "Utente",
         "render_labels": {},
     },
@@ -46,6 +52,7 @@ KNOWLEDGE_CATEGORIES: Dict[str, dict] = {
             "ha_visitato", "ha_conosciuto", "usa_tecnologia",
             "sa_fare", "fatto_generico"
         ],
+        "single_valued": [],
         "entity": "Utente",
         "render_labels": {},
     },
@@ -55,12 +62,55 @@ KNOWLEDGE_CATEGORIES: Dict[str, dict] = {
             "è", "ha_eta", "preferisce_animale", "preferisce_colore",
             "ha_imparato"
         ],
+        "single_valued": ["ha_eta"],
         "entity": "CLAM",
         "render_labels": {},
     },
 }
 
 
+# Cardinality is a property of the predicate, not of the subject:
+# "vive_a" is functional for the user and for anyone else the user mentions.
+SINGLE_VALUED_PREDICATES: FrozenSet[str] = frozenset(
+    pred
+    for category_data in KNOWLEDGE_CATEGORIES.values()
+    for pred in category_data.get("single_valued", [])
+)
+
+# Anchor entities of the ontology ("Utente", "CLAM"): every GraphRAG traversal
+# starts from them, so the profile and the identity are always in context.
+ROOT_ENTITIES: Tuple[str, ...] = tuple(dict.fromkeys(
+    category_data["entity"] for category_data in KNOWLEDGE_CATEGORIES.values()
+))
+
+
+def is_single_valued(predicate: str) -> bool:
+    """True if the (normalised) predicate admits only one current value per subject."""
+    return predicate in SINGLE_VALUED_PREDICATES
+
+
+# Category that receives the triples no category claims (unrecognised subject or predicate).
+FALLBACK_CATEGORY: str = "esperienze_utente"
+
+# Order in which categories fill a token-budgeted knowledge document: who the user is
+# and who CLAM is come first, the catch-all of experiences and orphan facts comes last.
+CATEGORY_PRIORITY: Tuple[str, ...] = (
+    "identita_utente", "identita_clam", "preferenze_utente", "esperienze_utente",
+)
+
+# Routing table (normalised entity, predicate) -> category, compiled once.
+# On overlaps the first category in KNOWLEDGE_CATEGORIES order wins, as in the old nested loop.
+CATEGORY_ROUTES: Dict[Tuple[str, str], str] = {}
+for _cat_name, _cat_data in KNOWLEDGE_CATEGORIES.items():
+    for _pred in _cat_data["predicates"]:
+        CATEGORY_ROUTES.setdefault((_cat_data["entity"].lower(), _pred), _cat_name)
+
+
+def route_triple(subject: str, predicate: str) -> str:
+    """Ontological category of a triple: one dict lookup instead of a scan over the categories."""
+    return CATEGORY_ROUTES.get((subject.strip().lower(), predicate), FALLBACK_CATEGORY)
+
+
 def get_localized_categories(lang: str = None) -> Dict[str, dict]:
     """
     Returns KNOWLEDGE_CATEGORIES enriched with localized label and render_labels
@@ -68,9 +118,17 @@ def get_localized_categories(lang: str = None) -> Dict[str, dict]:
 
     The structural fields (entity, predicates) remain unchanged so that
     the rest of the codebase never needs to know about languages.
+    The tables are resolved once per language and shared: callers must not mutate them.
     """
     effective_lang: str = lang or CONFIG.language
-    localized: Dict[str, dict] = get_category_labels(effective_lang)
+    cached = _LOCALIZED_CATEGORIES.get(effective_lang)
+    if cached is None:
+        cached = _LOCALIZED_CATEGORIES[effective_lang] = _localize_categories(effective_lang)
+    return cached
+
+
+def _localize_categories(lang: str) -> Dict[str, dict]:
+    localized: Dict[str, dict] = get_category_labels(lang)
 
     result: Dict[str, dict] = {}
     for cat_name, cat_data in KNOWLEDGE_CATEGORIES.items():
@@ -82,6 +140,12 @@ def get_localized_categories(lang: str = None) -> Dict[str, dict]:
     return result
 
 
+# Resolved label tables for every shipped language, built at import (startup).
+_LOCALIZED_CATEGORIES: Dict[str, Dict[str, dict]] = {
+    lang: _localize_categories(lang) for lang in KNOWLEDGE_CATEGORY_LABELS
+}
+
+
 # ─────────────────────────────────────────────────────────────────────
 # NORMALIZZAZIONE DEI PREDICATI
 # Mappa i predicati "liberi" che qwen2.5:3b tende a inventare
@@ -135,16 +199,29 @@ PREDICATE_NORMALIZATION: Dict[str, str] = {
 }
 
 
+# Indice precompilato (esatto, token-set, BK-tree) su predicati canonici, varianti note
+# e sinonimi multilingua di locales.py. Le mappature apprese le carica e le salva il GraphDB.
+# I predicati a valore singolo sostituiscono il valore corrente: mai mappature fuzzy verso di loro.
+PREDICATE_NORMALIZER = PredicateNormalizer(
+    canonical=list(dict.fromkeys(
+        pred for category_data in KNOWLEDGE_CATEGORIES.values() for pred in category_data["predicates"]
+    )),
+    aliases=PREDICATE_NORMALIZATION,
+    synonyms=get_predicate_synonyms(),
+    protected=SINGLE_VALUED_PREDICATES,
+)
+
+
 def normalize_predicate(raw_predicate: str) -> str:
     """
     Converte un predicato libero generato dall'LLM nel predicato
-    standard dell'ontologia. Se non lo trova, restituisce 'fatto_generico'.
+    standard dell'ontologia. Se non lo trova, lo restituisce ripulito
+    (e il normalizzatore lo conta tra i non mappati).
 
     Motivazione: qwen2.5:3b inventa predicati a caso ad ogni inferenza.
     Senza normalizzazione, il DB si riempie di varianti incompatibili.
     """
-    cleaned: str = raw_predicate.strip().lower()
-    return PREDICATE_NORMALIZATION.get(cleaned, cleaned)
+    return PREDICATE_NORMALIZER.normalize(raw_predicate)
 
 
 def get_allowed_predicates_prompt() -> str:
@@ -8,7 +8,7 @@ If an unknown code is requested, English ('en') is used as fallback.
               language MUST live here and nowhere else.
 """
 
-from typing import Dict, Any
+from typing import Any, Dict, List
 
 # ─────────────────────────────────────────────────────────────────────
 # FALLBACK language when requested code is not found
@@ -315,6 +315,80 @@ Ejemplo Formato JSON (USAR SOLO COMO ESTRUCTURA):
 }}""",
 }
 
+# ─────────────────────────────────────────────────────────────────────
+# EPISODE SUMMARY PROMPT
+# Used in episodic_compactor.py to compact old conversation turns.
+# The turns of one ISO week are passed as the user prompt.
+# ─────────────────────────────────────────────────────────────────────
+EPISODE_SUMMARY_PROMPTS: Dict[str, str] = {
+    "it": """\
+Riassumi le conversazioni tra l'Utente e CLAM riportate qui sotto.
+Scrivi al massimo 5 frasi in italiano, in terza persona, in ordine cronologico.
+Conserva nomi, numeri, date, decisioni e richieste dell'Utente. Non aggiungere nulla che non sia scritto.
+Rispondi SOLO con il riassunto.""",
+
+    "en": """\
+Summarise the conversations between the User and CLAM below.
+Write at most 5 sentences in English, in the third person, in chronological order.
+Keep names, numbers, dates, decisions and requests made by the User. Do not add anything that is not written.
+Reply ONLY with the summary.""",
+
+    "de": """\
+Fasse die folgenden Gespräche zwischen dem Benutzer und CLAM zusammen.
+Schreibe höchstens 5 Sätze auf Deutsch, in der dritten Person, in chronologischer Reihenfolge.
+Behalte Namen, Zahlen, Daten, Entscheidungen und Wünsche des Benutzers bei. Füge nichts hinzu, was nicht geschrieben steht.
+Antworte NUR mit der Zusammenfassung.""",
+
+    "fr": """\
+Résume les conversations ci-dessous entre l'Utilisateur et CLAM.
+Écris au maximum 5 phrases en français, à la troisième personne, dans l'ordre chronologique.
+Conserve les noms, nombres, dates, décisions et demandes de l'Utilisateur. N'ajoute rien qui ne soit pas écrit.
+Réponds UNIQUEMENT avec le résumé.""",
+
+    "es": """\
+Resume las conversaciones entre el Usuario y CLAM que aparecen abajo.
+Escribe como máximo 5 frases en español, en tercera persona, en orden cronológico.
+Conserva nombres, números, fechas, decisiones y peticiones del Usuario. No añadas nada que no esté escrito.
+Responde SOLO con el resumen.""",
+}
+
+# ─────────────────────────────────────────────────────────────────────
+# CONSOLIDATION PROMPT
+# Used in consolidation.py to merge paraphrases of the same fact.
+# The differing statements of one cluster are passed as a bullet list.
+# ─────────────────────────────────────────────────────────────────────
+CONSOLIDATION_PROMPTS: Dict[str, str] = {
+    "it": """\
+Le affermazioni qui sotto dicono la stessa cosa sull'Utente con parole diverse.
+Fondile in UNA sola frase in italiano che conservi ogni dettaglio (nomi, numeri, date).
+Non aggiungere nulla che non sia scritto.
+Rispondi SOLO con la frase.""",
+
+    "en": """\
+The statements below say the same thing about the User in different words.
+Merge them into ONE sentence in English that keeps every detail (names, numbers, dates).
+Do not add anything that is not written.
+Reply ONLY with the sentence.""",
+
+    "de": """\
+Die folgenden Aussagen sagen mit anderen Worten dasselbe über den Benutzer.
+Fasse sie zu EINEM Satz auf Deutsch zusammen, der jedes Detail (Namen, Zahlen, Daten) bewahrt.
+Füge nichts hinzu, was nicht geschrieben steht.
+Antworte NUR mit dem Satz.""",
+
+    "fr": """\
+Les affirmations ci-dessous disent la même chose sur l'Utilisateur avec des mots différents.
+Fusionne-les en UNE seule phrase en français qui conserve chaque détail (noms, nombres, dates).
+N'ajoute rien qui ne soit pas écrit.
+Réponds UNIQUEMENT avec la phrase.""",
+
+    "es": """\
+Las afirmaciones de abajo dicen lo mismo sobre el Usuario con palabras distintas.
+Combínalas en UNA sola frase en español que conserve cada detalle (nombres, números, fechas).
+No añadas nada que no esté escrito.
+Responde SOLO con la frase.""",
+}
+
 # ─────────────────────────────────────────────────────────────────────
 # KNOWLEDGE DOCUMENT STRINGS
 # Used in knowledge_renderer.py and agent.py for the document injected
@@ -333,6 +407,11 @@ KNOWLEDGE_DOCUMENT_STRINGS: Dict[str, Dict[str, str]] = {
         # Injected into the context block within the system prompt
         "observed_header": "COSE CHE HO OSSERVATO (sfumature e contesto)",
         "no_observed":     "Nessun fatto speciale presente.",
+        # Past conversation turns (episodic memory) injected into the context block
+        "episodes_header": "CONVERSAZIONI PASSATE (ricordi di altre sessioni)",
+        "episode_user":    "Utente",
+        # Last line of a token-budgeted knowledge document: facts left out for lack of space
+        "omitted_marker":  "(+{n} altri fatti omessi)",
         # Log messages inserted dynamically by the WebSocket handler
         "new_node_log":    "Nuova Ipotesi",
         "memory_reset_log":"Memoria globale azzerata dall'utente.",
@@ -346,6 +425,9 @@ KNOWLEDGE_DOCUMENT_STRINGS: Dict[str, Dict[str, str]] = {
         "graph_empty":     "No logical truths established yet.",
         "observed_header": "THINGS I HAVE OBSERVED (nuances and context)",
         "no_observed":     "No special facts present.",
+        "episodes_header": "PAST CONVERSATIONS (memories from earlier sessions)",
+        "episode_user":    "User",
+        "omitted_marker":  "(+{n} more facts omitted)",
         "new_node_log":    "New Hypothesis",
         "memory_reset_log":"Global memory wiped by user.",
         "conn_error":      "Connection error to server.",
@@ -358,6 +440,9 @@ KNOWLEDGE_DOCUMENT_STRINGS: Dict[str, Dict[str, str]] = {
         "graph_empty":     "Keine logischen Wahrheiten etabliert.",
         "observed_header": "DINGE, DIE ICH BEOBACHTET HABE (Nuancen und Kontext)",
         "no_observed":     "Keine besonderen Fakten vorhanden.",
+        "episodes_header": "FRÜHERE GESPRÄCHE (Erinnerungen an frühere Sitzungen)",
+        "episode_user":    "Benutzer",
+        "omitted_marker":  "(+{n} weitere Fakten ausgelassen)",
         "new_node_log":    "Neue Hypothese",
         "memory_reset_log":"Globaler Speicher vom Benutzer gelöscht.",
         "conn_error":      "Verbindungsfehler zum Server.",
@@ -370,6 +455,9 @@ KNOWLEDGE_DOCUMENT_STRINGS: Dict[str, Dict[str, str]] = {
         "graph_empty":     "Aucune vérité logique établie.",
         "observed_header": "CHOSES QUE J'AI OBSERVÉES (nuances et contexte)",
         "no_observed":     "Aucun fait spécial présent.",
+        "episodes_header": "CONVERSATIONS PASSÉES (souvenirs de sessions précédentes)",
+        "episode_user":    "Utilisateur",
+        "omitted_marker":  "(+{n} autres faits omis)",
         "new_node_log":    "Nouvelle Hypothèse",
         "memory_reset_log":"Mémoire globale effacée par l'utilisateur.",
         "conn_error":      "Erreur de connexion au serveur.",
@@ -382,6 +470,9 @@ KNOWLEDGE_DOCUMENT_STRINGS: Dict[str, Dict[str, str]] = {
         "graph_empty":     "No hay verdades lógicas establecidas.",
         "observed_header": "COSAS QUE HE OBSERVADO (matices y contexto)",
         "no_observed":     "No hay hechos especiales presentes.",
+        "episodes_header": "CONVERSACIONES PASADAS (recuerdos de sesiones anteriores)",
+        "episode_user":    "Usuario",
+        "omitted_marker":  "(+{n} hechos más omitidos)",
         "new_node_log":    "Nueva Hipótesis",
         "memory_reset_log":"Memoria global borrada por el usuario.",
         "conn_error":      "Error de conexión al servidor.",
@@ -582,6 +673,86 @@ KNOWLEDGE_CATEGORY_LABELS: Dict[str, Dict[str, Any]] = {
 }
 
 
+# ─────────────────────────────────────────────────────────────────────
+# PREDICATE SYNONYMS
+# Used in predicate_normalizer.py: free-form predicates the LLM tends to
+# produce, mapped to the ontology predicates. Every language is indexed
+# at once (the model does not always answer in the configured language),
+# together with the render labels above.
+# ─────────────────────────────────────────────────────────────────────
+PREDICATE_SYNONYMS: Dict[str, Dict[str, List[str]]] = {
+    "it": {
+        "ha_nome": ["chiamato", "nome_utente"],
+        "ha_eta": ["ha_anni", "eta_utente"],
+        "ha_lavoro": ["lavora", "mestiere", "occupazione"],
+        "vive_a": ["abita_a", "risiede_a", "abita_in", "vive_in"],
+        "preferisce_musica": ["musica_preferita", "genere_preferito"],
+        "preferisce_film": ["film_preferito"],
+        "hobby": ["passatempo", "passione"],
+        "sa_fare": ["capace_di", "abilita"],
+        "ha_imparato": ["ha_appreso"],
+    },
+    "en": {
+        "ha_nome": ["has_name", "is_named", "is_called", "called"],
+        "ha_eta": ["has_age", "is_aged", "years_old"],
+        "ha_lavoro": ["job", "works_as", "occupation", "profession"],
+        "vive_a": ["lives_in", "resides_in", "lives_at"],
+        "nazionalita": ["nationality", "is_from"],
+        "preferisce_colore": ["favorite_color", "likes_color", "prefers_color"],
+        "preferisce_animale": ["favorite_animal", "likes_animal", "prefers_animal"],
+        "preferisce_cibo": ["favorite_food", "likes_food", "prefers_food"],
+        "preferisce_musica": ["favorite_music", "likes_music", "listens_to"],
+        "preferisce_film": ["favorite_film", "favorite_movie", "likes_movie"],
+        "hobby": ["hobbies", "pastime"],
+        "ha_visitato": ["visited", "has_been_to", "travelled_to"],
+        "ha_conosciuto": ["met", "has_met"],
+        "usa_tecnologia": ["uses_technology", "works_with"],
+        "sa_fare": ["is_able_to", "skill"],
+        "ha_imparato": ["learned", "has_learned"],
+        "è": ["is", "is_a"],
+    },
+    "de": {
+        "ha_nome": ["heisst", "heißt"],
+        "ha_eta": ["ist_alt", "jahre_alt"],
+        "ha_lavoro": ["arbeitet_als"],
+        "vive_a": ["wohnt_in", "lebt_in"],
+        "preferisce_colore": ["lieblingsfarbe"],
+        "preferisce_animale": ["lieblingstier"],
+        "preferisce_cibo": ["lieblingsessen"],
+        "preferisce_musica": ["lieblingsmusik"],
+        "preferisce_film": ["lieblingsfilm"],
+        "ha_visitato": ["besuchte", "war_in"],
+        "ha_conosciuto": ["kennt", "traf"],
+    },
+    "fr": {
+        "ha_nome": ["s_appelle"],
+        "ha_eta": ["a_ans"],
+        "ha_lavoro": ["travaille_comme", "métier"],
+        "vive_a": ["habite_à", "vit_à"],
+        "preferisce_colore": ["couleur_préférée"],
+        "preferisce_animale": ["animal_préféré"],
+        "preferisce_cibo": ["plat_préféré"],
+        "preferisce_musica": ["musique_préférée"],
+        "preferisce_film": ["film_préféré"],
+        "ha_visitato": ["a_visité"],
+        "ha_conosciuto": ["connaît", "a_rencontré"],
+    },
+    "es": {
+        "ha_nome": ["se_llama"],
+        "ha_eta": ["tiene_años"],
+        "ha_lavoro": ["trabaja_como", "profesión"],
+        "vive_a": ["vive_en"],
+        "preferisce_colore": ["color_favorito"],
+        "preferisce_animale": ["animal_favorito"],
+        "preferisce_cibo": ["comida_favorita"],
+        "preferisce_musica": ["música_favorita"],
+        "preferisce_film": ["película_favorita"],
+        "ha_visitato": ["ha_visitado", "visitó"],
+        "ha_conosciuto": ["conoce", "conoció"],
+    },
+}
+
+
 # ─────────────────────────────────────────────────────────────────────
 # PUBLIC API
 # ─────────────────────────────────────────────────────────────────────
@@ -601,11 +772,37 @@ def get_inference_prompt(lang: str) -> str:
     return INFERENCE_SYSTEM_PROMPTS.get(lang, INFERENCE_SYSTEM_PROMPTS[FALLBACK_LANG])
 
 
+def get_episode_summary_prompt(lang: str) -> str:
+    """Returns the episodic compaction (conversation summary) prompt in the requested language."""
+    return EPISODE_SUMMARY_PROMPTS.get(lang, EPISODE_SUMMARY_PROMPTS[FALLBACK_LANG])
+
+
+def get_consolidation_prompt(lang: str) -> str:
+    """Returns the LTM consolidation (paraphrase merge) prompt in the requested language."""
+    return CONSOLIDATION_PROMPTS.get(lang, CONSOLIDATION_PROMPTS[FALLBACK_LANG])
+
+
 def get_knowledge_strings(lang: str) -> Dict[str, str]:
     """Returns UI/document strings (headers, empty-state messages) for the language."""
     return KNOWLEDGE_DOCUMENT_STRINGS.get(lang, KNOWLEDGE_DOCUMENT_STRINGS[FALLBACK_LANG])
 
 
+def get_predicate_synonyms() -> Dict[str, List[str]]:
+    """
+    Returns predicate -> synonyms across all languages, render labels included
+    (e.g. "Lives in" -> "lives_in" for vive_a). Used to build the predicate index.
+    """
+    merged: Dict[str, List[str]] = {}
+    for lang in KNOWLEDGE_CATEGORY_LABELS:
+        for category in KNOWLEDGE_CATEGORY_LABELS[lang].values():
+            for predicate, label in category["render_labels"].items():
+                if label:
+                    merged.setdefault(predicate, []).append(label)
+        for predicate, synonyms in PREDICATE_SYNONYMS.get(lang, {}).items():
+            merged.setdefault(predicate, []).extend(synonyms)
+    return {predicate: list(dict.fromkeys(synonyms)) for predicate, synonyms in merged.items()}
+
+
 def get_category_labels(lang: str) -> Dict[str, Any]:
     """
     Returns the category label dict for the language.
@@ -0,0 +1,133 @@
+"""
+Strumentazione leggera per la diagnostica runtime di CLAM.
+
+Niente dipendenze esterne (Prometheus & co.): contatori in-process che la dashboard
+e l'endpoint /api/stats possono leggere in qualsiasi momento.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+
+class WaitStats:
+    """Accumula i tempi di attesa su una risorsa contesa (lock, pool di connessioni)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, waited_seconds: float) -> None:
+        waited_ms = waited_seconds * 1000
+        self.count += 1
+        self.total_ms += waited_ms
+        if waited_ms > self.max_ms:
+            self.max_ms = waited_ms
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+@asynccontextmanager
+async def timed_lock(lock: asyncio.Lock, stats: WaitStats) -> AsyncIterator[None]:
+    """`async with lock` che registra in `stats` quanto si è atteso per acquisirlo."""
+    start = time.perf_counter()
+    async with lock:
+        stats.record(time.perf_counter() - start)
+        yield
+
+
+class AsyncRWLock:
+    """
+    Lock lettori/scrittore per asyncio: più lettori in parallelo, scrittore esclusivo.
+    Con uno scrittore in coda i nuovi lettori aspettano, così le scritture non muoiono di fame
+    sotto un flusso continuo di ricerche.
+    """
+
+    def __init__(self, name: str):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self.read_wait = WaitStats(f"{name}_read")
+        self.write_wait = WaitStats(f"{name}_write")
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and self._writers_waiting == 0)
+            self._readers += 1
+        self.read_wait.record(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        async with self._cond:
+            self._writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            finally:
+                self._writers_waiting -= 1
+                # Se l'attesa è stata cancellata, i lettori fermi dietro a questo scrittore ripartono
+                self._cond.notify_all()
+            self._writer = True
+        self.write_wait.record(time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {"read_wait": self.read_wait.snapshot(), "write_wait": self.write_wait.snapshot()}
+
+
+class LoopLagMonitor:
+    """
+    Misura gli stalli dell'event loop: un task dorme `interval` secondi e registra di quanto
+    si è svegliato in ritardo. Un ritardo alto = qualcuno ha bloccato il loop (I/O sincrono,
+    calcolo pesante) e nel frattempo WebSocket, richieste e background loop erano fermi.
+    """
+
+    def __init__(self, interval_seconds: float, stall_threshold_seconds: float):
+        self.interval = interval_seconds
+        self.stall_threshold = stall_threshold_seconds
+        self.lag = WaitStats("event_loop_lag")
+        self.stalls = 0
+        self.last_stall_ms = 0.0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag.record(lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                self.last_stall_ms = lag * 1000
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            **self.lag.snapshot(),
+            "stalls": self.stalls,
+            "stall_threshold_ms": round(self.stall_threshold * 1000, 1),
+            "last_stall_ms": round(self.last_stall_ms, 3),
+        }
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class MemoryNode(BaseModel):
@@ -24,6 +24,20 @@ class VectorDBNode(BaseModel):
     descrizione: str
     metadata: dict = Field(default_factory=dict, description="Metadati strutturati (timestamp, legami Zettelkasten z-links, score originario).")
 
+class MemoryHit(BaseModel):
+    """
+    Risultato della ricerca ibrida sulla LTM: posizione nelle due classifiche (vettoriale e lessicale)
+    e punteggio fuso con Reciprocal Rank Fusion.
+    """
+    id_concetto: str
+    descrizione: str
+    metadata: dict = Field(default_factory=dict)
+    score: float = Field(default=0.0, description="RRF: somma di 1 / (k + rank) sulle classifiche in cui compare")
+    vector_rank: Optional[int] = Field(default=None, description="Posizione nella ricerca vettoriale (1 = migliore)")
+    lexical_rank: Optional[int] = Field(default=None, description="Posizione nella ricerca BM25 (1 = migliore)")
+    link_hops: int = Field(default=0, description="0 = risultato diretto, N = raggiunto con N salti nel grafo dei z-links")
+    linked_from: Optional[str] = Field(default=None, description="Documento da cui parte il legame (solo per link_hops > 0)")
+
 class LogicalTriple(BaseModel):
     """
     Rappresentazione di un'asserzione logica incrollabile in formato Soggetto-Predicato-Oggetto.
@@ -35,3 +49,23 @@ class LogicalTriple(BaseModel):
     object_: str = Field(..., description="L'oggetto dell'azione, es. 'Marcello'")
     confidence: int = Field(default=1, description="Forza della verità (1-5)")
     timestamp: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class Subgraph(BaseModel):
+    """
+    Porzione del Knowledge Graph raggiunta da una traversata multi-hop (GraphRAG).
+    Il contesto passato all'LLM dipende dalla rilevanza rispetto ai seed, non dalla dimensione del grafo.
+    """
+    seeds: List[str] = Field(default_factory=list, description="Entità di partenza (normalizzate)")
+    entities: Dict[str, int] = Field(default_factory=dict, description="Entità raggiunte (normalizzate) → profondità minima")
+    triples: List[LogicalTriple] = Field(default_factory=list, description="Archi del sottografo, per confidence decrescente")
+
+class KnowledgeDocument(BaseModel):
+    """
+    Documento di conoscenza generato entro un budget di token (KnowledgeRenderer.render_budgeted).
+    Le triple rimaste fuori non vanno perse: il retriever le può proporre quando servono.
+    """
+    document: str = ""
+    tokens: int = Field(default=0, description="Token stimati del documento")
+    token_budget: int = 0
+    rendered: int = Field(default=0, description="Triple incluse nel documento")
+    omitted: List[LogicalTriple] = Field(default_factory=list, description="Triple escluse, dalla più importante")
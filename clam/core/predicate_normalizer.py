@@ -0,0 +1,309 @@
+"""
+Normalizzazione dei predicati generati dall'LLM verso quelli dell'ontologia.
+
+La vecchia normalize_predicate era un lookup esatto su PREDICATE_NORMALIZATION: ogni variante
+mai vista ("colore_preferito_utente") passava così com'era e frammentava il grafo (più righe,
+più deduplicazione, più token nel prompt). Qui l'indice è precompilato una volta e la decisione
+segue quattro livelli, dal più economico:
+
+1. cache delle decisioni già prese (predicato grezzo -> esito);
+2. lookup esatto su forma ripulita e senza accenti: predicati canonici, varianti note
+   (PREDICATE_NORMALIZATION), sinonimi multilingua e label di locales.py, mappature apprese;
+3. token-set: parole del predicato (senza articoli, preposizioni e nomi delle entità)
+   confrontate per Jaccard con quelle delle chiavi note, tramite un indice invertito;
+4. distanza di edit: BK-tree sulle chiavi note, per i refusi ("preferisce_colre").
+
+Le decisioni fuzzy (3 e 4) diventano mappature apprese: entrano nel lookup esatto e vengono
+salvate dal GraphDB nella tabella `predicate_mappings`, quindi sopravvivono al riavvio.
+Due eccezioni restano solo suggerimenti (il predicato passa invariato, `get_stats()` le elenca):
+- i predicati a valore singolo (`protected`): una mappatura sbagliata sostituirebbe il valore
+  corrente ("lived_in Roma" al posto di "vive_a Milano");
+- le varianti che differiscono solo nella desinenza di una parola ("lived"/"lives",
+  "lavorava"/"lavora"): tempo o flessione cambiano il significato, non sono refusi.
+Un predicato che nessun livello riconosce passa invariato (ripulito) e viene contato:
+`get_stats()` riporta il tasso di predicati non mappati e i più frequenti.
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from clam.config import CONFIG
+
+# Parole che non distinguono un predicato: articoli, preposizioni, ausiliari e le entità ancora
+# dell'ontologia ("colore_preferito_utente" = "colore_preferito").
+STOP_TOKENS: frozenset = frozenset({
+    "a", "al", "alla", "da", "di", "del", "della", "e", "il", "in", "la", "le", "lo", "gli", "i", "un", "una", "ha",
+    "the", "of", "to", "at", "an", "is", "has", "his", "her", "their",
+    "der", "die", "das", "des", "ist", "hat", "im",
+    "de", "du", "des", "l", "s", "est", "au",
+    "el", "los", "las", "en", "es", "su",
+    "utente", "user", "benutzer", "utilisateur", "usuario", "clam",
+})
+
+_SEPARATORS_RE = re.compile(r"[\s\-'’.]+")
+
+# Esito di una normalizzazione: (predicato risultante, metodo)
+Decision = Tuple[str, str]
+METHODS = ("exact", "token_set", "edit_distance", "unmapped")
+
+
+def clean_predicate(raw: str) -> str:
+    """Forma ripulita: minuscolo, separatori (spazi, trattini, apostrofi) come underscore."""
+    return _SEPARATORS_RE.sub("_", raw.strip().lower()).strip("_")
+
+
+def fold(key: str) -> str:
+    """Chiave di confronto: senza accenti ('préférée' = 'preferee')."""
+    return "".join(c for c in unicodedata.normalize("NFKD", key) if not unicodedata.combining(c))
+
+
+def tokens_of(key: str) -> frozenset:
+    tokens = [t for t in key.split("_") if t]
+    content = [t for t in tokens if t not in STOP_TOKENS]
+    return frozenset(content or tokens)
+
+
+def differs_in_ending(a: str, b: str) -> bool:
+    """
+    True se due chiavi con le stesse parole differiscono solo nella desinenza di almeno una parola:
+    ultima lettera diversa ('lived'/'lives') o una parola prefisso dell'altra ('lavora'/'lavorava').
+    Un refuso interno ('colre'/'colore') conserva la fine della parola e non conta.
+    """
+    words_a, words_b = a.split("_"), b.split("_")
+    if len(words_a) != len(words_b):
+        return False
+    for x, y in zip(words_a, words_b):
+        if x != y and (not x or not y or x[-1] != y[-1] or x.startswith(y) or y.startswith(x)):
+            return True
+    return False
+
+
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Albero di Burkhard-Keller sulla distanza di Levenshtein: ricerca entro d senza confrontare tutte le chiavi."""
+
+    def __init__(self):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+
+    def add(self, key: str) -> None:
+        if self._root is None:
+            self._root = (key, {})
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(key, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (key, {})
+                return
+            node = child
+
+    def search(self, key: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Chiavi entro `max_distance`, dalla più vicina."""
+        if self._root is None:
+            return []
+        found: List[Tuple[int, str]] = []
+        stack = [self._root]
+        while stack:
+            node_key, children = stack.pop()
+            distance = levenshtein(key, node_key)
+            if distance <= max_distance:
+                found.append((distance, node_key))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+
+class PredicateNormalizer:
+    """Indice precompilato dei predicati noti, con cache delle decisioni e mappature apprese."""
+
+    def __init__(
+        self,
+        canonical: Sequence[str],
+        aliases: Dict[str, str],
+        synonyms: Dict[str, Sequence[str]],
+        protected: Iterable[str] = (),
+    ):
+        settings = CONFIG.memory.graph
+        self.fuzzy = settings.predicate_fuzzy_matching
+        self.token_threshold = settings.predicate_token_threshold
+        self.max_edit_distance = settings.predicate_max_edit_distance
+        self.cache_size = settings.predicate_cache_size
+        # Predicati raggiungibili solo per lookup esatto (canonici, varianti note, sinonimi)
+        self.protected = frozenset(protected)
+
+        # Chiave piegata -> predicato canonico. In caso di conflitto vince la prima fonte:
+        # canonici, poi varianti di PREDICATE_NORMALIZATION, poi sinonimi di locales.py.
+        self._exact: Dict[str, str] = {}
+        self._tokens: Dict[str, frozenset] = {}
+        self._by_token: Dict[str, Set[str]] = {}
+        self._bk = BKTree()
+        for predicate in canonical:
+            self._index(predicate, predicate)
+        for variant, predicate in aliases.items():
+            self._index(variant, predicate)
+        for predicate, words in synonyms.items():
+            for word in words:
+                self._index(word, predicate)
+        self._static_keys = len(self._exact)
+
+        self._learned: Dict[str, Decision] = {}
+        self._pending: List[Tuple[str, str, str, str]] = []
+        self._decisions: Dict[str, Decision] = {}
+        # Corrispondenze fuzzy non applicate (verso predicati protetti): chiave -> (predicato, metodo)
+        self.suggestions: Dict[str, Decision] = {}
+        self.calls = 0
+        self.cache_hits = 0
+        self.by_method: Counter = Counter()
+        self.unmapped: Counter = Counter()
+
+    def _index(self, key: str, predicate: str) -> None:
+        folded = fold(clean_predicate(key))
+        if not folded or folded in self._exact:
+            return
+        self._exact[folded] = predicate
+        tokens = tokens_of(folded)
+        self._tokens[folded] = tokens
+        for token in tokens:
+            self._by_token.setdefault(token, set()).add(folded)
+        self._bk.add(folded)
+
+    def normalize(self, raw_predicate: str) -> str:
+        """Predicato dell'ontologia corrispondente, oppure il predicato ripulito se nessun livello lo riconosce."""
+        return self.decide(raw_predicate)[0]
+
+    def decide(self, raw_predicate: str) -> Decision:
+        self.calls += 1
+        decision = self._decisions.get(raw_predicate)
+        if decision is not None:
+            self.cache_hits += 1
+        else:
+            decision = self._decide(raw_predicate)
+            if len(self._decisions) >= self.cache_size:
+                self._decisions.clear()
+            self._decisions[raw_predicate] = decision
+        predicate, method = decision
+        self.by_method[method] += 1
+        if method == "unmapped":
+            self.unmapped[predicate] += 1
+        return decision
+
+    def _decide(self, raw_predicate: str) -> Decision:
+        cleaned = clean_predicate(raw_predicate)
+        folded = fold(cleaned)
+        predicate = self._exact.get(folded)
+        if predicate is not None:
+            return predicate, "exact"
+        learned = self._learned.get(folded)
+        if learned is not None:
+            return learned[0], "exact"
+        if not self.fuzzy or not folded:
+            return cleaned, "unmapped"
+
+        for method, match in (("token_set", self._match_tokens), ("edit_distance", self._match_edit)):
+            predicate = match(folded)
+            if predicate is None:
+                continue
+            if predicate in self.protected:
+                self.suggestions[folded] = (predicate, method)
+                return cleaned, "unmapped"
+            self._learn(folded, predicate, method)
+            return predicate, method
+        return cleaned, "unmapped"
+
+    def _match_tokens(self, folded: str) -> Optional[str]:
+        """Jaccard sulle parole, con candidati dall'indice invertito. Esiti ambigui (due canonici a pari merito) scartati."""
+        tokens = tokens_of(folded)
+        candidates: Set[str] = set()
+        for token in tokens:
+            candidates |= self._by_token.get(token, set())
+        best_score, best = 0.0, set()
+        for key in candidates:
+            other = self._tokens[key]
+            score = len(tokens & other) / len(tokens | other)
+            if score > best_score:
+                best_score, best = score, {self._exact[key]}
+            elif score == best_score:
+                best.add(self._exact[key])
+        if best_score >= self.token_threshold and len(best) == 1:
+            return next(iter(best))
+        return None
+
+    def _match_edit(self, folded: str) -> Optional[str]:
+        """
+        Refusi: un errore ogni 6 caratteri (nessuno sotto i 6: 'is_at' non diventa 'is_a').
+        Le chiavi che differiscono solo nella desinenza non sono refusi e vengono scartate.
+        """
+        max_distance = min(self.max_edit_distance, len(folded) // 6)
+        if max_distance <= 0:
+            return None
+        found = [(d, key) for d, key in self._bk.search(folded, max_distance) if not differs_in_ending(folded, key)]
+        if not found:
+            return None
+        nearest = found[0][0]
+        predicates = {self._exact[key] for distance, key in found if distance == nearest}
+        return next(iter(predicates)) if len(predicates) == 1 else None
+
+    def _learn(self, folded: str, predicate: str, method: str) -> None:
+        self._learned[folded] = (predicate, method)
+        self._pending.append((folded, predicate, method, datetime.now(timezone.utc).isoformat()))
+        print(f"[Predicates] 🔗 Nuova mappatura ({method}): '{folded}' → '{predicate}'")
+
+    def load_learned(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """Mappature salvate (raw, canonical, method), caricate dal GraphDB all'avvio. Quelle verso predicati protetti restano suggerimenti."""
+        count = 0
+        for raw, predicate, method in rows:
+            if predicate in self.protected:
+                self.suggestions[raw] = (predicate, method)
+                continue
+            self._learned[raw] = (predicate, method)
+            count += 1
+        self._decisions.clear()
+        return count
+
+    def drain_learned(self) -> List[Tuple[str, str, str, str]]:
+        """Mappature apprese non ancora salvate (raw, canonical, method, learned_at)."""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def forget(self, raw_predicate: str) -> bool:
+        """Rimuove una mappatura appresa sbagliata: il predicato torna a essere valutato da capo."""
+        folded = fold(clean_predicate(raw_predicate))
+        self._pending = [p for p in self._pending if p[0] != folded]
+        self._decisions.clear()
+        return self._learned.pop(folded, None) is not None
+
+    def learned_mappings(self) -> Dict[str, Decision]:
+        return dict(self._learned)
+
+    def get_stats(self) -> dict:
+        mapped = self.calls - self.by_method["unmapped"]
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "by_method": {method: self.by_method[method] for method in METHODS},
+            "mapped": mapped,
+            "unmapped_rate": round(self.by_method["unmapped"] / self.calls, 4) if self.calls else 0.0,
+            "top_unmapped": self.unmapped.most_common(10),
+            "index_keys": self._static_keys,
+            "learned": len(self._learned),
+            "pending": len(self._pending),
+            "suggestions": {raw: predicate for raw, (predicate, _) in list(self.suggestions.items())[-20:]},
+        }
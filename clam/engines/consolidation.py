@@ -0,0 +1,209 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from clam.config import CONFIG
+from clam.core.locales import get_consolidation_prompt
+from clam.core.models import VectorDBNode
+from clam.llm.ollama_client import OllamaClient
+from clam.memory.long_term import LongTermMemory
+
+
+class ConsolidationReport(BaseModel):
+    """Esito di un ciclo di consolidamento della Memoria Semantica."""
+    before: int = 0
+    after: int = 0
+    clusters: int = 0
+    merged: int = Field(default=0, description="Fatti assorbiti in un fatto canonico (ed eliminati)")
+    llm_summaries: int = Field(default=0, description="Cluster con testi diversi, riformulati dall'LLM")
+    skipped_clusters: int = Field(default=0, description="Cluster oltre max_cluster_size o senza risposta dall'LLM")
+    duration_ms: float = 0.0
+    finished_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
+def cluster_by_similarity(vectors: np.ndarray, threshold: float, block_size: int) -> List[List[int]]:
+    """
+    Gruppi di righe con similarità coseno >= threshold (chiusura transitiva, union-find).
+    La matrice delle similarità si calcola a blocchi di righe contro il triangolo superiore,
+    quindi la memoria resta O(block_size × N) anche con decine di migliaia di fatti.
+    """
+    count = len(vectors)
+    if count < 2:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.clip(norms, 1e-12, None)
+
+    parent = np.arange(count)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for start in range(0, count, block_size):
+        block = unit[start:start + block_size]
+        similarities = block @ unit[start:].T
+        # Solo le coppie (i, j) con j > i: diagonale e triangolo inferiore esclusi
+        rows, cols = np.nonzero(np.triu(similarities >= threshold, k=1))
+        for i, j in zip(rows + start, cols + start):
+            root_i, root_j = find(int(i)), find(int(j))
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _normalized_text(text: str) -> str:
+    return " ".join((text or "").casefold().split()).strip(" .!?")
+
+
+class ConsolidationEngine:
+    """
+    Consolidamento offline della Memoria Semantica. Fatti diretti (_save_fact) e promozioni del GC
+    riempiono la collezione di parafrasi dello stesso fatto: ogni ricerca ne restituisce diverse
+    e spreca token di contesto. Nei momenti di inattività:
+      1. legge gli embedding già salvati (nessun ricalcolo) e li raggruppa per similarità coseno
+         con NumPy vettorializzato + union-find;
+      2. ogni cluster diventa un solo fatto canonico (id del membro più centrale). Se i testi
+         coincidono si tiene quello; se differiscono l'LLM li fonde in una frase;
+      3. i membri assorbiti vengono eliminati ma restano tracciati nei metadati del canonico
+         (`merged_from`, `merged_sources` con testo e origine), e i loro z-links passano al canonico.
+    """
+    def __init__(self, llm: OllamaClient, ltm: LongTermMemory):
+        self.llm = llm
+        self.ltm = ltm
+        self.last_report: Optional[ConsolidationReport] = None
+        self._last_run: Optional[float] = None
+        # Un ciclo alla volta: background loop ed endpoint manuale non si sovrappongono
+        self._lock = asyncio.Lock()
+
+    async def maybe_run(self) -> Optional[ConsolidationReport]:
+        """Chiamato dal background loop: esegue un ciclo al più ogni `interval_minutes`."""
+        settings = CONFIG.memory.consolidation
+        if not settings.enabled:
+            return None
+        if self._last_run is not None and time.monotonic() - self._last_run < settings.interval_minutes * 60:
+            return None
+        return await self.run()
+
+    async def _load(self, max_entries: int):
+        ids, documents, metadatas, vectors = [], [], [], []
+        async for node, embedding in self.ltm.iter_nodes("semantic", include_embeddings=True):
+            ids.append(node.id_concetto)
+            documents.append(node.descrizione)
+            metadatas.append(node.metadata)
+            vectors.append(embedding)
+            if len(ids) >= max_entries:
+                break
+        return ids, documents, metadatas, np.asarray(vectors, dtype=np.float32)
+
+    async def run(self) -> ConsolidationReport:
+        async with self._lock:
+            return await self._run_cycle()
+
+    async def _run_cycle(self) -> ConsolidationReport:
+        settings = CONFIG.memory.consolidation
+        self._last_run = time.monotonic()
+        start = time.perf_counter()
+        report = ConsolidationReport(before=await self.ltm.count("semantic"))
+
+        ids, documents, metadatas, vectors = await self._load(settings.max_entries)
+        # Calcolo NumPy in un thread: l'event loop resta libero
+        clusters = await asyncio.to_thread(
+            cluster_by_similarity, vectors, settings.similarity_threshold, settings.block_size
+        ) if len(ids) > 1 else []
+        report.clusters = len(clusters)
+
+        system_prompt = get_consolidation_prompt(CONFIG.language)
+        canonicals: List[VectorDBNode] = []
+        canonical_vectors: List[Optional[np.ndarray]] = []
+        absorbed: Dict[str, List[str]] = {}
+        for members in clusters:
+            if len(members) > settings.max_cluster_size:
+                report.skipped_clusters += 1
+                continue
+            # Membro più centrale: massima similarità media con gli altri
+            unit = vectors[members] / np.clip(np.linalg.norm(vectors[members], axis=1, keepdims=True), 1e-12, None)
+            center = members[int(np.argmax((unit @ unit.T).sum(axis=1)))]
+            texts = list(dict.fromkeys(documents[i] for i in members))
+            if len({_normalized_text(t) for t in texts}) == 1:
+                text, vector = documents[center], vectors[center]
+            else:
+                text = (await self.llm.generate_response(
+                    prompt="\n".join(f"- {t}" for t in texts), system_prompt=system_prompt
+                )).strip()
+                if not text:
+                    report.skipped_clusters += 1
+                    continue
+                report.llm_summaries += 1
+                vector = None  # testo nuovo: embedding ricalcolato
+            others = [i for i in members if i != center]
+            canonicals.append(VectorDBNode(
+                id_concetto=ids[center],
+                descrizione=text,
+                metadata=self._merged_metadata(
+                    [metadatas[center], *(metadatas[i] for i in others)],
+                    [(ids[i], documents[i], metadatas[i]) for i in others],
+                ),
+            ))
+            canonical_vectors.append(vector)
+            absorbed[ids[center]] = [ids[i] for i in others]
+
+        if canonicals:
+            await self._write(canonicals, canonical_vectors, absorbed)
+        report.merged = sum(len(v) for v in absorbed.values())
+        report.after = await self.ltm.count("semantic")
+        report.duration_ms = (time.perf_counter() - start) * 1000
+        self.last_report = report
+        print(
+            f"[Consolidation] 🧩 Memoria Semantica: {report.before} → {report.after} fatti "
+            f"({report.clusters} cluster, {report.merged} fusi, {report.llm_summaries} riassunti LLM) "
+            f"in {report.duration_ms:.0f} ms"
+        )
+        return report
+
+    @staticmethod
+    def _merged_metadata(members: Sequence[dict], absorbed: Sequence[tuple]) -> dict:
+        """Metadati del canonico: quelli del membro centrale + provenienza dei fatti assorbiti."""
+        center = dict(members[0] or {})
+        center.pop("ingest_seq", None)
+        previous = json.loads(center.get("merged_sources") or "[]")
+        sources = previous + [
+            {"id": doc_id, "text": text, "contesto_origine": (meta or {}).get("contesto_origine")}
+            for doc_id, text, meta in absorbed
+        ]
+        # L'ingestione più vecchia del cluster: il fatto è noto da allora
+        stamps = [m.get("ingested_at") for m in members if m and m.get("ingested_at")]
+        if stamps:
+            center["ingested_at"] = min(stamps)
+        scores = [m.get("original_score") for m in members if m and isinstance(m.get("original_score"), (int, float))]
+        if scores:
+            center["original_score"] = max(scores)
+        center["merged_from"] = ",".join(s["id"] for s in sources)
+        center["merged_sources"] = json.dumps(sources, ensure_ascii=False)
+        center["consolidated_at"] = datetime.now(timezone.utc).isoformat()
+        return center
+
+    async def _write(self, canonicals: List[VectorDBNode], vectors: List[Optional[np.ndarray]],
+                     absorbed: Dict[str, List[str]]):
+        # Embedding: riusati per i testi invariati, ricalcolati (in batch) per quelli riformulati
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            computed = await self.ltm.embed([canonicals[i].descrizione for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        await self.ltm.add_nodes("semantic", canonicals, embeddings=vectors)
+
+        # I z-links dei membri assorbiti passano al canonico, poi i membri spariscono (con i loro legami)
+        for canonical, members in absorbed.items():
+            await self.ltm.inherit_links("semantic", canonical, members)
+        await self.ltm.delete_nodes("semantic", [i for members in absorbed.values() for i in members])
@@ -50,13 +50,14 @@ class CriticEngine:
 
     async def run_scan(self):
         """Metodo asincrono invocabile per ciclare l'intero buffer a basso priority processing."""
-        nodes = await self.stm.get_all_nodes()
-        if nodes:
-            print(f"[Critic Engine] Avviata scansione periodica su {len(nodes)} nodi in memoria volatile...")
-        for node in nodes:
+        total = await self.stm.count_nodes()
+        if total:
+            print(f"[Critic Engine] Avviata scansione periodica su {total} nodi in memoria volatile...")
+        # Streaming a pagine con le sole colonne necessarie: niente MemoryNode completi in RAM.
+        async for node in self.stm.iter_nodes(columns=["id_concetto", "descrizione"]):
             # CHECKPOINT: se l'utente sta chattando, interrompo subito per liberare Ollama
             if _is_user_chatting():
                 print("[Critic Engine] ⏸ Scansione interrotta — utente in chat, priorità alla risposta.")
                 return
-            await self.evaluate_node(node.id_concetto, node.descrizione)
+            await self.evaluate_node(node["id_concetto"], node["descrizione"])
 
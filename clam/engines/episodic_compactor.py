@@ -0,0 +1,98 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from clam.config import CONFIG
+from clam.core.locales import get_episode_summary_prompt
+from clam.core.models import VectorDBNode
+from clam.llm.ollama_client import OllamaClient
+from clam.memory.episodic import SUMMARY_PREFIX, TURN_PREFIX, partition_bounds, partition_of
+from clam.memory.long_term import LongTermMemory
+
+# Righe dell'indice di recenza lette per pagina mentre si cerca una partizione da compattare
+SCAN_PAGE = 200
+
+
+class EpisodicCompactor:
+    """
+    Compattazione della Memoria Episodica: le settimane ISO più vecchie di `compact_after_weeks`
+    vengono riassunte dall'LLM (un riassunto ogni `summary_chunk_turns` turni) e i turni originali
+    eliminati. La collezione cresce di pochi riassunti a settimana invece che di ogni singolo
+    turno, e la ricerca sugli episodi resta limitata.
+    Una partizione per ciclo: gira nel background loop solo quando l'utente non sta aspettando.
+    """
+    def __init__(self, llm: OllamaClient, ltm: LongTermMemory):
+        self.llm = llm
+        self.ltm = ltm
+        self.compacted_partitions = 0
+        self.compacted_turns = 0
+
+    def _cutoff(self) -> str:
+        """Inizio della settimana ISO più vecchia che resta intatta."""
+        now = datetime.now(timezone.utc)
+        week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (week_start - timedelta(weeks=CONFIG.memory.episodic.compact_after_weeks)).isoformat()
+
+    async def _find_partition(self, cutoff: str) -> Optional[str]:
+        """La partizione del turno non compattato più recente prima del cutoff (solo indice di recenza)."""
+        before_seq = None
+        while True:
+            rows = await self.ltm.scan_recent("episodic", SCAN_PAGE, before_seq=before_seq, until=cutoff)
+            for _, doc_id, ingested_at in rows:
+                if doc_id.startswith(TURN_PREFIX) and ingested_at:
+                    return partition_of(datetime.fromisoformat(ingested_at))
+            if len(rows) < SCAN_PAGE:
+                return None
+            before_seq = rows[-1][0]
+
+    async def cycle(self):
+        settings = CONFIG.memory.episodic
+        partition = await self._find_partition(self._cutoff())
+        if partition is None:
+            return
+
+        since, until = partition_bounds(partition)
+        page = await self.ltm.get_recent("episodic", limit=settings.compact_max_turns, since=since, until=until)
+        # Dal più vecchio: i riassunti seguono l'ordine della conversazione
+        turns = [
+            (doc_id, document, metadata)
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+            if doc_id.startswith(TURN_PREFIX)
+        ][::-1]
+        if not turns:
+            return
+
+        print(f"[Episodic Compactor] Compattazione della settimana {partition}: {len(turns)} turni...")
+        system_prompt = get_episode_summary_prompt(CONFIG.language)
+        chunk_size = max(1, settings.summary_chunk_turns)
+        summaries: List[VectorDBNode] = []
+        for start in range(0, len(turns), chunk_size):
+            chunk = turns[start:start + chunk_size]
+            summary = (await self.llm.generate_response(
+                prompt="\n\n".join(document or "" for _, document, _ in chunk),
+                system_prompt=system_prompt,
+            )).strip()
+            if not summary:
+                # LLM non raggiungibile: la partizione resta intatta e verrà ritentata al prossimo ciclo
+                print(f"[Episodic Compactor] ⚠️ Riassunto non generato, settimana {partition} rimandata.")
+                return
+            summaries.append(VectorDBNode(
+                id_concetto=f"{SUMMARY_PREFIX}{partition}:{uuid.uuid4()}",
+                descrizione=summary,
+                metadata={
+                    "type": "summary",
+                    "partition": partition,
+                    "turns": len(chunk),
+                    # L'istante dell'ultimo turno riassunto: il riassunto resta nella stessa finestra temporale
+                    "ingested_at": chunk[-1][2].get("ingested_at") or since,
+                },
+            ))
+
+        await self.ltm.add_nodes("episodic", summaries)
+        await self.ltm.delete_nodes("episodic", [doc_id for doc_id, _, _ in turns])
+        self.compacted_partitions += 1
+        self.compacted_turns += len(turns)
+        print(f"[Episodic Compactor] ✅ Settimana {partition}: {len(turns)} turni → {len(summaries)} riassunti.")
+
+    def get_stats(self) -> dict:
+        return {"compacted_partitions": self.compacted_partitions, "compacted_turns": self.compacted_turns}
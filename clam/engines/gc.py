@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 from clam.config import CONFIG
 from clam.memory.short_term import ShortTermBuffer
 from clam.memory.long_term import LongTermMemory
-from clam.core.models import VectorDBNode
+from clam.core.models import MemoryNode, VectorDBNode
 
 class GarbageCollector:
     """
@@ -16,57 +16,74 @@ class GarbageCollector:
         self.decay_minutes = CONFIG.memory.short_term.decay_time_minutes
         self.min_score = CONFIG.memory.short_term.min_score
 
+    @staticmethod
+    def _age_minutes(node: MemoryNode, now: datetime) -> float:
+        """Minuti trascorsi dall'ultimo accesso al nodo."""
+        try:
+            # Python 3.11+: fromisoformat accetta la 'Z' finale dell'utc. Puliamo e parsiamo.
+            clean_str = node.timestamp_ultimo_accesso.replace("Z", "+00:00")
+            last_access = datetime.fromisoformat(clean_str)
+            if last_access.tzinfo is None:
+                last_access = last_access.replace(tzinfo=timezone.utc)
+        except ValueError:
+            # Fallback estremo se stringa rotto
+            last_access = now
+        return (now - last_access).total_seconds() / 60.0
+
     async def cycle(self):
         """Task periodico che determina la promozione nei vettori Chroma o la morte del concetto."""
-        nodes = await self.stm.get_all_nodes()
-        now = datetime.now(timezone.utc)
-        
-        for node in nodes:
-            try:
-                # Python 3.11+: fromisoformat accetta la 'Z' finale dell'utc. Puliamo e parsiamo.
-                clean_str = node.timestamp_ultimo_accesso.replace("Z", "+00:00")
-                last_access = datetime.fromisoformat(clean_str)
-                if last_access.tzinfo is None:
-                    last_access = last_access.replace(tzinfo=timezone.utc)
-            except ValueError:
-                # Fallback estremo se stringa rotto
-                last_access = now
+        # Due letture mirate al posto della scansione completa del buffer:
+        # solo i candidati alla promozione e solo quelli già oltre la soglia di oblio.
+        promotable = await self.stm.query_nodes(min_score=self.threshold)
 
-            age_minutes = (now - last_access).total_seconds() / 60.0
-            
+        for node in promotable:
             # 1. PROMOZIONE (ZETTELKASTEN GENERATION)
-            if node.confidence_score >= self.threshold:
-                print(f"[Garbage Collector] Promozione del nodo {node.id_concetto} in Long-Term Memory (Score: {node.confidence_score}). Ricerca legami Zettelkasten...")
-                # Esecuzione query semantica di base per scovare parenti nel grafo prima della scrittura
-                search_res = await self.ltm.search_semantic(query=node.descrizione, n_results=2)
-                
-                linked_ids = []
-                if search_res and isinstance(search_res, dict) and 'ids' in search_res:
-                    if len(search_res['ids']) > 0 and len(search_res['ids'][0]) > 0:
-                        linked_ids = search_res['ids'][0] 
-                
-                meta = {
-                    "original_score": node.confidence_score,
-                    "contesto_origine": node.contesto_origine,
-                    "z_links": ",".join(linked_ids)
-                }
-                
-                lt_node = VectorDBNode(
-                    id_concetto=node.id_concetto,
-                    descrizione=node.descrizione,
-                    metadata=meta
+            print(f"[Garbage Collector] Promozione del nodo {node.id_concetto} in Long-Term Memory (Score: {node.confidence_score}). Ricerca legami Zettelkasten...")
+            # Esecuzione query semantica di base per scovare parenti nel grafo prima della scrittura
+            search_res = await self.ltm.search_semantic(query=node.descrizione, n_results=2)
+
+            linked_ids = []
+            distances = []
+            if search_res and isinstance(search_res, dict) and 'ids' in search_res:
+                if len(search_res['ids']) > 0 and len(search_res['ids'][0]) > 0:
+                    linked_ids = search_res['ids'][0]
+                    distances = search_res['distances'][0]
+            # Un nodo già consolidato in passato ritrova sé stesso: nessun legame verso sé
+            links = [(i, d) for i, d in zip(linked_ids, distances) if i != node.id_concetto]
+            linked_ids = [i for i, _ in links]
+
+            meta = {
+                "original_score": node.confidence_score,
+                "contesto_origine": node.contesto_origine,
+                "z_links": ",".join(linked_ids)
+            }
+
+            lt_node = VectorDBNode(
+                id_concetto=node.id_concetto,
+                descrizione=node.descrizione,
+                metadata=meta
+            )
+
+            # Consolidiamo come un Fatto Strutturale (Potrebbe in futuro finire nell'Episodica)
+            await self.ltm.add_semantic_node(lt_node)
+            # Legami materializzati nel grafo dei z-links (bidirezionali, pesati per similarità)
+            if links:
+                await self.ltm.link_nodes(
+                    "semantic", node.id_concetto, [(i, self.ltm.similarity(d)) for i, d in links]
                 )
-                
-                # Consolidiamo come un Fatto Strutturale (Potrebbe in futuro finire nell'Episodica)
-                await self.ltm.add_semantic_node(lt_node)
-                
-                # Spazziamo lo scratchpad volatile
-                print(f"[Garbage Collector] Nodo promosso. Eliminazione da Short-Term Buffer.")
-                await self.stm.delete_node(node.id_concetto)
-                continue
-            
-            # 2. DECADIMENTO (OBLIO)
-            # Vulnerabilità voluta per defaticare il sistema da allucinazioni
-            if age_minutes > self.decay_minutes and node.confidence_score < self.min_score:
-                print(f"[Garbage Collector] Decadimento. Oblio per il nodo {node.id_concetto} (Age: {age_minutes:.1f}m, Score: {node.confidence_score}).")
-                await self.stm.delete_node(node.id_concetto)
+
+            # Spazziamo lo scratchpad volatile
+            print(f"[Garbage Collector] Nodo promosso. Eliminazione da Short-Term Buffer.")
+            await self.stm.delete_node(node.id_concetto)
+
+        # 2. DECADIMENTO (OBLIO)
+        # Vulnerabilità voluta per defaticare il sistema da allucinazioni
+        decaying = await self.stm.query_nodes(
+            max_score=self.min_score - 1,
+            min_age_minutes=self.decay_minutes,
+        )
+        now = datetime.now(timezone.utc)
+        for node in decaying:
+            age_minutes = self._age_minutes(node, now)
+            print(f"[Garbage Collector] Decadimento. Oblio per il nodo {node.id_concetto} (Age: {age_minutes:.1f}m, Score: {node.confidence_score}).")
+            await self.stm.delete_node(node.id_concetto)
@@ -53,19 +53,28 @@ class InferenceEngine:
         await self.gdb.add_triple(triple)
         print(f"[Inference Engine] 🔗 Tripla salvata in GraphDB: [{sub} -> {normalized_pred} -> {obj}]")
 
+    @staticmethod
+    def _triple_fields(item, object_keys=("object",)):
+        """
+        (subject, predicate, object) di una tripla proposta dall'LLM, oppure None se malformata
+        (non un oggetto JSON, campi mancanti o non stringhe). Dentro il batch del GraphDB un'eccezione
+        annullerebbe anche le triple valide della stessa risposta: quelle malformate si scartano.
+        """
+        if not isinstance(item, dict):
+            return None
+        obj = next((item[k] for k in object_keys if item.get(k) is not None), None)
+        fields = (item.get("subject"), item.get("predicate"), obj)
+        if not all(isinstance(f, str) and f.strip() for f in fields):
+            return None
+        return fields
+
     async def perceive(self, user_prompt: str, assistant_response: str) -> None:
         """Analizza la conversazione in background e salva/correla concetti & triple."""
         print(f"[Inference Engine] Avvio percezione in background...")
         
-        # Recupero lo stato attuale dal Graph DB per permettere al LLM di capire se qualcosa è stato smentito
-        user_triples = await self.gdb.get_triples_by_entity("Utente")
-        clam_triples = await self.gdb.get_triples_by_entity("CLAM")
-        all_triples = user_triples + clam_triples
-
-        logical_truths = ""
-        if all_triples:
-            truths = "\n".join([f"- {t.subject} -> {t.predicate} -> {t.object_}" for t in all_triples])
-            logical_truths = f"\n[VERITÀ ATTUALI NEL DB]\n{truths}\n(Se l'Utente smentisce o corregge una di queste verità, copiala ESATTAMENTE in 'triple_logiche_da_cancellare')\n"
+        # Niente più dump delle verità attuali nel prompt: le correzioni dei predicati funzionali
+        # (ha_nome, ha_eta, vive_a, ...) le applica il GraphDB sostituendo il valore precedente.
+        # 'triple_logiche_da_cancellare' resta solo per le smentite esplicite ("non ho più il gatto").
 
         # Build the inference prompt in the configured language,
         # then inject the controlled predicate list from the ontology schema.
@@ -74,7 +83,7 @@ class InferenceEngine:
             allowed_predicates=get_allowed_predicates_prompt()
         )
 
-        analysis_prompt = f"{logical_truths}\nUser: {user_prompt}\nAssistant: {assistant_response}\n\nEstrai i concetti, le triple da salvare e le triple da cancellare in JSON rigido."
+        analysis_prompt = f"User: {user_prompt}\nAssistant: {assistant_response}\n\nEstrai i concetti, le triple da salvare e le triple da cancellare in JSON rigido."
         
         raw_json = await self.llm.generate_response(
             prompt=analysis_prompt,
@@ -87,6 +96,9 @@ class InferenceEngine:
 
         try:
             data = json.loads(raw_json)
+            if not isinstance(data, dict):
+                print("[Inference Engine] Risposta JSON scartata: non è un oggetto")
+                return
             # Gestione array "concetti" (Vector & STM Memory)
             concetti = data.get("concetti", [])
             for c in concetti:
@@ -94,32 +106,36 @@ class InferenceEngine:
                     print(f"[Inference] Concetto vettoriale: {c}")
                     await self._save_fact(c, "Inference Perception")
             
-            # Gestione array "triple_logiche" (Graph DB Memory)
-            # FILTRO DI SICUREZZA: qwen2.5:3b tende a inventare fatti su CLAM
-            # (es. "CLAM preferisce i cani") che non sono stati detti dall'utente.
-            # Solo i fatti dal seed_truths.yaml possono avere subject "CLAM".
-            triple = data.get("triple_logiche", [])
-            for t in triple:
-                sub = t.get("subject")
-                pred = t.get("predicate")
-                obj = t.get("object")
-                if sub and pred and obj:
+            # Triple da salvare e da cancellare in un'unica transazione (group commit sul GraphDB)
+            async with self.gdb.batch():
+                # Gestione array "triple_logiche" (Graph DB Memory)
+                # FILTRO DI SICUREZZA: qwen2.5:3b tende a inventare fatti su CLAM
+                # (es. "CLAM preferisce i cani") che non sono stati detti dall'utente.
+                # Solo i fatti dal seed_truths.yaml possono avere subject "CLAM".
+                triple = data.get("triple_logiche", [])
+                for t in triple if isinstance(triple, list) else []:
+                    fields = self._triple_fields(t)
+                    if fields is None:
+                        print(f"[Inference Engine] ⚠️ Tripla malformata scartata: {str(t)[:80]}")
+                        continue
+                    sub, pred, obj = fields
                     # Blocco hard: l'Inference Engine non può scrivere fatti su CLAM
                     if sub.strip().upper() == "CLAM":
                         print(f"[Inference Engine] 🚫 BLOCCATO: tripla su CLAM rifiutata [{sub} -> {pred} -> {obj}]")
                         continue
                     await self._save_triple(sub, pred, obj)
             
-            # Gestione array "triple_logiche_da_cancellare" (Auto-Correzione)
-            triple_del = data.get("triple_logiche_da_cancellare", [])
-            for t in triple_del:
-                sub = t.get("subject")
-                pred = t.get("predicate")
-                # Normalizziamo anche il predicato per la cancellazione
-                if pred:
+                # Gestione array "triple_logiche_da_cancellare" (Auto-Correzione)
+                triple_del = data.get("triple_logiche_da_cancellare", [])
+                for t in triple_del if isinstance(triple_del, list) else []:
+                    # Supporto fallback per l'underscore (object_)
+                    fields = self._triple_fields(t, object_keys=("object", "object_"))
+                    if fields is None:
+                        print(f"[Inference Engine] ⚠️ Cancellazione malformata scartata: {str(t)[:80]}")
+                        continue
+                    sub, pred, obj = fields
+                    # Normalizziamo anche il predicato per la cancellazione
                     pred = normalize_predicate(pred)
-                obj = t.get("object", t.get("object_"))  # Supporto fallback per l'underscore
-                if sub and pred and obj:
                     await self.gdb.delete_triples_by_pattern(sub, pred, obj)
                     print(f"[Inference Engine] 🗑️ Tripla cancellata per Smentita: [{sub} -> {pred} -> {obj}]")
 
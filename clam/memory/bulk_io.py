@@ -0,0 +1,349 @@
+"""
+Import/export in streaming (NDJSON) del Knowledge Graph e delle memorie.
+
+Formato: un oggetto JSON per riga, distinto dal campo "kind":
+  {"kind": "header", "format": "clam-ndjson", "version": 1, "exported_at": "..."}
+  {"kind": "triple", "id_tripla": ..., "subject": ..., "predicate": ..., "object_": ..., "confidence": ..., "timestamp": ...}
+  {"kind": "stm_node", "id_concetto": ..., "descrizione": ..., ...}
+  {"kind": "ltm_semantic" | "ltm_episodic", "id_concetto": ..., "descrizione": ..., "metadata": {...}, "embedding": [...]}
+
+Export e import lavorano a pagine/blocchi: la memoria usata non dipende dalla dimensione
+del file (milioni di righe). L'import apre una transazione per blocco (GraphDB.add_triples,
+insert multipli sullo STM) e fa upsert a blocchi su ChromaDB; le triple seguono la stessa
+semantica di add_triple, quindi normalizzazione, fusione dei duplicati e predicati
+funzionali valgono anche per i dati importati. Reimportare lo stesso file è idempotente.
+
+CLI (a server fermo: GraphDB, snapshot dello STM e ChromaDB vengono aperti direttamente):
+    python -m clam.memory.bulk_io export backup.ndjson.gz [--include triples,stm,ltm] [--embeddings]
+    python -m clam.memory.bulk_io import backup.ndjson.gz [--chunk-size 5000]
+Con il server attivo usare GET /api/export e POST /api/import.
+"""
+
+import argparse
+import asyncio
+import codecs
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+
+from clam.config import CONFIG
+from clam.core.models import LogicalTriple, MemoryNode, VectorDBNode
+from clam.memory.graph_db import GraphDB
+from clam.memory.long_term import LongTermMemory
+from clam.memory.short_term import ShortTermBuffer
+
+FORMAT_NAME = "clam-ndjson"
+FORMAT_VERSION = 1
+
+ALL_SECTIONS: Tuple[str, ...] = ("triples", "stm", "ltm")
+
+# Errori di parsing riportati nel report (gli altri vengono solo contati)
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportReport(BaseModel):
+    """Esito (anche parziale, per il progresso) di un import NDJSON."""
+    triples: int = 0
+    stm_nodes: int = 0
+    ltm_semantic: int = 0
+    ltm_episodic: int = 0
+    skipped: int = Field(default=0, description="Righe scartate (JSON non valido, record incompleti, store assente)")
+    errors: List[str] = Field(default_factory=list, description=f"Prime {MAX_REPORTED_ERRORS} righe scartate, con il motivo")
+    duration_ms: float = 0.0
+
+    @property
+    def imported(self) -> int:
+        return self.triples + self.stm_nodes + self.ltm_semantic + self.ltm_episodic
+
+
+def _line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+async def export_ndjson(
+    gdb: Optional[GraphDB],
+    stm: Optional[ShortTermBuffer],
+    ltm: Optional[LongTermMemory],
+    include: Sequence[str] = ALL_SECTIONS,
+    embeddings: bool = False,
+    page_size: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Genera le righe NDJSON dell'export, una pagina alla volta (keyset su GraphDB/STM, offset su Chroma)."""
+    page_size = page_size or CONFIG.bulk_io.page_size
+    yield _line({
+        "kind": "header",
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "sections": list(include),
+    })
+
+    if "triples" in include and gdb is not None:
+        async for triple in gdb.iter_triples(page_size=page_size, order_by="id_tripla", descending=False):
+            yield _line({"kind": "triple", **triple.model_dump()})
+
+    if "stm" in include and stm is not None:
+        async for node in stm.iter_nodes(page_size=page_size, order_by="id_concetto"):
+            yield _line({"kind": "stm_node", **node.model_dump()})
+
+    if "ltm" in include and ltm is not None:
+        for kind in ("semantic", "episodic"):
+            async for node, embedding in ltm.iter_nodes(kind, page_size=page_size, include_embeddings=embeddings):
+                record = {"kind": f"ltm_{kind}", **node.model_dump()}
+                if embedding is not None:
+                    record["embedding"] = embedding
+                yield _line(record)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Ricompone le righe da un flusso di byte (es. il body HTTP), decodificando UTF-8 in modo incrementale."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class _Importer:
+    """Accumula i record per store e li scrive a blocchi di `chunk_size`."""
+
+    def __init__(
+        self,
+        gdb: Optional[GraphDB],
+        stm: Optional[ShortTermBuffer],
+        ltm: Optional[LongTermMemory],
+        chunk_size: int,
+    ):
+        self.gdb, self.stm, self.ltm = gdb, stm, ltm
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        self._triples: List[LogicalTriple] = []
+        self._stm_nodes: List[MemoryNode] = []
+        # Chroma vuole gli embedding per tutti i record di una chiamata o per nessuno:
+        # buffer separati per (collezione, con/senza embedding).
+        self._ltm: Dict[Tuple[str, bool], List[Tuple[VectorDBNode, Optional[List[float]]]]] = {}
+
+    def skip(self, line_no: int, reason: str) -> None:
+        self.report.skipped += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(f"riga {line_no}: {reason}")
+
+    async def add(self, line_no: int, record: Dict[str, Any]) -> None:
+        kind = record.pop("kind", None)
+        if kind == "header":
+            if record.get("format") != FORMAT_NAME:
+                self.skip(line_no, f"formato sconosciuto '{record.get('format')}'")
+            return
+
+        if kind == "triple":
+            if self.gdb is None:
+                self.skip(line_no, "GraphDB non disponibile")
+                return
+            self._triples.append(LogicalTriple(**record))
+            if len(self._triples) >= self.chunk_size:
+                await self._flush_triples()
+        elif kind == "stm_node":
+            if self.stm is None:
+                self.skip(line_no, "Short-Term Buffer non disponibile")
+                return
+            self._stm_nodes.append(MemoryNode(**record))
+            if len(self._stm_nodes) >= self.chunk_size:
+                await self._flush_stm()
+        elif kind in ("ltm_semantic", "ltm_episodic"):
+            if self.ltm is None:
+                self.skip(line_no, "Long-Term Memory non disponibile")
+                return
+            embedding = record.pop("embedding", None)
+            key = (kind[len("ltm_"):], embedding is not None)
+            buffer = self._ltm.setdefault(key, [])
+            buffer.append((VectorDBNode(**record), embedding))
+            if len(buffer) >= self.chunk_size:
+                await self._flush_ltm(key)
+        else:
+            self.skip(line_no, f"kind sconosciuto '{kind}'")
+
+    async def _flush_triples(self) -> None:
+        if not self._triples:
+            return
+        chunk, self._triples = self._triples, []
+        await self.gdb.add_triples(chunk)
+        self.report.triples += len(chunk)
+
+    async def _flush_stm(self) -> None:
+        if not self._stm_nodes:
+            return
+        chunk, self._stm_nodes = self._stm_nodes, []
+        await self.stm.add_nodes(chunk)
+        self.report.stm_nodes += len(chunk)
+
+    async def _flush_ltm(self, key: Tuple[str, bool]) -> None:
+        chunk = self._ltm.pop(key, [])
+        if not chunk:
+            return
+        kind, with_embeddings = key
+        nodes = [node for node, _ in chunk]
+        await self.ltm.add_nodes(kind, nodes, embeddings=[e for _, e in chunk] if with_embeddings else None)
+        if kind == "semantic":
+            self.report.ltm_semantic += len(chunk)
+        else:
+            self.report.ltm_episodic += len(chunk)
+
+    async def flush(self) -> None:
+        await self._flush_triples()
+        await self._flush_stm()
+        for key in list(self._ltm):
+            await self._flush_ltm(key)
+
+
+def print_progress(report: ImportReport) -> None:
+    print(
+        f"[BulkIO] ⏳ {report.imported} record importati "
+        f"(triple {report.triples}, STM {report.stm_nodes}, "
+        f"LTM {report.ltm_semantic}+{report.ltm_episodic}, scartati {report.skipped})"
+    )
+
+
+async def import_ndjson(
+    lines: AsyncIterable[str],
+    gdb: Optional[GraphDB],
+    stm: Optional[ShortTermBuffer],
+    ltm: Optional[LongTermMemory],
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[[ImportReport], None]] = print_progress,
+) -> ImportReport:
+    """
+    Importa un flusso di righe NDJSON. Le righe non valide vengono scartate e contate,
+    senza interrompere l'import. `progress` riceve il report parziale ogni `bulk_io.progress_every` righe.
+    """
+    start = time.perf_counter()
+    importer = _Importer(gdb, stm, ltm, chunk_size or CONFIG.bulk_io.chunk_size)
+    progress_every = max(1, CONFIG.bulk_io.progress_every)
+
+    line_no = 0
+    async for raw in lines:
+        line_no += 1
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise ValueError("il record non è un oggetto JSON")
+            await importer.add(line_no, record)
+        except (ValueError, TypeError, ValidationError) as e:
+            # json.JSONDecodeError è una sottoclasse di ValueError
+            importer.skip(line_no, str(e).splitlines()[0])
+        if progress and line_no % progress_every == 0:
+            progress(importer.report)
+
+    await importer.flush()
+    importer.report.duration_ms = (time.perf_counter() - start) * 1000
+    if progress:
+        progress(importer.report)
+    return importer.report
+
+
+# ─────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────
+
+def _open_text(path: str, mode: str) -> TextIO:
+    """'-' = stdin/stdout; i file .gz vengono (de)compressi al volo."""
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, mode + "b"), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+async def _aiter(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+async def _open_stores(include: Sequence[str]) -> Tuple[Optional[GraphDB], Optional[ShortTermBuffer], Optional[LongTermMemory]]:
+    gdb = stm = ltm = None
+    if "triples" in include:
+        gdb = GraphDB()
+        await gdb.connect()
+    if "stm" in include:
+        # Lo STM vive in RAM: il CLI lavora sullo snapshot su disco (memory.short_term.snapshot_path)
+        stm = ShortTermBuffer()
+        await stm.connect()
+    if "ltm" in include:
+        ltm = LongTermMemory()
+        await ltm.connect()
+    return gdb, stm, ltm
+
+
+async def _run_cli(args: argparse.Namespace) -> None:
+    include = [s.strip() for s in args.include.split(",") if s.strip()]
+    unknown = set(include) - set(ALL_SECTIONS)
+    if unknown:
+        raise SystemExit(f"Sezioni sconosciute: {', '.join(sorted(unknown))} (ammesse: {', '.join(ALL_SECTIONS)})")
+
+    gdb, stm, ltm = await _open_stores(include)
+    try:
+        if args.command == "export":
+            count = 0
+            out = _open_text(args.path, "w")
+            try:
+                async for line in export_ndjson(gdb, stm, ltm, include=include, embeddings=args.embeddings):
+                    out.write(line)
+                    count += 1
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"[BulkIO] ✅ Export completato: {count - 1} record in {args.path}", file=sys.stderr)
+        else:
+            src = _open_text(args.path, "r")
+            try:
+                report = await import_ndjson(_aiter(src), gdb, stm, ltm, chunk_size=args.chunk_size)
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+            if stm is not None and stm.snapshot_path:
+                await stm.snapshot(force=True)
+            print(f"[BulkIO] ✅ Import completato in {report.duration_ms / 1000:.1f} s")
+            for error in report.errors:
+                print(f"[BulkIO] ⚠️ {error}")
+    finally:
+        if gdb is not None:
+            await gdb.disconnect()
+        if stm is not None:
+            await stm.disconnect()
+        if ltm is not None:
+            ltm.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m clam.memory.bulk_io",
+        description="Import/export NDJSON di Knowledge Graph, STM e LTM (a server fermo).",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="Esporta su file NDJSON (.gz per comprimere, '-' = stdout)")
+    export_cmd.add_argument("path")
+    export_cmd.add_argument("--embeddings", action="store_true", help="Includi i vettori della LTM")
+    import_cmd = sub.add_parser("import", help="Importa da file NDJSON (.gz supportato, '-' = stdin)")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--chunk-size", type=int, default=None, help="Record per transazione (default: bulk_io.chunk_size)")
+    for cmd in (export_cmd, import_cmd):
+        cmd.add_argument("--include", default=",".join(ALL_SECTIONS), help="Sezioni: triples,stm,ltm")
+
+    asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
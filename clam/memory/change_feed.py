@@ -0,0 +1,109 @@
+"""
+Change feed: log ordinato delle mutazioni di uno store (GraphDB, ShortTermBuffer, LongTermMemory).
+
+Ogni mutazione committata produce un ChangeEvent con un numero di sequenza crescente.
+I consumer (telemetria, cache del renderer, ...) invece di rileggere tutto ricordano
+l'ultimo seq visto e chiedono solo il delta. Il log è in RAM e limitato a `retention`
+eventi: chi resta indietro oltre la finestra riceve ChangeFeedGap e deve risincronizzarsi
+rileggendo lo stato completo (poi riparte da `last_seq`).
+"""
+
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# insert/update/delete: una riga (key = chiave primaria)
+# clear: lo store è stato svuotato
+# reset: riscrittura massiva (es. compattazione), i consumer devono risincronizzarsi
+ChangeOp = Literal["insert", "update", "delete", "clear", "reset"]
+
+
+class ChangeEvent(BaseModel):
+    """Una mutazione committata di uno store."""
+    seq: int = Field(..., description="Numero di sequenza, crescente e senza buchi per store")
+    source: str = Field(..., description="Store di origine ('graph', 'stm', 'ltm')")
+    op: ChangeOp
+    key: Optional[str] = Field(default=None, description="Chiave primaria della riga (id_tripla / id_concetto)")
+    data: Optional[Dict[str, Any]] = Field(default=None, description="Riga dopo la modifica (prima, per le delete)")
+    timestamp: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
+class ChangeFeedGap(Exception):
+    """Il seq richiesto è più vecchio della finestra di retention: serve una risincronizzazione completa."""
+
+    def __init__(self, source: str, requested: int, oldest: int):
+        super().__init__(
+            f"Change feed '{source}': seq {requested} fuori dalla retention (primo disponibile: {oldest})"
+        )
+        self.source = source
+        self.requested = requested
+        self.oldest = oldest
+
+
+class ChangeFeed:
+    """Log delle modifiche in RAM con retention limitata e sottoscrizioni in-process."""
+
+    def __init__(self, source: str, retention: int):
+        self.source = source
+        self._events: Deque[ChangeEvent] = deque(maxlen=max(1, retention))
+        self._seq = 0
+        # Svegliato (e sostituito) a ogni publish: i subscriber in attesa ripartono.
+        self._wakeup = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        """Seq dell'ultimo evento pubblicato (0 = nessuno)."""
+        return self._seq
+
+    @property
+    def oldest_seq(self) -> int:
+        """Seq del più vecchio evento ancora trattenuto."""
+        return self._events[0].seq if self._events else self._seq + 1
+
+    def publish(self, op: ChangeOp, key: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> ChangeEvent:
+        """Registra una mutazione. Da chiamare solo dopo il commit della transazione che la contiene."""
+        self._seq += 1
+        event = ChangeEvent(seq=self._seq, source=self.source, op=op, key=key, data=data)
+        self._events.append(event)
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+        return event
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[ChangeEvent]:
+        """Eventi con seq > `seq`. Solleva ChangeFeedGap se una parte è già uscita dalla retention."""
+        if seq >= self._seq:
+            return []
+        if seq + 1 < self.oldest_seq:
+            raise ChangeFeedGap(self.source, seq, self.oldest_seq)
+        # I seq sono contigui: l'offset nel deque si calcola senza scorrere il log
+        start = seq + 1 - self.oldest_seq
+        end = len(self._events) if limit is None else min(len(self._events), start + limit)
+        return [self._events[i] for i in range(start, end)]
+
+    async def wait(self, seq: int) -> int:
+        """Attende che esista almeno un evento con seq > `seq` e restituisce last_seq."""
+        while self._seq <= seq:
+            await self._wakeup.wait()
+        return self._seq
+
+    async def subscribe(self, from_seq: Optional[int] = None) -> AsyncIterator[ChangeEvent]:
+        """
+        Stream degli eventi con seq > from_seq (default: solo i nuovi).
+        Un subscriber troppo lento per la retention riceve ChangeFeedGap.
+        """
+        cursor = self._seq if from_seq is None else from_seq
+        while True:
+            wakeup = self._wakeup
+            events = self.since(cursor)
+            if not events:
+                await wakeup.wait()
+                continue
+            for event in events:
+                yield event
+                cursor = event.seq
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"last_seq": self._seq, "oldest_seq": self.oldest_seq, "retained": len(self._events)}
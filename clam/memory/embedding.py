@@ -0,0 +1,247 @@
+"""
+Calcolo degli embedding della Long-Term Memory.
+
+- EmbeddingProvider: il modello. `chroma_default` è la funzione che Chroma usa implicitamente;
+  `onnx` esegue lo stesso all-MiniLM-L6-v2 (o un altro modello ONNX) con una sessione
+  onnxruntime configurabile: thread intra-op, quantizzazione int8 dinamica, padding al
+  testo più lungo del batch invece che a 256 token fissi.
+- BatchingEmbedder: raccoglie le richieste concorrenti (agente, GC, import) per qualche
+  millisecondo e le passa al modello in un'unica chiamata. Un testo già in calcolo o in
+  cache non viene rimesso in coda.
+
+La configurazione è nella sezione `embedding` di config.yaml.
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from clam.config import EmbeddingConfig
+from clam.memory.embedding_cache import EmbeddingCache, Vector
+
+
+class EmbeddingProvider:
+    """Interfaccia di un modello di embedding (chiamate sincrone, eseguite nel thread pool della LTM)."""
+
+    # Identifica il modello nelle chiavi della cache: vettori di modelli diversi non si mescolano
+    name: str = ""
+
+    def load(self) -> None:
+        """Carica il modello (idempotente). Chiamato dal warm-up per non pagarlo alla prima richiesta."""
+
+    def embed(self, texts: List[str]) -> List[Vector]:
+        raise NotImplementedError
+
+
+class ChromaDefaultProvider(EmbeddingProvider):
+    """La funzione di default di Chroma (all-MiniLM-L6-v2 su onnxruntime, padding fisso a 256 token)."""
+
+    name = "default"
+
+    def __init__(self):
+        self._function = None
+
+    def _get_function(self):
+        if self._function is None:
+            # Import pigro: chromadb si carica solo quando serve davvero un embedding
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            self._function = DefaultEmbeddingFunction()
+        return self._function
+
+    def load(self) -> None:
+        # Il modello viene scaricato e aperto alla prima chiamata
+        self._get_function()(["warm-up"])
+
+    def embed(self, texts: List[str]) -> List[Vector]:
+        return [np.asarray(v, dtype=np.float32) for v in self._get_function()(texts)]
+
+
+class OnnxProvider(EmbeddingProvider):
+    """
+    Modello sentence-transformers esportato in ONNX (model.onnx + tokenizer.json), mean pooling
+    e normalizzazione L2 come in Chroma. Senza `model_dir` usa la copia di all-MiniLM-L6-v2
+    scaricata da Chroma, quindi i vettori restano confrontabili con quelli già salvati.
+    """
+
+    def __init__(self, model_dir: Optional[str], quantize_int8: bool, intra_op_threads: int, max_tokens: int):
+        self.model_dir = model_dir
+        self.quantize_int8 = quantize_int8
+        self.intra_op_threads = intra_op_threads
+        self.max_tokens = max_tokens
+        base = os.path.basename(os.path.normpath(model_dir)) if model_dir else "all-MiniLM-L6-v2"
+        self.name = f"onnx:{base}" + (":int8" if quantize_int8 else "")
+        self._session = None
+        self._tokenizer = None
+        self._input_names: set = set()
+
+    def _default_model_dir(self) -> str:
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+        ONNXMiniLM_L6_V2()._download_model_if_not_exists()
+        return os.path.join(ONNXMiniLM_L6_V2.DOWNLOAD_PATH, ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME)
+
+    @staticmethod
+    def _quantized(model_path: str) -> str:
+        """Versione int8 (quantizzazione dinamica dei pesi) del modello, creata accanto all'originale una volta sola."""
+        target = model_path[:-len(".onnx")] + ".int8.onnx"
+        if os.path.exists(target):
+            return target
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError as e:
+            raise RuntimeError("embedding.quantize_int8 richiede il pacchetto 'onnx' (pip install onnx)") from e
+        print(f"[Embedding] ⚙️ Quantizzazione int8 di {model_path}...")
+        quantize_dynamic(model_path, target, weight_type=QuantType.QInt8)
+        return target
+
+    def load(self) -> None:
+        if self._session is not None:
+            return
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = self.model_dir or self._default_model_dir()
+        model_path = os.path.join(model_dir, "model.onnx")
+        if self.quantize_int8:
+            model_path = self._quantized(model_path)
+
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads > 0:
+            options.intra_op_num_threads = self.intra_op_threads
+        # Un solo batch alla volta (lo serializza il BatchingEmbedder): il parallelismo è dentro agli operatori
+        options.inter_op_num_threads = 1
+
+        tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_tokens)
+        tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in session.get_inputs()}
+        self._tokenizer, self._session = tokenizer, session
+
+    def embed(self, texts: List[str]) -> List[Vector]:
+        self.load()
+        encoded = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self._session.run(None, feeds)[0]
+
+        mask = attention_mask[..., np.newaxis].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return list((pooled / norms).astype(np.float32))
+
+
+def create_provider(settings: EmbeddingConfig) -> EmbeddingProvider:
+    if settings.provider == "chroma_default":
+        return ChromaDefaultProvider()
+    if settings.provider == "onnx":
+        return OnnxProvider(
+            model_dir=settings.model_dir,
+            quantize_int8=settings.quantize_int8,
+            intra_op_threads=settings.intra_op_threads,
+            max_tokens=settings.max_tokens,
+        )
+    raise ValueError(f"Provider di embedding sconosciuto: '{settings.provider}' (chroma_default | onnx)")
+
+
+class BatchingEmbedder:
+    """
+    Coda unica verso il modello. Le richieste che arrivano entro `max_wait_ms` dalla prima
+    (o finché non si riempie un batch) partono insieme; un testo già in coda o in calcolo
+    viene condiviso tra i chiamanti. I vettori calcolati finiscono in cache prima di
+    risvegliare i chiamanti, così ogni testo distinto passa dal modello una volta sola.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        cache: EmbeddingCache,
+        run: Callable[..., Awaitable],
+        batch_size: int,
+        max_wait_ms: int,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self._run = run
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._full = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self.load_ms: Optional[float] = None
+        self.texts = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    async def warmup(self) -> float:
+        """Carica il modello subito (startup) invece che alla prima richiesta. Restituisce i ms impiegati."""
+        start = time.perf_counter()
+        await self._run(self.provider.load)
+        self.load_ms = (time.perf_counter() - start) * 1000
+        return self.load_ms
+
+    async def embed(self, texts: List[str]) -> List[Vector]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = self._inflight.get(text)
+            if future is None:
+                future = loop.create_future()
+                cached = self.cache.peek(text)
+                if cached is not None:
+                    future.set_result(cached)
+                else:
+                    self._inflight[text] = future
+                    self._pending.append(text)
+            futures.append(future)
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if self._pending and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._drain())
+        # shield: se un chiamante viene cancellato, gli altri in attesa dello stesso testo ricevono comunque il vettore
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    async def _drain(self) -> None:
+        while self._pending:
+            if len(self._pending) < self.batch_size and self.max_wait:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            start = time.perf_counter()
+            try:
+                vectors = await self._run(self.provider.embed, batch)
+                await self._run(self.cache.put_many, batch, vectors)
+            except Exception as e:
+                for text in batch:
+                    future = self._inflight.pop(text)
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.busy_seconds += time.perf_counter() - start
+            self.texts += len(batch)
+            self.batches += 1
+            for text, vector in zip(batch, vectors):
+                future = self._inflight.pop(text)
+                if not future.done():
+                    future.set_result(np.asarray(vector, dtype=np.float32))
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "provider": self.provider.name,
+            "load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "embedded": self.texts,
+            "batches": self.batches,
+            "avg_batch": round(self.texts / self.batches, 1) if self.batches else 0.0,
+            "embeddings_per_sec": round(self.texts / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+        }
@@ -0,0 +1,129 @@
+"""
+Cache degli embedding: ogni testo distinto viene vettorializzato una sola volta per processo.
+
+In un turno lo stesso testo passa più volte dal modello (ricerca del prompt, ricerca dei
+parenti Zettelkasten in promozione, add dello stesso concetto): il calcolo dell'embedding
+è il costo CPU dominante del recupero. La chiave è lo SHA-256 di (modello, testo), così un
+cambio di modello non restituisce mai vettori incompatibili.
+
+Due livelli:
+- LRU in RAM limitata a `capacity` vettori (float32);
+- opzionale, un file SQLite che sopravvive ai riavvii (le letture promuovono in RAM).
+
+Thread-safe: viene usata dal thread pool della LTM, non dall'event loop.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+Vector = np.ndarray
+
+
+class EmbeddingCache:
+    """Vettori indicizzati per hash del testo: LRU in RAM con livello SQLite opzionale."""
+
+    def __init__(self, model: str, capacity: int, path: Optional[str] = None):
+        self.model = model
+        self.capacity = max(0, capacity)
+        self._lru: "OrderedDict[str, Vector]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            ''')
+            self._db.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str], record: bool = True) -> List[Optional[Vector]]:
+        """Vettori in cache (None dove manca), nell'ordine dei testi. `record=False` non tocca le statistiche."""
+        keys = [self.key(t) for t in texts]
+        found: Dict[str, Vector] = {}
+        with self._lock:
+            for k in keys:
+                vector = self._lru.get(k)
+                if vector is not None:
+                    self._lru.move_to_end(k)
+                    found[k] = vector
+            missing = [k for k in dict.fromkeys(keys) if k not in found]
+            if missing and self._db is not None:
+                for k, dim, blob in self._db.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({','.join('?' * len(missing))})",
+                    missing,
+                ):
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                    found[k] = vector
+                    self._remember(k, vector)
+                    self.disk_hits += record
+            for k in keys if record else ():
+                if k in found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return [found.get(k) for k in keys]
+
+    def peek(self, text: str) -> Optional[Vector]:
+        """Solo livello in RAM, senza statistiche: controllo istantaneo prima di accodare un calcolo."""
+        with self._lock:
+            return self._lru.get(self.key(text))
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                k = self.key(text)
+                array = np.asarray(vector, dtype=np.float32)
+                self._remember(k, array)
+                rows.append((k, self.model, int(array.shape[0]), array.tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)", rows
+                )
+                self._db.commit()
+
+    def _remember(self, k: str, vector: Vector) -> None:
+        if not self.capacity:
+            return
+        self._lru[k] = vector
+        self._lru.move_to_end(k)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,131 @@
+"""
+Scrittura della Memoria Episodica: ogni turno di conversazione completato diventa un episodio
+nella collezione `episodic` della LTM.
+
+- EpisodeWriter: coda in RAM alimentata dall'agente (record_turn non aspetta nulla) e
+  svuotata da un task in background a blocchi (`batch_size` turni o `flush_interval_seconds`),
+  con un'unica upsert per blocco. La richiesta dell'utente non paga né embedding né I/O.
+- Partizioni temporali: ogni episodio porta nei metadati la settimana ISO (`partition`,
+  es. "2026-W42") e l'istante del turno come `ingested_at`, quindi l'indice di recenza della
+  LTM risponde alle ricerche per finestra ("ultima settimana") senza scorrere la collezione.
+  Le partizioni vecchie vengono compattate in riassunti da clam/engines/episodic_compactor.py.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from clam.config import CONFIG
+from clam.core.models import VectorDBNode
+from clam.memory.long_term import LongTermMemory
+
+# Prefissi degli id: il compattatore distingue i turni dai riassunti leggendo solo l'indice di recenza
+TURN_PREFIX = "turn:"
+SUMMARY_PREFIX = "summary:"
+
+
+def partition_of(timestamp: datetime) -> str:
+    """Settimana ISO di un istante, es. '2026-W42'."""
+    year, week, _ = timestamp.astimezone(timezone.utc).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def partition_bounds(partition: str) -> Tuple[str, str]:
+    """(inizio incluso, fine esclusa) di una settimana ISO, come istanti ISO 8601 UTC."""
+    year, week = partition.split("-W")
+    start = datetime.fromisocalendar(int(year), int(week), 1).replace(tzinfo=timezone.utc)
+    return start.isoformat(), (start + timedelta(weeks=1)).isoformat()
+
+
+def window(last_days: float, now: Optional[datetime] = None) -> Tuple[str, None]:
+    """Finestra (since, until) degli ultimi `last_days` giorni, da passare a search_episodic."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=last_days)).isoformat(), None
+
+
+class EpisodeWriter:
+    """Accoda i turni completati e li scrive nella collezione episodica a blocchi, fuori dal percorso della richiesta."""
+
+    def __init__(self, ltm: LongTermMemory):
+        settings = CONFIG.memory.episodic
+        self.ltm = ltm
+        self.batch_size = max(1, settings.batch_size)
+        self.flush_interval = max(0.0, settings.flush_interval_seconds)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_write_ms: Optional[float] = None
+
+    @staticmethod
+    def format_turn(user_message: str, reply: str, user_label: str) -> str:
+        return f"{user_label}: {user_message}\nCLAM: {reply}"
+
+    def record_turn(self, text: str, timestamp: Optional[datetime] = None) -> bool:
+        """
+        Accoda un turno già formattato. Non blocca mai: a coda piena il turno viene scartato
+        (e contato) piuttosto che rallentare la risposta all'utente.
+        """
+        timestamp = timestamp or datetime.now(timezone.utc)
+        node = VectorDBNode(
+            id_concetto=f"{TURN_PREFIX}{uuid.uuid4()}",
+            descrizione=text,
+            metadata={"type": "turn", "partition": partition_of(timestamp), "ingested_at": timestamp.isoformat()},
+        )
+        try:
+            self._queue.put_nowait(node)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def run(self):
+        """Task di background: raccoglie un blocco (pieno o scaduto l'intervallo) e lo scrive."""
+        while True:
+            try:
+                batch = [await self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                await self._write(batch)
+            except asyncio.CancelledError:
+                break
+
+    async def flush(self):
+        """Scrive subito tutto ciò che è in coda (shutdown)."""
+        batch: List[VectorDBNode] = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        for start in range(0, len(batch), self.batch_size):
+            await self._write(batch[start:start + self.batch_size])
+
+    async def _write(self, batch: List[VectorDBNode]):
+        start = time.perf_counter()
+        try:
+            await self.ltm.add_nodes("episodic", batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"[Episodic] ⚠️ Scrittura di {len(batch)} episodi fallita: {e}")
+            return
+        self.last_write_ms = (time.perf_counter() - start) * 1000
+        self.written += len(batch)
+        self.batches += 1
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_write_ms": round(self.last_write_ms, 1) if self.last_write_ms is not None else None,
+        }
@@ -1,9 +1,46 @@
-import os
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
 import aiosqlite
 import asyncio
-from typing import List, Optional
-from clam.core.models import LogicalTriple
-from clam.config import CONFIG
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+from clam.core.models import LogicalTriple, Subgraph
+from clam.core.knowledge_schema import (
+    PREDICATE_NORMALIZER, SINGLE_VALUED_PREDICATES, is_single_valued, normalize_predicate,
+)
+from clam.core.metrics import WaitStats, timed_lock
+from clam.core.predicate_normalizer import clean_predicate, fold
+from clam.config import CONFIG, resolve_data_path
+from clam.memory.sql_query import KeysetCursor, build_select, next_cursor
+from clam.memory.graph_mirror import ROW_FIELDS, GraphMirror
+from clam.memory.change_feed import ChangeFeed
+
+# Colonne della tabella triples, nell'ordine dei campi di LogicalTriple.
+TRIPLE_COLUMNS = ("id_tripla", "subject", "predicate", "object_", "confidence", "timestamp")
+
+# Tetto della confidence (vedi LogicalTriple): le riaffermazioni la alzano fino a qui.
+MAX_CONFIDENCE = 5
+
+# Separatore dei path nella CTE ricorsiva (ASCII Unit Separator: non compare nei nomi delle entità)
+_PATH_SEP = "char(31)"
+
+# Token di parola per l'estrazione di entità dal testo libero (unicode-aware).
+_WORD_RE = re.compile(r"[\w'’-]+", re.UNICODE)
+
+# Semantica di ricerca per get_triples_by_entity.
+EntityMatch = Literal["exact", "prefix", "fulltext"]
+
+
+def normalize_entity(value: str) -> str:
+    """
+    Forma canonica di un'entità per gli indici di lookup: spazi compattati e casefold.
+    "  Marcello  Mangione" e "marcello mangione" finiscono sulla stessa chiave.
+    """
+    return " ".join(value.split()).casefold()
 
 class GraphDB:
     """
@@ -12,26 +49,48 @@ class GraphDB:
     Salva fatti incontestabili: Soggetto -> Relazione -> Oggetto.
     """
     def __init__(self):
-        # Genera il path assoluto basato sul file di configurazione
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # punta a 'clam'
-        project_dir = os.path.dirname(base_dir) # punta alla root CLAM
-        
-        # Sostituisce './data' con il path assoluto 'root/data'
-        rel_path = CONFIG.memory.long_term.graph_db
-        if rel_path.startswith("./"):
-            rel_path = rel_path[2:]
-            
-        self.db_path = os.path.join(project_dir, rel_path)
-        
-        # Assicuriamoci che la directory 'data' esista
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
+        # Path assoluto (root/data/...) generato dal file di configurazione
+        self.db_path = resolve_data_path(CONFIG.memory.long_term.graph_db)
+        self._settings = CONFIG.memory.graph
+
+        # Un solo writer (serializzato dal lock) + un pool di connessioni read-only:
+        # in WAL i lettori non bloccano lo scrittore e viceversa.
         self._db: Optional[aiosqlite.Connection] = None
         self._lock = asyncio.Lock()
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        # Group commit: il task che possiede il batch() in corso scrive senza commit intermedi.
+        self._batch_task: Optional[asyncio.Task] = None
+
+        self._journal_mode: Optional[str] = None
+        self._fulltext = False
+        self.write_wait = WaitStats("graph_write_lock")
+        self.read_wait = WaitStats("graph_read_pool")
+
+        # Mirror in RAM (memory.graph.mirror): serve le letture senza I/O.
+        self._mirror: Optional[GraphMirror] = None
+        self._mirror_load_ms: Optional[float] = None
+        # Log ordinato delle mutazioni committate, per i consumer incrementali.
+        self.changes = ChangeFeed("graph", self._settings.change_feed_retention)
+        # Effetti di una mutazione (mirror, change feed) accodati fino al commit della transazione.
+        self._pending: List[Callable[[], None]] = []
+
+    async def _apply_pragmas(self, conn: aiosqlite.Connection, read_only: bool):
+        """Tuning SQLite condiviso da writer e lettori (valori da config.yaml)."""
+        await conn.execute(f"PRAGMA mmap_size = {int(self._settings.mmap_size_mb) * 1024 * 1024}")
+        # cache_size negativo = KiB invece che pagine
+        await conn.execute(f"PRAGMA cache_size = {-int(self._settings.cache_size_mb) * 1024}")
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        else:
+            async with conn.execute("PRAGMA journal_mode = WAL") as cursor:
+                (self._journal_mode,) = await cursor.fetchone()
+            await conn.execute(f"PRAGMA synchronous = {self._settings.synchronous}")
 
     async def connect(self):
-        """Inizializza il database SQLite su disco e crea la tabella delle triple."""
+        """Inizializza il database SQLite su disco (WAL), crea la tabella delle triple e apre il pool di lettura."""
         self._db = await aiosqlite.connect(self.db_path)
+        await self._apply_pragmas(self._db, read_only=False)
         await self._db.execute('''
             CREATE TABLE IF NOT EXISTS triples (
                 id_tripla TEXT PRIMARY KEY,
@@ -39,111 +98,980 @@ class GraphDB:
                 predicate TEXT NOT NULL,
                 object_ TEXT NOT NULL,
                 confidence INTEGER DEFAULT 1,
-                timestamp TEXT NOT NULL
+                timestamp TEXT NOT NULL,
+                subject_norm TEXT,
+                object_norm TEXT
             )
         ''')
+        await self._migrate_entity_columns()
         # Creiamo un indice per velocizzare le ricerche incrociate sulle identità
         await self._db.execute('CREATE INDEX IF NOT EXISTS idx_subject ON triples(subject)')
         await self._db.execute('CREATE INDEX IF NOT EXISTS idx_object ON triples(object_)')
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON triples(timestamp)')
+        # Lookup esatto/prefisso sulle entità normalizzate (niente più LIKE '%term%' a tabella piena)
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_subject_norm ON triples(subject_norm)')
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_object_norm ON triples(object_norm)')
+        # Storico dei valori sostituiti dai predicati funzionali (es. ha_eta 59 → 60)
+        await self._db.execute('''
+            CREATE TABLE IF NOT EXISTS triples_history (
+                id_tripla TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                predicate TEXT NOT NULL,
+                object_ TEXT NOT NULL,
+                confidence INTEGER,
+                timestamp TEXT NOT NULL,
+                subject_norm TEXT,
+                superseded_at TEXT NOT NULL,
+                superseded_by TEXT
+            )
+        ''')
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_history_key ON triples_history(subject_norm, predicate)')
+        # Mappature dei predicati apprese dal normalizzatore (token-set / distanza di edit)
+        await self._db.execute('''
+            CREATE TABLE IF NOT EXISTS predicate_mappings (
+                raw TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL,
+                method TEXT NOT NULL,
+                learned_at TEXT NOT NULL
+            )
+        ''')
+        # Versioni precedenti apprendevano anche mappature verso predicati a valore singolo:
+        # sostituivano il valore corrente con fatti diversi ("lived_in" -> vive_a). Vengono rimosse.
+        placeholders = ", ".join("?" * len(SINGLE_VALUED_PREDICATES))
+        cursor = await self._db.execute(
+            f"DELETE FROM predicate_mappings WHERE canonical IN ({placeholders})", tuple(SINGLE_VALUED_PREDICATES)
+        )
+        if cursor.rowcount > 0:
+            print(f"[GraphDB] {cursor.rowcount} mappature di predicati verso predicati a valore singolo rimosse")
+        await cursor.close()
+        async with self._db.execute("SELECT raw, canonical, method FROM predicate_mappings") as cursor:
+            learned = PREDICATE_NORMALIZER.load_learned(await cursor.fetchall())
+        if learned:
+            print(f"[GraphDB] {learned} mappature di predicati apprese caricate")
+        if self._settings.fulltext_index:
+            await self._create_fulltext_index()
         await self._db.commit()
 
+        # Chiave canonica (subject_norm, predicate, object_norm): un fatto = una riga.
+        # I database precedenti vengono compattati una volta prima di creare l'indice univoco.
+        async with self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_triple_key'"
+        ) as cursor:
+            has_key = await cursor.fetchone() is not None
+        if not has_key:
+            removed = await self._compact(self._db)
+            await self._save_learned_predicates(self._db)
+            await self._db.commit()
+            print(f"[GraphDB] Compattazione iniziale: {removed} triple ridondanti rimosse")
+
+        if self._settings.read_pool_size > 0:
+            self._readers = asyncio.Queue()
+            for _ in range(self._settings.read_pool_size):
+                conn = await aiosqlite.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True)
+                await self._apply_pragmas(conn, read_only=True)
+                self._reader_conns.append(conn)
+                self._readers.put_nowait(conn)
+
+        if self._settings.mirror:
+            start = time.perf_counter()
+            self._mirror = GraphMirror()
+            self._mirror.load(await self._fetch_rows(self._db))
+            self._mirror_load_ms = (time.perf_counter() - start) * 1000
+            print(f"[GraphDB] Mirror in RAM: {len(self._mirror)} triple caricate in {self._mirror_load_ms:.1f} ms")
+
     async def disconnect(self):
-        """Chiude la connessione."""
+        """Chiude il pool di lettura e la connessione di scrittura."""
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns = []
+        self._readers = None
+        self._mirror = None
         if self._db:
             await self._db.close()
 
-    async def add_triple(self, triple: LogicalTriple):
-        """Inserisce una nuova asserzione logica nel grafo."""
-        async with self._lock:
+    @staticmethod
+    async def _fetch_rows(db: aiosqlite.Connection) -> List[tuple]:
+        """Tutte le righe nel layout del mirror (colonne della tripla + chiavi normalizzate)."""
+        async with db.execute(f"SELECT {', '.join(ROW_FIELDS)} FROM triples") as cursor:
+            return await cursor.fetchall()
+
+    def _after_commit(self, action: Callable[[], None]) -> None:
+        """Accoda un effetto della transazione corrente: eseguito al commit, scartato al rollback."""
+        self._pending.append(action)
+
+    def _flush_pending(self, committed: bool) -> None:
+        pending, self._pending = self._pending, []
+        if committed:
+            for action in pending:
+                action()
+
+    def _record_upsert(self, row: tuple, inserted: bool) -> None:
+        """Write-through sul mirror + evento insert/update. `row` nel layout ROW_FIELDS (da RETURNING)."""
+        def apply():
+            if self._mirror is not None:
+                self._mirror.upsert(row)
+            self.changes.publish("insert" if inserted else "update", row[0], dict(zip(TRIPLE_COLUMNS, row)))
+        self._after_commit(apply)
+
+    def _record_delete(self, row: tuple) -> None:
+        def apply():
+            if self._mirror is not None:
+                self._mirror.remove(row[0])
+            self.changes.publish("delete", row[0], dict(zip(TRIPLE_COLUMNS, row)))
+        self._after_commit(apply)
+
+    def _record_reset(self, rows: Optional[List[tuple]]) -> None:
+        """Riscrittura massiva: rows=None per lo svuotamento, altrimenti il nuovo contenuto completo."""
+        def apply():
+            if self._mirror is not None:
+                self._mirror.load(rows or [])
+            self.changes.publish("clear" if rows is None else "reset")
+        self._after_commit(apply)
+
+    async def _migrate_entity_columns(self):
+        """Database creati prima degli indici normalizzati: aggiunge le colonne e fa il backfill."""
+        async with self._db.execute("PRAGMA table_info(triples)") as cursor:
+            existing = {row[1] for row in await cursor.fetchall()}
+        if "subject_norm" in existing and "object_norm" in existing:
+            return
+
+        for col in ("subject_norm", "object_norm"):
+            if col not in existing:
+                await self._db.execute(f"ALTER TABLE triples ADD COLUMN {col} TEXT")
+        # Il casefold Unicode lo fa Python: lower() di SQLite gestisce solo l'ASCII.
+        async with self._db.execute("SELECT id_tripla, subject, object_ FROM triples") as cursor:
+            rows = await cursor.fetchall()
+        await self._db.executemany(
+            "UPDATE triples SET subject_norm = ?, object_norm = ? WHERE id_tripla = ?",
+            [(normalize_entity(sub), normalize_entity(obj), id_tripla) for id_tripla, sub, obj in rows],
+        )
+        print(f"[GraphDB] Migrazione indici entità: {len(rows)} triple normalizzate")
+
+    async def _create_fulltext_index(self):
+        """
+        Indice FTS5 (external content sulla tabella triples) per la ricerca fuzzy sugli oggetti.
+        Tenuto allineato dai trigger; se la build di SQLite non ha FTS5 la ricerca fulltext viene disattivata.
+        """
+        try:
+            async with self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'triples_fts'"
+            ) as cursor:
+                exists = await cursor.fetchone() is not None
+            await self._db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS triples_fts USING fts5(
+                    subject, object_, content='triples', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"[GraphDB] FTS5 non disponibile ({e}): ricerca fulltext disattivata.")
+            self._fulltext = False
+            return
+
+        await self._db.executescript('''
+            CREATE TRIGGER IF NOT EXISTS triples_fts_ai AFTER INSERT ON triples BEGIN
+                INSERT INTO triples_fts(rowid, subject, object_) VALUES (new.rowid, new.subject, new.object_);
+            END;
+            CREATE TRIGGER IF NOT EXISTS triples_fts_ad AFTER DELETE ON triples BEGIN
+                INSERT INTO triples_fts(triples_fts, rowid, subject, object_) VALUES ('delete', old.rowid, old.subject, old.object_);
+            END;
+            CREATE TRIGGER IF NOT EXISTS triples_fts_au AFTER UPDATE OF subject, object_ ON triples BEGIN
+                INSERT INTO triples_fts(triples_fts, rowid, subject, object_) VALUES ('delete', old.rowid, old.subject, old.object_);
+                INSERT INTO triples_fts(rowid, subject, object_) VALUES (new.rowid, new.subject, new.object_);
+            END;
+        ''')
+        if not exists:
+            # Primo avvio con FTS su un grafo già popolato: indicizza le righe esistenti.
+            await self._db.execute("INSERT INTO triples_fts(triples_fts) VALUES ('rebuild')")
+        self._fulltext = True
+
+    async def _compact(self, db: aiosqlite.Connection) -> int:
+        """
+        Porta la tabella alla forma canonica: predicati normalizzati secondo l'ontologia e
+        una sola riga per (subject_norm, predicate, object_norm). Dei duplicati sopravvive
+        la riga più forte (confidence, poi più recente), che eredita la confidence massima e
+        il timestamp più recente del gruppo. Restituisce il numero di righe rimosse.
+        """
+        await db.execute("DROP INDEX IF EXISTS idx_triple_key")
+
+        async with db.execute("SELECT DISTINCT predicate FROM triples") as cursor:
+            predicates = [row[0] for row in await cursor.fetchall()]
+        renames = [(normalize_predicate(p), p) for p in predicates if normalize_predicate(p) != p]
+        if renames:
+            await db.executemany("UPDATE triples SET predicate = ? WHERE predicate = ?", renames)
+
+        await db.execute("DROP TABLE IF EXISTS temp._triple_groups")
+        await db.execute('''
+            CREATE TEMP TABLE _triple_groups AS
+            SELECT subject_norm, predicate, object_norm,
+                   MAX(confidence) AS max_confidence, MAX(timestamp) AS last_timestamp
+            FROM triples
+            GROUP BY subject_norm, predicate, object_norm
+            HAVING COUNT(*) > 1
+        ''')
+        cursor = await db.execute('''
+            DELETE FROM triples WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY subject_norm, predicate, object_norm
+                        ORDER BY confidence DESC, timestamp DESC
+                    ) AS rn
+                    FROM triples
+                ) WHERE rn > 1
+            )
+        ''')
+        removed = cursor.rowcount
+        await cursor.close()
+        await db.execute('''
+            UPDATE triples SET
+                confidence = g.max_confidence,
+                timestamp = g.last_timestamp
+            FROM _triple_groups g
+            WHERE triples.subject_norm = g.subject_norm
+              AND triples.predicate = g.predicate
+              AND triples.object_norm = g.object_norm
+        ''')
+        await db.execute("DROP TABLE _triple_groups")
+
+        # Predicati funzionali con più valori (es. due età): resta solo il più recente.
+        if SINGLE_VALUED_PREDICATES:
+            placeholders = ", ".join("?" for _ in SINGLE_VALUED_PREDICATES)
+            stale_rows = f'''
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY subject_norm, predicate
+                        ORDER BY timestamp DESC, confidence DESC
+                    ) AS rn
+                    FROM triples WHERE predicate IN ({placeholders})
+                ) WHERE rn > 1
+            '''
+            params = sorted(SINGLE_VALUED_PREDICATES)
+            if self._settings.keep_history:
+                await db.execute(f'''
+                    INSERT OR IGNORE INTO triples_history
+                    (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, superseded_at, superseded_by)
+                    SELECT id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, ?, NULL
+                    FROM triples WHERE rowid IN ({stale_rows})
+                ''', [datetime.now(timezone.utc).isoformat(), *params])
+            cursor = await db.execute(f"DELETE FROM triples WHERE rowid IN ({stale_rows})", params)
+            removed += cursor.rowcount
+            await cursor.close()
+
+        await db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_triple_key ON triples(subject_norm, predicate, object_norm)"
+        )
+        return removed
+
+    async def compact(self) -> Dict[str, int]:
+        """Compattazione manuale (one-off) dei duplicati: riporta le dimensioni prima e dopo."""
+        async with self._writer() as db:
+            async with db.execute("SELECT COUNT(*) FROM triples") as cursor:
+                (before,) = await cursor.fetchone()
+            removed = await self._compact(db)
+            await self._save_learned_predicates(db)
+            self._record_reset(await self._fetch_rows(db))
+        return {"before": before, "after": before - removed, "removed": removed}
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Presta una connessione read-only dal pool (letture concorrenti con lo scrittore).
+        NB: i lettori vedono solo dati committati, quindi non le scritture di un batch() ancora aperto.
+        Con read_pool_size = 0 si ricade sulla connessione di scrittura, serializzata dal lock
+        (dentro batch() il lock è già del task corrente: si usa la connessione senza riprenderlo).
+        """
+        if not self._db:
+            raise RuntimeError("Errore: GraphDB non connesso.")
+        if self._readers is None:
+            if self._batch_task is not None and self._batch_task is asyncio.current_task():
+                yield self._db
+                return
+            async with timed_lock(self._lock, self.write_wait):
+                yield self._db
+            return
+
+        start = time.perf_counter()
+        conn = await self._readers.get()
+        self.read_wait.record(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Accesso esclusivo alla connessione di scrittura con commit finale (o rollback in caso di errore)."""
+        if self._batch_task is not None and self._batch_task is asyncio.current_task():
+            # Dentro batch(): lock già posseduto, il commit lo fa il batch.
+            yield self._db
+            return
+
+        async with timed_lock(self._lock, self.write_wait):
             if not self._db:
                 raise RuntimeError("Errore: GraphDB non connesso.")
-            
-            # Upsert basico per evitare conflitti o sovrascritture di ID
-            await self._db.execute('''
-                INSERT OR REPLACE INTO triples 
-                (id_tripla, subject, predicate, object_, confidence, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                triple.id_tripla, 
-                triple.subject, 
-                triple.predicate, 
-                triple.object_, 
-                triple.confidence, 
-                triple.timestamp
-            ))
-            await self._db.commit()
+            try:
+                yield self._db
+                await self._db.commit()
+            except BaseException:
+                await self._db.rollback()
+                self._flush_pending(committed=False)
+                raise
+            self._flush_pending(committed=True)
 
-    async def get_all_triples(self) -> List[LogicalTriple]:
-        """Restituisce tutto il grafo (utile per esplorare o graficare la GUI)."""
-        async with self._lock:
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator["GraphDB"]:
+        """
+        Group commit per raffiche di scritture (seed, estrazioni multiple, import):
+        tutte le scritture del task corrente dentro il blocco condividono una sola transazione
+        e un solo commit. In caso di eccezione l'intero batch viene annullato.
+        """
+        if self._batch_task is not None and self._batch_task is asyncio.current_task():
+            yield self  # batch annidato: si unisce a quello esterno
+            return
+
+        async with timed_lock(self._lock, self.write_wait):
             if not self._db:
                 raise RuntimeError("Errore: GraphDB non connesso.")
-            
-            async with self._db.execute('SELECT * FROM triples ORDER BY timestamp DESC') as cursor:
+            self._batch_task = asyncio.current_task()
+            try:
+                yield self
+                await self._db.commit()
+            except BaseException:
+                await self._db.rollback()
+                self._flush_pending(committed=False)
+                raise
+            finally:
+                self._batch_task = None
+            self._flush_pending(committed=True)
+
+    async def _save_learned_predicates(self, db: aiosqlite.Connection) -> None:
+        """Salva, nella transazione di scrittura in corso, le mappature apprese dal normalizzatore."""
+        learned = PREDICATE_NORMALIZER.drain_learned()
+        if learned:
+            await db.executemany(
+                "INSERT OR REPLACE INTO predicate_mappings (raw, canonical, method, learned_at) VALUES (?, ?, ?, ?)",
+                learned,
+            )
+
+    async def forget_predicate_mapping(self, raw_predicate: str) -> bool:
+        """Elimina una mappatura appresa sbagliata (le triple già scritte restano come sono)."""
+        known = PREDICATE_NORMALIZER.forget(raw_predicate)
+        async with self._writer() as db:
+            cursor = await db.execute(
+                "DELETE FROM predicate_mappings WHERE raw = ?", (fold(clean_predicate(raw_predicate)),)
+            )
+            deleted = cursor.rowcount > 0
+            await cursor.close()
+        return known or deleted
+
+    async def get_predicate_mappings(self) -> List[Dict[str, str]]:
+        async with self._reader() as db:
+            async with db.execute(
+                "SELECT raw, canonical, method, learned_at FROM predicate_mappings ORDER BY learned_at DESC"
+            ) as cursor:
+                return [
+                    dict(zip(("raw", "canonical", "method", "learned_at"), row)) for row in await cursor.fetchall()
+                ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tempi di attesa su lock di scrittura e pool di lettura (per /api/stats)."""
+        return {
+            "journal_mode": self._journal_mode,
+            "read_pool_size": len(self._reader_conns),
+            "fulltext_index": self._fulltext,
+            "write_lock_wait": self.write_wait.snapshot(),
+            "read_pool_wait": self.read_wait.snapshot(),
+            "mirror": {
+                "triples": len(self._mirror),
+                "entities": self._mirror.entity_count,
+                "load_ms": round(self._mirror_load_ms, 1),
+            } if self._mirror is not None else None,
+            "change_feed": self.changes.get_stats(),
+            "predicates": PREDICATE_NORMALIZER.get_stats(),
+        }
+
+    async def add_triple(self, triple: LogicalTriple) -> str:
+        """
+        Inserisce una nuova asserzione logica nel grafo, oppure la fonde con quella già presente.
+        Se il fatto (subject, predicate, object normalizzati) esiste già, in un unico statement
+        la confidence viene rinforzata (+1, fino a MAX_CONFIDENCE, mai sotto quella nuova) e il
+        timestamp aggiornato. Restituisce l'id della riga effettivamente memorizzata.
+        """
+        predicate = normalize_predicate(triple.predicate)
+        subject_norm = normalize_entity(triple.subject)
+        object_norm = normalize_entity(triple.object_)
+        async with self._writer() as db:
+            async with db.execute(f'''
+                INSERT INTO triples
+                (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, object_norm)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(subject_norm, predicate, object_norm) DO UPDATE SET
+                    confidence = MIN(?, MAX(triples.confidence + 1, excluded.confidence)),
+                    timestamp = excluded.timestamp
+                RETURNING {", ".join(ROW_FIELDS)}
+            ''', (
+                triple.id_tripla,
+                triple.subject,
+                predicate,
+                triple.object_,
+                triple.confidence,
+                triple.timestamp,
+                subject_norm,
+                object_norm,
+                MAX_CONFIDENCE
+            )) as cursor:
+                stored = await cursor.fetchone()
+            stored_id = stored[0]
+            # Se la riga esisteva già, RETURNING restituisce il suo id e non quello nuovo
+            self._record_upsert(stored, inserted=(stored_id == triple.id_tripla))
+
+            # Predicato funzionale: nella stessa transazione il nuovo valore sostituisce i precedenti
+            if is_single_valued(predicate):
+                await self._supersede(db, subject_norm, predicate, object_norm, stored_id)
+            await self._save_learned_predicates(db)
+        return stored_id
+
+    async def add_triples(self, triples: Sequence[LogicalTriple]) -> List[str]:
+        """
+        Versione massiva di add_triple (import, seed): stessa semantica di fusione e di sostituzione
+        dei predicati funzionali, ma a livello di insieme. Le triple vengono caricate in una tabella
+        temporanea con un solo executemany e fuse con un unico INSERT ... SELECT ... ON CONFLICT,
+        quindi il numero di round-trip non dipende dalla dimensione del blocco.
+        Per un predicato funzionale vince l'ultimo valore del blocco (un valore sostituito e poi
+        riaffermato nello stesso blocco conserva la confidence accumulata invece di ripartire da capo).
+        Gli altri valori del blocco per lo stesso (soggetto, predicato) non entrano mai in `triples`:
+        vanno direttamente nello storico (se keep_history), senza eventi insert/delete.
+        Restituisce gli id memorizzati, nell'ordine di input; la posizione di un valore sostituito
+        ha l'id della sua riga storica (quella già presente nel grafo, se il valore c'era).
+        """
+        if not triples:
+            return []
+        staged = [
+            (
+                seq, t.id_tripla, t.subject, normalize_predicate(t.predicate), t.object_,
+                t.confidence, t.timestamp, normalize_entity(t.subject), normalize_entity(t.object_),
+            )
+            for seq, t in enumerate(triples)
+        ]
+        staged_ids = {row[1] for row in staged}
+        async with self._writer() as db:
+            await db.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS _staged_triples (
+                    seq INTEGER PRIMARY KEY, id_tripla TEXT, subject TEXT, predicate TEXT, object_ TEXT,
+                    confidence INTEGER, timestamp TEXT, subject_norm TEXT, object_norm TEXT
+                )
+            ''')
+            await db.execute("DELETE FROM temp._staged_triples")
+            await db.executemany("INSERT INTO temp._staged_triples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", staged)
+            single_valued = json.dumps(sorted(SINGLE_VALUED_PREDICATES))
+            losers: List[tuple] = []
+            if SINGLE_VALUED_PREDICATES:
+                # Valori di un predicato funzionale superati da uno successivo nello stesso blocco:
+                # fuori dalla fusione, così non vengono inseriti per poi essere subito eliminati
+                async with db.execute('''
+                    DELETE FROM temp._staged_triples WHERE seq IN (
+                        SELECT s.seq FROM temp._staged_triples s JOIN (
+                            SELECT subject_norm, predicate, object_norm, ROW_NUMBER() OVER (
+                                PARTITION BY subject_norm, predicate ORDER BY seq DESC
+                            ) AS rn
+                            FROM temp._staged_triples
+                            WHERE predicate IN (SELECT value FROM json_each(?))
+                        ) w ON s.subject_norm = w.subject_norm AND s.predicate = w.predicate
+                           AND w.rn = 1 AND s.object_norm != w.object_norm
+                    )
+                    RETURNING seq, id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, object_norm
+                ''', (single_valued,)) as cursor:
+                    losers = sorted(await cursor.fetchall())
+            # "WHERE true" serve al parser di SQLite per non leggere ON CONFLICT come vincolo di una JOIN
+            await db.execute('''
+                INSERT INTO triples
+                (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, object_norm)
+                SELECT id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, object_norm
+                FROM temp._staged_triples WHERE true ORDER BY seq
+                ON CONFLICT(subject_norm, predicate, object_norm) DO UPDATE SET
+                    confidence = MIN(?, MAX(triples.confidence + 1, excluded.confidence)),
+                    timestamp = excluded.timestamp
+            ''', (MAX_CONFIDENCE,))
+
+            removed: List[tuple] = []
+            new_losers: Dict[tuple, tuple] = {}
+            if SINGLE_VALUED_PREDICATES:
+                # Ultimo valore del blocco per (soggetto, predicato funzionale): sostituisce tutti gli altri
+                await db.execute("DROP TABLE IF EXISTS temp._staged_winners")
+                await db.execute('''
+                    CREATE TEMP TABLE _staged_winners AS
+                    SELECT w.subject_norm, w.predicate, w.object_norm, t.id_tripla AS winner_id
+                    FROM (
+                        SELECT subject_norm, predicate, object_norm, ROW_NUMBER() OVER (
+                            PARTITION BY subject_norm, predicate ORDER BY seq DESC
+                        ) AS rn
+                        FROM temp._staged_triples
+                        WHERE predicate IN (SELECT value FROM json_each(?))
+                    ) w
+                    JOIN triples t ON t.subject_norm = w.subject_norm
+                        AND t.predicate = w.predicate AND t.object_norm = w.object_norm
+                    WHERE w.rn = 1
+                ''', (single_valued,))
+                stale = '''
+                    FROM triples t JOIN temp._staged_winners w
+                      ON t.subject_norm = w.subject_norm AND t.predicate = w.predicate
+                     AND t.object_norm != w.object_norm
+                '''
+                superseded_at = datetime.now(timezone.utc).isoformat()
+                if self._settings.keep_history:
+                    await db.execute(f'''
+                        INSERT OR IGNORE INTO triples_history
+                        (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, superseded_at, superseded_by)
+                        SELECT t.id_tripla, t.subject, t.predicate, t.object_, t.confidence, t.timestamp,
+                               t.subject_norm, ?, w.winner_id
+                        {stale}
+                    ''', (superseded_at,))
+                async with db.execute(f'''
+                    DELETE FROM triples WHERE rowid IN (SELECT t.rowid {stale})
+                    RETURNING {", ".join(ROW_FIELDS)}
+                ''') as cursor:
+                    removed = await cursor.fetchall()
+
+                # Valori superati nel blocco e assenti dal grafo: una riga storica per valore (la prima
+                # del blocco). Quelli già presenti nel grafo sono tra i `removed`.
+                removed_keys = {(r[6], r[2], r[7]) for r in removed}
+                for row in losers:
+                    key = (row[7], row[3], row[8])
+                    if key not in removed_keys:
+                        new_losers.setdefault(key, row)
+                if self._settings.keep_history and new_losers:
+                    async with db.execute("SELECT subject_norm, predicate, winner_id FROM temp._staged_winners") as cursor:
+                        winner_ids = {(r[0], r[1]): r[2] for r in await cursor.fetchall()}
+                    await db.executemany('''
+                        INSERT OR IGNORE INTO triples_history
+                        (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, superseded_at, superseded_by)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [
+                        (*row[1:8], superseded_at, winner_ids.get((row[7], row[3])))
+                        for row in new_losers.values()
+                    ])
+                await db.execute("DROP TABLE temp._staged_winners")
+
+            async with db.execute(f'''
+                SELECT {", ".join(ROW_FIELDS)} FROM triples
+                WHERE (subject_norm, predicate, object_norm) IN (
+                    SELECT subject_norm, predicate, object_norm FROM temp._staged_triples
+                )
+            ''') as cursor:
+                stored = await cursor.fetchall()
+
+            for row in stored:
+                self._record_upsert(row, inserted=(row[0] in staged_ids))
+            for row in removed:
+                self._record_delete(row)
+            if removed or new_losers:
+                print(f"[GraphDB] ♻️ {len(removed) + len(new_losers)} valori di predicati funzionali sostituiti dai nuovi")
+            await self._save_learned_predicates(db)
+
+        # Chiave canonica (subject_norm, predicate, object_norm) → id della riga che la rappresenta
+        ids_by_key = {(r[6], r[2], r[7]): r[0] for r in (*removed, *stored)}
+        ids_by_key.update((key, row[1]) for key, row in new_losers.items())
+        return [ids_by_key[(row[7], row[3], row[8])] for row in staged]
+
+    async def _supersede(
+        self, db: aiosqlite.Connection, subject_norm: str, predicate: str, current_object_norm: str, superseded_by: str
+    ):
+        """Sposta nello storico (se abilitato) ed elimina i valori precedenti di un predicato funzionale."""
+        stale = '''
+            FROM triples WHERE subject_norm = ? AND predicate = ? AND object_norm != ?
+        '''
+        key = (subject_norm, predicate, current_object_norm)
+        if self._settings.keep_history:
+            await db.execute(f'''
+                INSERT OR IGNORE INTO triples_history
+                (id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, superseded_at, superseded_by)
+                SELECT id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, ?, ?
+                {stale}
+            ''', (datetime.now(timezone.utc).isoformat(), superseded_by, *key))
+        async with db.execute(f"DELETE {stale} RETURNING {', '.join(ROW_FIELDS)}", key) as cursor:
+            for old in await cursor.fetchall():
+                self._record_delete(old)
+                print(f"[GraphDB] ♻️ {old[1]} -> {predicate}: '{old[3]}' sostituito dal nuovo valore")
+
+    async def get_history(self, subject: str, predicate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Valori sostituiti di un soggetto (opzionalmente per un solo predicato), dal più recente."""
+        query = '''
+            SELECT subject, predicate, object_, confidence, timestamp, superseded_at, superseded_by
+            FROM triples_history WHERE subject_norm = ?
+        '''
+        params: List[Any] = [normalize_entity(subject)]
+        if predicate is not None:
+            query += " AND predicate = ?"
+            params.append(normalize_predicate(predicate))
+        query += " ORDER BY superseded_at DESC"
+        async with self._reader() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+                names = [d[0] for d in cursor.description]
+        return [dict(zip(names, r)) for r in rows]
+
+    async def get_all_triples(self) -> List[LogicalTriple]:
+        """Restituisce tutto il grafo. Preferire query_triples/iter_triples con filtri mirati."""
+        return await self.query_triples()
+
+    @staticmethod
+    def _triple_filters(
+        subject: Optional[str] = None,
+        predicate: Optional[Union[str, Sequence[str]]] = None,
+        object_: Optional[str] = None,
+        min_confidence: Optional[int] = None,
+        max_confidence: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Tuple[List[str], List[Any]]:
+        """Traduce i filtri in clausole WHERE. `predicate` accetta un singolo valore o una lista."""
+        where: List[str] = []
+        params: List[Any] = []
+        if subject is not None:
+            where.append("subject = ?")
+            params.append(subject)
+        if predicate is not None:
+            predicates = [predicate] if isinstance(predicate, str) else list(predicate)
+            where.append(f"predicate IN ({', '.join('?' for _ in predicates)})")
+            params.extend(predicates)
+        if object_ is not None:
+            where.append("object_ = ?")
+            params.append(object_)
+        if min_confidence is not None:
+            where.append("confidence >= ?")
+            params.append(min_confidence)
+        if max_confidence is not None:
+            where.append("confidence <= ?")
+            params.append(max_confidence)
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(until)
+        return where, params
+
+    @staticmethod
+    def _mirror_filters(
+        subject: Optional[str] = None,
+        predicate: Optional[Union[str, Sequence[str]]] = None,
+        object_: Optional[str] = None,
+        min_confidence: Optional[int] = None,
+        max_confidence: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Gli stessi filtri di _triple_filters, tradotti per GraphMirror.filter (con le chiavi d'indice)."""
+        return {
+            "subject": subject,
+            "subject_norm": normalize_entity(subject) if subject is not None else None,
+            "predicates": None if predicate is None else ([predicate] if isinstance(predicate, str) else list(predicate)),
+            "object_": object_,
+            "object_norm": normalize_entity(object_) if object_ is not None else None,
+            "min_confidence": min_confidence,
+            "max_confidence": max_confidence,
+            "since": since,
+            "until": until,
+        }
+
+    def _mirror_reader(self) -> Optional[GraphMirror]:
+        """Il mirror, se attivo. Come per i lettori SQLite, non vede le scritture di un batch() non ancora committato."""
+        if not self._db:
+            raise RuntimeError("Errore: GraphDB non connesso.")
+        return self._mirror
+
+    async def query_triples(
+        self,
+        subject: Optional[str] = None,
+        predicate: Optional[Union[str, Sequence[str]]] = None,
+        object_: Optional[str] = None,
+        min_confidence: Optional[int] = None,
+        max_confidence: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        order_by: str = "timestamp",
+        descending: bool = True,
+        limit: Optional[int] = None,
+        after: Optional[KeysetCursor] = None,
+    ) -> List[Union[LogicalTriple, Dict[str, Any]]]:
+        """
+        Lettura filtrata del grafo.
+        Senza `columns` restituisce LogicalTriple complete; con `columns` restituisce dict leggeri
+        con le sole colonne richieste (più id_tripla e la colonna di ordinamento, usate dal cursore).
+        `after` è il cursore keyset (valore_ordinamento, id_tripla) dell'ultima riga della pagina precedente.
+        """
+        where, params = self._triple_filters(subject, predicate, object_, min_confidence, max_confidence, since, until)
+        sql, params, selected = build_select(
+            "triples", "id_tripla", TRIPLE_COLUMNS, where, params,
+            columns=columns, order_by=order_by, descending=descending, limit=limit, after=after,
+        )
+        mirror = self._mirror_reader()
+        if mirror is not None:
+            matched = mirror.query(
+                self._mirror_filters(subject, predicate, object_, min_confidence, max_confidence, since, until),
+                order_by, descending, limit, after,
+            )
+            if columns:
+                return [dict(zip(selected, mirror.project(r, selected))) for r in matched]
+            return [mirror.to_triple(r) for r in matched]
+
+        async with self._reader() as db:
+            async with db.execute(sql, params) as cursor:
                 rows = await cursor.fetchall()
-                
-            return [
-                LogicalTriple(
-                    id_tripla=r[0],
-                    subject=r[1],
-                    predicate=r[2],
-                    object_=r[3],
-                    confidence=r[4],
-                    timestamp=r[5]
-                ) for r in rows
-            ]
-
-    async def get_triples_by_entity(self, entity_name: str) -> List[LogicalTriple]:
+
+        if columns:
+            return [dict(zip(selected, r)) for r in rows]
+        return [LogicalTriple(**dict(zip(selected, r))) for r in rows]
+
+    async def iter_triples(self, page_size: int = 500, **query) -> AsyncIterator[Union[LogicalTriple, Dict[str, Any]]]:
+        """Streaming a pagine (keyset) sopra query_triples, senza tenere il lock tra una pagina e l'altra."""
+        order_by = query.get("order_by", "timestamp")
+        after: Optional[KeysetCursor] = query.pop("after", None)
+        while True:
+            page = await self.query_triples(limit=page_size, after=after, **query)
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            after = next_cursor(last if isinstance(last, dict) else last.model_dump(), "id_tripla", order_by)
+
+    async def count_triples(self, **filters) -> int:
+        """Conta le triple che soddisfano i filtri (stessi argomenti di query_triples)."""
+        mirror = self._mirror_reader()
+        if mirror is not None:
+            return mirror.count(**self._mirror_filters(**filters))
+
+        where, params = self._triple_filters(**filters)
+        sql = "SELECT COUNT(*) FROM triples"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        async with self._reader() as db:
+            async with db.execute(sql, params) as cursor:
+                (count,) = await cursor.fetchone()
+        return count
+
+    async def get_triples_by_entity(
+        self, entity_name: str, match: EntityMatch = "exact", limit: Optional[int] = None
+    ) -> List[LogicalTriple]:
         """
         Retrieval (RAG Logico): Dato un SOGGETTO o un OGGETTO, trova tutti i legami.
         Es: Se cerco 'Utente', torna [Utente, ha_nome, Marcello].
+
+        match:
+          - "exact": entità normalizzata identica ('Utente' NON matcha 'Utente_secondario'). Usa gli indici.
+          - "prefix": entità che iniziano con il termine (range scan sugli stessi indici).
+          - "fulltext": ricerca per token via FTS5 su soggetto e oggetto, ordinata per rilevanza.
         """
-        async with self._lock:
-            if not self._db:
-                raise RuntimeError("Errore: GraphDB non connesso.")
-            
-            # Cerca ovunque il termine sia coinvolto (sia come attore che come oggetto)
-            query = '''
-                SELECT * FROM triples 
-                WHERE subject LIKE ? OR object_ LIKE ?
+        term = normalize_entity(entity_name)
+        mirror = self._mirror_reader()
+        if mirror is not None and match in ("exact", "prefix"):
+            rows = mirror.by_entity(term, prefix=(match == "prefix"))
+            if limit is not None:
+                rows = rows[:int(limit)]
+            return [mirror.to_triple(r) for r in rows]
+
+        cols = ", ".join(TRIPLE_COLUMNS)
+        if match == "exact":
+            query = f'''
+                SELECT {cols} FROM triples
+                WHERE subject_norm = ? OR object_norm = ?
+                ORDER BY confidence DESC
+            '''
+            params: List[Any] = [term, term]
+        elif match == "prefix":
+            # Range [term, term + U+10FFFF) sull'indice: equivalente a LIKE 'term%' ma senza scansione
+            upper = term + "\U0010ffff"
+            query = f'''
+                SELECT {cols} FROM triples
+                WHERE (subject_norm >= ? AND subject_norm < ?) OR (object_norm >= ? AND object_norm < ?)
                 ORDER BY confidence DESC
             '''
-            term = f"%{entity_name}%"
-            async with self._db.execute(query, (term, term)) as cursor:
+            params = [term, upper, term, upper]
+        elif match == "fulltext":
+            if not self._fulltext:
+                raise RuntimeError("Errore: indice fulltext non disponibile (memory.graph.fulltext_index).")
+            tokens = [tok.replace('"', '""') for tok in term.split()]
+            if not tokens:
+                return []
+            query = f'''
+                SELECT {", ".join("t." + c for c in TRIPLE_COLUMNS)} FROM triples_fts
+                JOIN triples t ON t.rowid = triples_fts.rowid
+                WHERE triples_fts MATCH ?
+                ORDER BY triples_fts.rank, t.confidence DESC
+            '''
+            # Ogni token come prefisso quotato: "marc"* trova "Marcello" ma non genera sintassi FTS arbitraria
+            params = [" ".join(f'"{tok}"*' for tok in tokens)]
+        else:
+            raise ValueError(f"Modalità di match sconosciuta: '{match}'")
+
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        async with self._reader() as db:
+            async with db.execute(query, params) as cursor:
                 rows = await cursor.fetchall()
-                
-            return [
-                LogicalTriple(
-                    id_tripla=r[0], subject=r[1], predicate=r[2], object_=r[3], 
-                    confidence=r[4], timestamp=r[5]
-                ) for r in rows
-            ]
+
+        return [LogicalTriple(**dict(zip(TRIPLE_COLUMNS, r))) for r in rows]
+
+    async def find_entities_in_text(self, text: str, max_ngram: int = 3) -> List[str]:
+        """
+        Individua le entità del grafo citate in un testo libero (es. il prompt dell'utente):
+        gli n-grammi di parole normalizzati vengono confrontati con gli indici subject_norm/object_norm.
+        Restituisce le entità normalizzate trovate.
+        """
+        words = _WORD_RE.findall(text)
+        candidates = {
+            normalize_entity(" ".join(words[i:i + n]))
+            for n in range(1, max_ngram + 1)
+            for i in range(len(words) - n + 1)
+        }
+        if not candidates:
+            return []
+        mirror = self._mirror_reader()
+        if mirror is not None:
+            return mirror.known_entities(sorted(candidates))
+        payload = json.dumps(sorted(candidates))
+        async with self._reader() as db:
+            async with db.execute('''
+                SELECT DISTINCT subject_norm FROM triples WHERE subject_norm IN (SELECT value FROM json_each(?))
+                UNION
+                SELECT DISTINCT object_norm FROM triples WHERE object_norm IN (SELECT value FROM json_each(?))
+            ''', (payload, payload)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def traverse(
+        self,
+        seeds: Sequence[str],
+        max_depth: Optional[int] = None,
+        predicates: Optional[Sequence[str]] = None,
+        max_fanout: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+    ) -> Subgraph:
+        """
+        GraphRAG multi-hop: BFS a profondità limitata dai seed, in entrambe le direzioni degli archi,
+        con una CTE ricorsiva. Es: "Utente ha_conosciuto Luca; Luca vive_a Torino" → da 'Utente'
+        a profondità 2 si arriva a Torino.
+
+        - predicates: se indicato, attraversa solo archi con quei predicati.
+        - max_fanout: per ogni entità espansa segue al massimo N archi per direzione (i più forti).
+        - max_nodes: tetto alle righe generate dalla ricorsione (protezione sugli hub).
+        La protezione dai cicli è sul path: un'entità non viene rivisitata nello stesso cammino.
+        """
+        depth = self._settings.traversal_depth if max_depth is None else max_depth
+        fanout = self._settings.traversal_fanout if max_fanout is None else max_fanout
+        node_cap = self._settings.traversal_max_nodes if max_nodes is None else max_nodes
+
+        seed_norms = list(dict.fromkeys(normalize_entity(s) for s in seeds if s and s.strip()))
+        if not seed_norms:
+            return Subgraph()
+
+        mirror = self._mirror_reader()
+        if mirror is not None:
+            entities, rows = mirror.traverse(
+                seed_norms, depth,
+                [normalize_predicate(p) for p in predicates] if predicates else None,
+                fanout, node_cap,
+            )
+            return Subgraph(seeds=seed_norms, entities=entities, triples=[mirror.to_triple(r) for r in rows])
+
+        pred_clause = ""
+        pred_params: List[Any] = []
+        if predicates:
+            pred_clause = "AND predicate IN (SELECT value FROM json_each(?))"
+            pred_params = [json.dumps([normalize_predicate(p) for p in predicates])]
+
+        sep = _PATH_SEP
+        walk_sql = f'''
+            WITH RECURSIVE walk(node, depth, path) AS (
+                SELECT value, 0, {sep} || value || {sep} FROM json_each(?)
+                UNION ALL
+                SELECT t.object_norm, w.depth + 1, w.path || t.object_norm || {sep}
+                  FROM walk w JOIN triples t ON t.rowid IN (
+                      SELECT rowid FROM triples WHERE subject_norm = w.node {pred_clause}
+                      ORDER BY confidence DESC, timestamp DESC LIMIT ?)
+                 WHERE w.depth < ? AND instr(w.path, {sep} || t.object_norm || {sep}) = 0
+                UNION ALL
+                SELECT t.subject_norm, w.depth + 1, w.path || t.subject_norm || {sep}
+                  FROM walk w JOIN triples t ON t.rowid IN (
+                      SELECT rowid FROM triples WHERE object_norm = w.node {pred_clause}
+                      ORDER BY confidence DESC, timestamp DESC LIMIT ?)
+                 WHERE w.depth < ? AND instr(w.path, {sep} || t.subject_norm || {sep}) = 0
+                LIMIT ?
+            )
+            SELECT node, MIN(depth) FROM walk GROUP BY node
+        '''
+        walk_params = [
+            json.dumps(seed_norms),
+            *pred_params, fanout, depth,
+            *pred_params, fanout, depth,
+            node_cap,
+        ]
+
+        async with self._reader() as db:
+            async with db.execute(walk_sql, walk_params) as cursor:
+                entities = {node: d for node, d in await cursor.fetchall()}
+
+            # Archi del sottografo: i top-fanout di ogni entità espansa, con l'altro estremo raggiunto.
+            expanded = json.dumps([n for n, d in entities.items() if d < depth])
+            reached = json.dumps(list(entities))
+            cols = ", ".join(TRIPLE_COLUMNS)
+            edges_sql = f'''
+                SELECT {cols} FROM triples WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY subject_norm ORDER BY confidence DESC, timestamp DESC
+                        ) AS rn
+                        FROM triples WHERE subject_norm IN (SELECT value FROM json_each(?)) {pred_clause}
+                    ) WHERE rn <= ?
+                    UNION
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY object_norm ORDER BY confidence DESC, timestamp DESC
+                        ) AS rn
+                        FROM triples WHERE object_norm IN (SELECT value FROM json_each(?)) {pred_clause}
+                    ) WHERE rn <= ?
+                )
+                AND subject_norm IN (SELECT value FROM json_each(?))
+                AND object_norm IN (SELECT value FROM json_each(?))
+                ORDER BY confidence DESC, timestamp DESC
+            '''
+            edges_params = [expanded, *pred_params, fanout, expanded, *pred_params, fanout, reached, reached]
+            async with db.execute(edges_sql, edges_params) as cursor:
+                rows = await cursor.fetchall()
+
+        return Subgraph(
+            seeds=seed_norms,
+            entities=entities,
+            triples=[LogicalTriple(**dict(zip(TRIPLE_COLUMNS, r))) for r in rows],
+        )
 
     async def delete_triple(self, id_tripla: str):
         """Rimuove chirurgicamente una singola verità assoluta."""
-        async with self._lock:
-            if not self._db:
-                raise RuntimeError("Errore: GraphDB non connesso.")
-            await self._db.execute('DELETE FROM triples WHERE id_tripla = ?', (id_tripla,))
-            await self._db.commit()
+        async with self._writer() as db:
+            async with db.execute(
+                f"DELETE FROM triples WHERE id_tripla = ? RETURNING {', '.join(ROW_FIELDS)}", (id_tripla,)
+            ) as cursor:
+                for old in await cursor.fetchall():
+                    self._record_delete(old)
 
     async def delete_triples_by_pattern(self, subject: str, predicate: str, object_: str):
         """Elimina una o più triple che matchano la descrizione esatta (usato dall'LLM per auto-correggersi)."""
-        async with self._lock:
-            if not self._db:
-                raise RuntimeError("Errore: GraphDB non connesso.")
-            await self._db.execute('''
-                DELETE FROM triples 
-                WHERE subject = ? COLLATE NOCASE 
-                  AND predicate = ? COLLATE NOCASE 
-                  AND object_ = ? COLLATE NOCASE
-            ''', (subject, predicate, object_))
-            await self._db.commit()
+        async with self._writer() as db:
+            # Stessa chiave canonica dell'indice univoco: lookup puntuale, case/spazi-insensitive
+            async with db.execute(f'''
+                DELETE FROM triples
+                WHERE subject_norm = ? AND predicate = ? AND object_norm = ?
+                RETURNING {", ".join(ROW_FIELDS)}
+            ''', (normalize_entity(subject), normalize_predicate(predicate), normalize_entity(object_))) as cursor:
+                for old in await cursor.fetchall():
+                    self._record_delete(old)
 
     async def clear_all(self):
         """Formattazione totale per il Reset Memoria."""
-        async with self._lock:
-            if not self._db:
-                raise RuntimeError("Errore: GraphDB non connesso.")
-            await self._db.execute('DELETE FROM triples')
-            await self._db.commit()
+        async with self._writer() as db:
+            await db.execute('DELETE FROM triples')
+            await db.execute('DELETE FROM triples_history')
+            self._record_reset(None)
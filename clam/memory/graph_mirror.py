@@ -0,0 +1,327 @@
+"""
+Mirror in-process del Knowledge Graph.
+
+Il grafo di un singolo utente sta comodamente in RAM: GraphDB lo carica qui una volta
+al connect e da quel momento tutte le letture (renderer, percezione, telemetria, lookup
+di entità, traversate GraphRAG) vengono servite da dizionari, senza I/O né round-trip
+nel thread di aiosqlite. SQLite resta la fonte di verità: ogni mutazione viene scritta
+prima su disco e applicata al mirror solo dopo il commit (write-through).
+
+Rappresentazione compatta:
+  - ogni tripla è una tupla (vedi ROW_FIELDS), non un oggetto Pydantic;
+  - le stringhe ripetute (entità, predicati) sono internate con sys.intern;
+  - indici di adiacenza subject_norm / object_norm / predicate → insieme di id.
+
+Tutti i metodi sono sincroni e non cedono mai il controllo all'event loop,
+quindi ogni operazione è atomica rispetto alle altre coroutine.
+"""
+
+import bisect
+import heapq
+import sys
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from clam.core.models import LogicalTriple
+
+# Layout delle tuple: le colonne di TRIPLE_COLUMNS seguite dalle due chiavi normalizzate.
+ROW_FIELDS = (
+    "id_tripla", "subject", "predicate", "object_", "confidence", "timestamp",
+    "subject_norm", "object_norm",
+)
+_ID, _SUB, _PRED, _OBJ, _CONF, _TS, _SUB_N, _OBJ_N = range(len(ROW_FIELDS))
+FIELD_INDEX: Dict[str, int] = {name: i for i, name in enumerate(ROW_FIELDS)}
+
+Row = Tuple[str, str, str, str, int, str, str, str]
+
+
+# Ordinamento degli archi usato anche da GraphDB: confidence, poi timestamp.
+_strength = itemgetter(_CONF, _TS)
+_by_confidence = itemgetter(_CONF)
+
+
+class GraphMirror:
+    """Copia in RAM della tabella triples con indici di adiacenza."""
+
+    def __init__(self):
+        self._rows: Dict[str, Row] = {}
+        self._by_key: Dict[Tuple[str, str, str], str] = {}
+        self._by_subject: Dict[str, Set[str]] = {}
+        self._by_object: Dict[str, Set[str]] = {}
+        self._by_predicate: Dict[str, Set[str]] = {}
+        # Entità ordinate per i lookup a prefisso: ricostruite solo quando l'insieme cambia.
+        self._sorted_entities: Optional[List[str]] = None
+        # Viste ordinate dell'intero grafo per colonna (letture non filtrate, es. telemetria):
+        # costruite alla prima richiesta e invalidate da qualunque mutazione.
+        self._sorted_views: Dict[int, Tuple[List[Tuple[Any, str]], List[Row]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def entity_count(self) -> int:
+        return len(self._by_subject.keys() | self._by_object.keys())
+
+    # ── Mutazioni (chiamate da GraphDB dopo il commit) ──────────────
+
+    def load(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Sostituisce l'intero contenuto (connect, compattazione)."""
+        self.clear()
+        for row in rows:
+            self.upsert(row)
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._by_key.clear()
+        self._by_subject.clear()
+        self._by_object.clear()
+        self._by_predicate.clear()
+        self._sorted_entities = None
+        self._sorted_views.clear()
+
+    def upsert(self, row: Sequence[Any]) -> None:
+        """Inserisce o sostituisce una riga (stesso layout di ROW_FIELDS, es. da RETURNING)."""
+        row = self._intern(row)
+        previous = self._rows.get(row[_ID])
+        if previous is not None:
+            self._unlink(previous)
+        self._rows[row[_ID]] = row
+        self._link(row)
+        self._sorted_views.clear()
+
+    def remove(self, id_tripla: str) -> None:
+        previous = self._rows.pop(id_tripla, None)
+        if previous is not None:
+            self._unlink(previous)
+            self._sorted_views.clear()
+
+    @staticmethod
+    def _intern(row: Sequence[Any]) -> Row:
+        id_tripla, subject, predicate, object_, confidence, timestamp, subject_norm, object_norm = row
+        return (
+            id_tripla, sys.intern(subject), sys.intern(predicate), sys.intern(object_),
+            confidence, timestamp, sys.intern(subject_norm), sys.intern(object_norm),
+        )
+
+    def _link(self, row: Row) -> None:
+        id_tripla = row[_ID]
+        self._by_key[(row[_SUB_N], row[_PRED], row[_OBJ_N])] = id_tripla
+        for index, key in ((self._by_subject, row[_SUB_N]), (self._by_object, row[_OBJ_N])):
+            bucket = index.get(key)
+            if bucket is None:
+                index[key] = bucket = set()
+                self._sorted_entities = None
+            bucket.add(id_tripla)
+        self._by_predicate.setdefault(row[_PRED], set()).add(id_tripla)
+
+    def _unlink(self, row: Row) -> None:
+        id_tripla = row[_ID]
+        self._by_key.pop((row[_SUB_N], row[_PRED], row[_OBJ_N]), None)
+        for index, key in (
+            (self._by_subject, row[_SUB_N]),
+            (self._by_object, row[_OBJ_N]),
+            (self._by_predicate, row[_PRED]),
+        ):
+            bucket = index.get(key)
+            if bucket is None:
+                continue
+            bucket.discard(id_tripla)
+            if not bucket:
+                del index[key]
+                if index is not self._by_predicate:
+                    self._sorted_entities = None
+
+    # ── Letture ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def to_triple(row: Row) -> LogicalTriple:
+        # NB: il costruttore validato di pydantic-core è più rapido di model_construct
+        return LogicalTriple(
+            id_tripla=row[_ID], subject=row[_SUB], predicate=row[_PRED],
+            object_=row[_OBJ], confidence=row[_CONF], timestamp=row[_TS],
+        )
+
+    @staticmethod
+    def project(row: Row, columns: Sequence[str]) -> Tuple[Any, ...]:
+        return tuple(row[FIELD_INDEX[c]] for c in columns)
+
+    @staticmethod
+    def _unfiltered(filters: Dict[str, Any]) -> bool:
+        return all(v is None for v in filters.values())
+
+    def filter(
+        self,
+        subject: Optional[str] = None,
+        subject_norm: Optional[str] = None,
+        predicates: Optional[Sequence[str]] = None,
+        object_: Optional[str] = None,
+        object_norm: Optional[str] = None,
+        min_confidence: Optional[int] = None,
+        max_confidence: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Row]:
+        """
+        Stessa semantica di GraphDB._triple_filters. Il candidato di partenza è l'indice più
+        selettivo disponibile (soggetto, oggetto, predicato); il resto è filtrato in memoria.
+        """
+        if subject_norm is not None:
+            candidates: Iterable[str] = self._by_subject.get(subject_norm, ())
+        elif object_norm is not None:
+            candidates = self._by_object.get(object_norm, ())
+        elif predicates is not None:
+            candidates = chain.from_iterable(self._by_predicate.get(p, ()) for p in set(predicates))
+        elif all(v is None for v in (min_confidence, max_confidence, since, until)):
+            return list(self._rows.values())
+        else:
+            candidates = self._rows.keys()
+
+        pred_set = set(predicates) if predicates is not None else None
+        rows = self._rows
+        out: List[Row] = []
+        for id_tripla in candidates:
+            row = rows[id_tripla]
+            if subject is not None and row[_SUB] != subject:
+                continue
+            if pred_set is not None and row[_PRED] not in pred_set:
+                continue
+            if object_ is not None and row[_OBJ] != object_:
+                continue
+            if min_confidence is not None and row[_CONF] < min_confidence:
+                continue
+            if max_confidence is not None and row[_CONF] > max_confidence:
+                continue
+            if since is not None and row[_TS] < since:
+                continue
+            if until is not None and row[_TS] >= until:
+                continue
+            out.append(row)
+        return out
+
+    def count(self, **filters) -> int:
+        if self._unfiltered(filters):
+            return len(self._rows)
+        return len(self.filter(**filters))
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        order_by: str,
+        descending: bool,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> List[Row]:
+        """filter + order; senza filtri la pagina viene tagliata dalla vista ordinata (O(limit) + bisect)."""
+        if not self._unfiltered(filters):
+            return self.order(self.filter(**filters), order_by, descending, limit, after)
+
+        col = FIELD_INDEX[order_by]
+        view = self._sorted_views.get(col)
+        if view is None:
+            key = itemgetter(col, _ID)
+            rows = sorted(self._rows.values(), key=key)
+            view = self._sorted_views[col] = ([key(r) for r in rows], rows)
+        keys, rows = view
+
+        if descending:
+            end = len(rows) if after is None else bisect.bisect_left(keys, self._pivot(col, after))
+            start = 0 if limit is None else max(0, end - int(limit))
+            return rows[start:end][::-1]
+        start = 0 if after is None else bisect.bisect_right(keys, self._pivot(col, after))
+        end = len(rows) if limit is None else start + int(limit)
+        return rows[start:end]
+
+    @staticmethod
+    def _pivot(col: int, after: Tuple[Any, str]) -> Tuple[Any, str]:
+        # Ordinando per chiave primaria il cursore confronta solo l'id (vedi build_select)
+        return (after[1], after[1]) if col == _ID else (after[0], after[1])
+
+    def order(
+        self,
+        rows: List[Row],
+        order_by: str,
+        descending: bool,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> List[Row]:
+        """Ordinamento (colonna, id_tripla) e paginazione keyset, come build_select."""
+        col = FIELD_INDEX[order_by]
+        key = itemgetter(col, _ID)
+
+        if after is not None:
+            pivot = self._pivot(col, after)
+            if descending:
+                rows = [r for r in rows if key(r) < pivot]
+            else:
+                rows = [r for r in rows if key(r) > pivot]
+
+        if limit is not None and limit < len(rows):
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            return pick(int(limit), rows, key=key)
+        return sorted(rows, key=key, reverse=descending)
+
+    def by_entity(self, term: str, prefix: bool = False) -> List[Row]:
+        """Triple in cui l'entità normalizzata compare come soggetto o oggetto, per confidence decrescente."""
+        if prefix:
+            entities = self._entities_with_prefix(term)
+        else:
+            entities = [term]
+        ids: Set[str] = set()
+        for entity in entities:
+            ids.update(self._by_subject.get(entity, ()))
+            ids.update(self._by_object.get(entity, ()))
+        return sorted((self._rows[i] for i in ids), key=_by_confidence, reverse=True)
+
+    def _entities_with_prefix(self, term: str) -> List[str]:
+        if self._sorted_entities is None:
+            self._sorted_entities = sorted(self._by_subject.keys() | self._by_object.keys())
+        entities = self._sorted_entities
+        start = bisect.bisect_left(entities, term)
+        end = bisect.bisect_left(entities, term + "\U0010ffff", lo=start)
+        return entities[start:end]
+
+    def known_entities(self, candidates: Iterable[str]) -> List[str]:
+        return [c for c in candidates if c in self._by_subject or c in self._by_object]
+
+    def traverse(
+        self,
+        seeds: Sequence[str],
+        max_depth: int,
+        predicates: Optional[Sequence[str]],
+        max_fanout: int,
+        max_nodes: int,
+    ) -> Tuple[Dict[str, int], List[Row]]:
+        """
+        BFS a livelli con le stesse regole della CTE di GraphDB.traverse: per ogni entità
+        espansa i top-`max_fanout` archi per direzione; gli archi restituiti collegano entità raggiunte.
+        Qui `max_nodes` limita direttamente le entità raggiunte (nella CTE limita le righe della ricorsione).
+        """
+        pred_set = set(predicates) if predicates else None
+
+        def strongest(ids: Iterable[str]) -> List[Row]:
+            rows = (self._rows[i] for i in ids)
+            if pred_set is not None:
+                rows = (r for r in rows if r[_PRED] in pred_set)
+            return heapq.nlargest(max_fanout, rows, key=_strength)
+
+        entities: Dict[str, int] = {seed: 0 for seed in seeds}
+        frontier = list(entities)
+        candidate_edges: Dict[str, Row] = {}
+        for depth in range(max_depth):
+            next_frontier: List[str] = []
+            for node in frontier:
+                hops = chain(
+                    ((r, r[_OBJ_N]) for r in strongest(self._by_subject.get(node, ()))),
+                    ((r, r[_SUB_N]) for r in strongest(self._by_object.get(node, ()))),
+                )
+                for row, neighbour in hops:
+                    candidate_edges[row[_ID]] = row
+                    if neighbour not in entities and len(entities) < max_nodes:
+                        entities[neighbour] = depth + 1
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+
+        edges = [r for r in candidate_edges.values() if r[_SUB_N] in entities and r[_OBJ_N] in entities]
+        edges.sort(key=_strength, reverse=True)
+        return entities, edges
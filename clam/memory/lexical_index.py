@@ -0,0 +1,121 @@
+"""
+Indice lessicale (SQLite FTS5, ranking BM25) delle collezioni della Long-Term Memory.
+
+La ricerca vettoriale confonde i token "rari ma esatti" — nomi propri, numeri, sigle —
+che sono proprio quelli su cui l'utente fa domande ("Marcello", "60"). Questo indice
+tiene una copia testuale di ogni documento di Chroma e risponde per corrispondenza di
+termini; LongTermMemory.hybrid_search fonde le due classifiche.
+
+Tabella `lexical_docs` (kind, id, text) + FTS5 external content allineata dai trigger,
+come triples_fts nel GraphDB. Chiamate sincrone: girano nel thread pool della LTM.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# Oltre questo numero di termini la query FTS diventa costosa senza migliorare il ranking
+MAX_QUERY_TERMS = 32
+
+
+class LexicalIndex:
+    """Indice BM25 dei documenti LTM, partizionato per collezione (`kind`)."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS lexical_docs (
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                UNIQUE(kind, id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS lexical_fts USING fts5(
+                text, content='lexical_docs', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS lexical_fts_ai AFTER INSERT ON lexical_docs BEGIN
+                INSERT INTO lexical_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS lexical_fts_ad AFTER DELETE ON lexical_docs BEGIN
+                INSERT INTO lexical_fts(lexical_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS lexical_fts_au AFTER UPDATE OF text ON lexical_docs BEGIN
+                INSERT INTO lexical_fts(lexical_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                INSERT INTO lexical_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+        ''')
+        self._db.commit()
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        """
+        Termini della domanda in OR, ciascuno quotato: nessuna sintassi FTS arbitraria dall'utente.
+        L'OR lascia a BM25 il compito di premiare i documenti che contengono più termini (e i più rari).
+        """
+        terms = list(dict.fromkeys(t.lower() for t in _TERM_RE.findall(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return None
+        return " OR ".join(f'"{t}"' for t in terms)
+
+    def upsert(self, kind: str, docs: Iterable[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._db.executemany(
+                '''
+                INSERT INTO lexical_docs (kind, id, text) VALUES (?, ?, ?)
+                ON CONFLICT(kind, id) DO UPDATE SET text = excluded.text
+                ''',
+                [(kind, doc_id, text or "") for doc_id, text in docs],
+            )
+            self._db.commit()
+
+    def delete(self, kind: str, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM lexical_docs WHERE kind = ? AND id = ?", [(kind, i) for i in ids])
+            self._db.commit()
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            if kind is None:
+                self._db.execute("DELETE FROM lexical_docs")
+            else:
+                self._db.execute("DELETE FROM lexical_docs WHERE kind = ?", (kind,))
+            self._db.commit()
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM lexical_docs WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def search(self, kind: str, query: str, limit: int) -> List[Tuple[str, str, float]]:
+        """(id, testo, bm25) in ordine di rilevanza (bm25 più basso = più rilevante)."""
+        expression = self.match_expression(query)
+        if expression is None or limit <= 0:
+            return []
+        with self._lock:
+            return self._db.execute(
+                '''
+                SELECT d.id, d.text, bm25(lexical_fts) AS score
+                FROM lexical_fts JOIN lexical_docs d ON d.rowid = lexical_fts.rowid
+                WHERE lexical_fts MATCH ? AND d.kind = ?
+                ORDER BY score
+                LIMIT ?
+                ''',
+                (expression, kind, limit),
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT kind, COUNT(*) FROM lexical_docs GROUP BY kind").fetchall()
+        return dict(rows)
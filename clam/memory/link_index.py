@@ -0,0 +1,126 @@
+"""
+Grafo dei legami Zettelkasten (z-links) tra i documenti della Long-Term Memory.
+
+Alla promozione il GC cerca i fatti più vicini al nuovo nodo; quei legami finivano solo nella
+stringa `z_links` dei metadati e nessuno li rileggeva. Qui diventano una tabella di adiacenza
+indicizzata: ogni legame è salvato nei due versi con il suo peso di similarità, così "i vicini
+di questi documenti" è una lettura per indice e non una ricerca vettoriale in più
+(LongTermMemory.expand_links / hybrid_search(expand_hops=...)).
+
+Chiamate sincrone: girano nel thread pool della LTM.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (sorgente, destinazione, peso)
+Link = Tuple[str, str, float]
+
+
+class LinkIndex:
+    """Adiacenza pesata e bidirezionale dei documenti LTM, partizionata per collezione (`kind`)."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS ltm_links (
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (kind, source, target)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_ltm_links_target ON ltm_links(kind, target);
+            CREATE TABLE IF NOT EXISTS ltm_links_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+        self._db.commit()
+
+    def link(self, kind: str, links: Iterable[Link]) -> int:
+        """Salva i legami nei due versi. Un legame già presente tiene il peso più alto."""
+        rows = []
+        for source, target, weight in links:
+            if source == target:
+                continue
+            rows.append((kind, source, target, weight))
+            rows.append((kind, target, source, weight))
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany(
+                '''
+                INSERT INTO ltm_links (kind, source, target, weight) VALUES (?, ?, ?, ?)
+                ON CONFLICT(kind, source, target) DO UPDATE SET weight = MAX(weight, excluded.weight)
+                ''',
+                rows,
+            )
+            self._db.commit()
+        return len(rows) // 2
+
+    def neighbours(self, kind: str, ids: Sequence[str], fanout: int) -> List[Link]:
+        """I `fanout` legami più forti di ciascun documento, dal più forte."""
+        if not ids or fanout <= 0:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            return self._db.execute(
+                f'''
+                SELECT source, target, weight FROM (
+                    SELECT source, target, weight,
+                           ROW_NUMBER() OVER (PARTITION BY source ORDER BY weight DESC) AS position
+                    FROM ltm_links
+                    WHERE kind = ? AND source IN ({placeholders})
+                )
+                WHERE position <= ?
+                ORDER BY weight DESC
+                ''',
+                (kind, *ids, fanout),
+            ).fetchall()
+
+    def delete(self, kind: str, ids: Sequence[str]) -> None:
+        """Rimuove i documenti dal grafo (legami in entrambi i versi)."""
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM ltm_links WHERE kind = ? AND (source = ? OR target = ?)",
+                [(kind, i, i) for i in ids],
+            )
+            self._db.commit()
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            if kind is None:
+                self._db.execute("DELETE FROM ltm_links")
+            else:
+                self._db.execute("DELETE FROM ltm_links WHERE kind = ?", (kind,))
+            self._db.commit()
+
+    def is_backfilled(self, kind: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM ltm_links_meta WHERE key = ?", (f"backfilled:{kind}",)).fetchone()
+        return row is not None
+
+    def mark_backfilled(self, kind: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ltm_links_meta (key, value) VALUES (?, '1')", (f"backfilled:{kind}",)
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Legami per collezione (ognuno contato una volta, non per verso)."""
+        with self._lock:
+            rows = self._db.execute("SELECT kind, COUNT(*) / 2 FROM ltm_links GROUP BY kind").fetchall()
+        return dict(rows)
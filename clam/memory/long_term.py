@@ -1,80 +1,675 @@
 import asyncio
-import chromadb
-from clam.core.models import VectorDBNode
+import numpy as np
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Sequence, Tuple, Union
+from clam.core.models import MemoryHit, VectorDBNode
+from clam.core.metrics import AsyncRWLock
+from clam.memory.change_feed import ChangeFeed
+from clam.memory.embedding import BatchingEmbedder, create_provider
+from clam.memory.embedding_cache import EmbeddingCache, Vector
+from clam.memory.lexical_index import LexicalIndex
+from clam.memory.link_index import LinkIndex
+from clam.memory.recency_index import RecencyIndex
+from clam.memory.vector_store import DEFAULT_QUERY_INCLUDE, Include, VectorStore, Where, create_vector_store
 from clam.config import CONFIG
 
+# Le due collezioni CoALA: fatti (semantic) ed esperienze (episodic)
+MemoryKind = Literal["semantic", "episodic"]
+
+
+def _merge_by_distance(pages: Sequence[dict], n_queries: int, n_results: int, include: Include) -> dict:
+    """Fonde i risultati di più interrogazioni (una per pagina della finestra): per ogni testo i `n_results` più vicini."""
+    merged: Dict[str, list] = {key: [] for key in ("ids", *include)}
+    for q in range(n_queries):
+        best = sorted(
+            (page["distances"][q][i], p, i) for p, page in enumerate(pages) for i in range(len(page["ids"][q]))
+        )[:n_results]
+        for key, values in merged.items():
+            column = [pages[p][key][q][i] for _, p, i in best]
+            values.append(np.asarray(column) if key == "embeddings" else column)
+    return merged
+
 class LongTermMemory:
     """
-    Gestisce la Memoria Consolidata (Semantica ed Episodica) usando ChromaDB in locale su persistenza disco.
+    Gestisce la Memoria Consolidata (Semantica ed Episodica) su un backend vettoriale locale con
+    persistenza su disco (ChromaDB o il backend nativo, vedi clam/memory/vector_store.py).
     Separiamo le Collezioni Vettoriali per rispettare il paradigma CoALA (Experiences vs Facts).
-    Avvolge i driver sincroni di chromadb in blocchi asincroni per non fermare l'event loop di asyncio.
+    Avvolge i driver sincroni in blocchi asincroni per non fermare l'event loop di asyncio:
+    ogni chiamata (embedding, HNSW, I/O) gira in un thread pool dedicato. Le ricerche procedono
+    in parallelo sotto un lock lettori/scrittore; add/delete/clear restano esclusive.
+    Gli embedding sono calcolati da CLAM (non da Chroma) e passano da una cache per testo:
+    ricerche e inserimenti dello stesso concetto vettorializzano una volta sola.
+    Accanto alle collezioni vivono un indice lessicale BM25 (FTS5) per la ricerca ibrida e un
+    indice di recenza (seq + timestamp di ingestione) per le letture "più recenti prima".
+    I legami Zettelkasten (z-links) del GC sono materializzati in una tabella di adiacenza pesata,
+    usata per espandere i risultati ai vicini senza ulteriori ricerche vettoriali.
+    Ogni scrittura pubblica un evento sul change feed `changes` (telemetria incrementale).
     """
     def __init__(self):
-        self._lock = asyncio.Lock()
-        
-        # Il path di persistenza evita di fargli scaricare un server intero, creando DB localmente.
-        self.client = chromadb.PersistentClient(path=CONFIG.memory.long_term.path)
-        
-        self.semantic_collection = self.client.get_or_create_collection(name=CONFIG.memory.long_term.semantic_collection)
-        self.episodic_collection = self.client.get_or_create_collection(name=CONFIG.memory.long_term.episodic_collection)
+        self._rwlock = AsyncRWLock("ltm")
+        self._executor_threads = CONFIG.memory.long_term.executor_threads
+        self._executor = ThreadPoolExecutor(max_workers=self._executor_threads, thread_name_prefix="clam-ltm")
+
+        # Modello scelto in config (default: la stessa funzione che Chroma userebbe implicitamente)
+        provider = create_provider(CONFIG.embedding)
+        self.embedding_cache = EmbeddingCache(
+            model=provider.name,
+            capacity=CONFIG.memory.long_term.embedding_cache_size,
+            path=CONFIG.memory.long_term.embedding_cache_path,
+        )
+        self.embedder = BatchingEmbedder(
+            provider, self.embedding_cache, self._run,
+            batch_size=CONFIG.embedding.batch_size, max_wait_ms=CONFIG.embedding.max_wait_ms,
+        )
+        # Backend aperto al primo utilizzo (di norma in connect(), fuori dall'event loop):
+        # importare il modulo o costruire LongTermMemory non costa l'avvio di Chroma.
+        self._store: Optional[VectorStore] = None
+        self.lexical = LexicalIndex(CONFIG.memory.long_term.lexical_index_path)
+        self.recency = RecencyIndex(CONFIG.memory.long_term.recency_index_path)
+        self.links = LinkIndex(CONFIG.memory.long_term.link_index_path)
+        self.changes = ChangeFeed("ltm", CONFIG.memory.long_term.change_feed_retention)
+
+    @property
+    def store(self) -> VectorStore:
+        if self._store is None:
+            self._store = create_vector_store(CONFIG.memory.long_term)
+        return self._store
+
+    def _open_store(self) -> None:
+        self.store
+
+    async def connect(self):
+        """
+        Apre il backend vettoriale (nel thread pool) e allinea gli indici laterali (lessicale e di
+        recenza) alle collezioni (primo avvio, file cancellato, import offline): se i conteggi non
+        coincidono la collezione viene riletta a pagine e l'indice ricostruito. Il grafo dei
+        z-links viene popolato una volta sola dai metadati già presenti.
+        """
+        await self._run(self._open_store)
+        for kind in ("semantic", "episodic"):
+            expected = await self.count(kind)
+            lexical_ok = await self._run(self.lexical.count, kind) == expected
+            recency_ok = await self._run(self.recency.count, kind) == expected
+            if lexical_ok and recency_ok:
+                continue
+            async with self._rwlock.write():
+                if not lexical_ok:
+                    await self._run(self.lexical.clear, kind)
+                stamps = []
+                page_size = CONFIG.bulk_io.page_size
+                offset = 0
+                while True:
+                    page = await self._run(
+                        self.store.get, kind, limit=page_size, offset=offset, include=["documents", "metadatas"]
+                    )
+                    if not lexical_ok:
+                        await self._run(self.lexical.upsert, kind, zip(page["ids"], page["documents"]))
+                    for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                        metadata = metadata or {}
+                        stamps.append((doc_id, metadata.get("ingest_seq"), metadata.get("ingested_at")))
+                    if len(page["ids"]) < page_size:
+                        break
+                    offset += len(page["ids"])
+                if not recency_ok:
+                    await self._run(self.recency.rebuild, kind, stamps)
+            rebuilt = [name for name, ok in (("lessicale", lexical_ok), ("di recenza", recency_ok)) if not ok]
+            print(f"[LTM] 🔤 Indice {' e '.join(rebuilt)} '{kind}' ricostruito: {expected} documenti")
+        for kind in ("semantic", "episodic"):
+            if not await self._run(self.links.is_backfilled, kind):
+                async with self._rwlock.write():
+                    count = await self._backfill_links(kind)
+                if count:
+                    print(f"[LTM] 🔗 Grafo dei z-links '{kind}' ricostruito dai metadati: {count} legami")
+
+    async def _backfill_links(self, kind: MemoryKind) -> int:
+        """
+        Prima apertura del grafo dei legami: rilegge la stringa `z_links` dei metadati esistenti.
+        I pesi, che lì non c'erano, si ricalcolano dagli embedding dei due estremi. Chiamare sotto lock.
+        """
+        total = 0
+        page_size = CONFIG.bulk_io.page_size
+        offset = 0
+        while True:
+            page = await self._run(
+                self.store.get, kind, limit=page_size, offset=offset, include=["metadatas", "embeddings"]
+            )
+            links = await self._run(self._weighted_z_links, kind, page["ids"], page["metadatas"], page["embeddings"])
+            total += await self._run(self.links.link, kind, links)
+            if len(page["ids"]) < page_size:
+                break
+            offset += len(page["ids"])
+        await self._run(self.links.mark_backfilled, kind)
+        return total
+
+    def _weighted_z_links(self, kind: MemoryKind, ids: Sequence[str], metadatas: Sequence[Optional[dict]],
+                          embeddings: Sequence[Vector]) -> List[Tuple[str, str, float]]:
+        """
+        Legami dalla stringa `z_links` dei metadati (backfill, import da backup), pesati dalla distanza
+        tra gli embedding dei due estremi. Sincrona: gira nel thread pool.
+        """
+        vectors = {doc_id: embeddings[i] for i, doc_id in enumerate(ids)}
+        pairs = []
+        for doc_id, metadata in zip(ids, metadatas):
+            for target in filter(None, ((metadata or {}).get("z_links") or "").split(",")):
+                pairs.append((doc_id, target.strip()))
+        missing = list({target for _, target in pairs if target not in vectors})
+        if missing:
+            found = self.store.get(kind, ids=missing, include=["embeddings"])
+            vectors.update({doc_id: found["embeddings"][i] for i, doc_id in enumerate(found["ids"])})
+        return [
+            (source, target, self.similarity(float(np.sum(np.square(
+                np.asarray(vectors[source], dtype=np.float32) - np.asarray(vectors[target], dtype=np.float32)
+            )))))
+            for source, target in pairs
+            if target in vectors  # legami verso documenti già eliminati: scartati
+        ]
+
+    @staticmethod
+    def similarity(distance: float) -> float:
+        """Peso di un legame dalla distanza L2 al quadrato restituita dal backend: 1 se identici, → 0 se lontani."""
+        return 1.0 / (1.0 + max(distance, 0.0))
+
+    async def link_nodes(self, kind: MemoryKind, source: str, targets: Sequence[Tuple[str, float]]) -> int:
+        """Registra i legami Zettelkasten (destinazione, peso) di un documento, nei due versi."""
+        async with self._rwlock.write():
+            return await self._run(self.links.link, kind, [(source, target, weight) for target, weight in targets])
+
+    async def inherit_links(self, kind: MemoryKind, target: str, sources: Sequence[str]) -> int:
+        """Copia su `target` i legami dei documenti `sources` (consolidamento: fatti fusi in uno solo)."""
+        async with self._rwlock.write():
+            inherited = await self._run(
+                self.links.neighbours, kind, list(sources), CONFIG.memory.long_term.link_fanout
+            )
+            return await self._run(
+                self.links.link, kind,
+                [(target, other, weight) for _, other, weight in inherited if other not in sources],
+            )
+
+    def _stamp(self, kind: MemoryKind, nodes: Sequence[VectorDBNode], replace: bool) -> List[dict]:
+        """
+        Assegna seq e timestamp di ingestione (indice di recenza) e li copia nei metadati.
+        Un `ingested_at` già presente nei metadati (restore da backup) viene conservato.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        assigned = self.recency.register(
+            kind, [(n.id_concetto, n.metadata.get("ingested_at") or now) for n in nodes], replace=replace
+        )
+        stamped = []
+        for node in nodes:
+            seq, ingested_at = assigned[node.id_concetto]
+            stamped.append({**node.metadata, "ingest_seq": seq, "ingested_at": ingested_at})
+        return stamped
+
+    def _publish_inserts(self, kind: MemoryKind, nodes: Sequence[VectorDBNode], metadatas: Sequence[dict]) -> None:
+        for node, metadata in zip(nodes, metadatas):
+            self.changes.publish("insert", node.id_concetto, {
+                "kind": kind,
+                "id_concetto": node.id_concetto,
+                "descrizione": node.descrizione,
+                "ingest_seq": metadata["ingest_seq"],
+                "ingested_at": metadata["ingested_at"],
+            })
 
     async def add_semantic_node(self, node: VectorDBNode):
         """
         [Fatti] Inserisce informazioni oggettive e preferenze statiche. 
         Costituiscono l'identità operativa dell'agente.
         """
-        async with self._lock:
-            self.semantic_collection.add(
-                documents=[node.descrizione],
-                metadatas=[node.metadata],
-                ids=[node.id_concetto]
-            )
+        await self._add_node("semantic", node)
 
     async def add_episodic_node(self, node: VectorDBNode):
         """
         [Esperienze] Inserisce log e sequenze decisionali. Il database per "non ripetere due volte l'errore".
         """
-        async with self._lock:
-            self.episodic_collection.add(
+        await self._add_node("episodic", node)
+
+    async def _add_node(self, kind: MemoryKind, node: VectorDBNode) -> bool:
+        """
+        Semantica di add: un id già presente resta com'è (il backend ignorerebbe il duplicato).
+        In quel caso nemmeno indice lessicale, recenza e change feed vengono toccati, altrimenti
+        il BM25 indicizzerebbe un testo che il vettore non ha. Restituisce True se il nodo è nuovo.
+        """
+        # L'embedding si calcola prima di prendere il lock: le ricerche non aspettano il modello
+        embeddings = await self.embed([node.descrizione])
+        async with self._rwlock.write():
+            existing = await self._run(self.store.get, kind, ids=[node.id_concetto], include=[])
+            if existing["ids"]:
+                return False
+            metadatas = await self._run(self._stamp, kind, [node], replace=False)
+            await self._run(
+                self.store.add,
+                kind,
+                ids=[node.id_concetto],
                 documents=[node.descrizione],
-                metadatas=[node.metadata],
-                ids=[node.id_concetto]
+                metadatas=metadatas,
+                embeddings=embeddings,
+            )
+            await self._run(self.lexical.upsert, kind, [(node.id_concetto, node.descrizione)])
+            self._publish_inserts(kind, [node], metadatas)
+        return True
+
+    async def _run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Esegue una chiamata sincrona (backend vettoriale, cache, indice) nel thread pool della LTM."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def embed(self, texts: Sequence[str]) -> List[Vector]:
+        """Embedding dei testi (uno per testo), calcolati solo per quelli non ancora in cache."""
+        texts = list(texts)
+        vectors = await self._run(self.embedding_cache.get_many, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, await self.embedder.embed(missing)))
+            vectors = [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    async def warmup(self):
+        """Carica il modello di embedding all'avvio: la prima domanda dell'utente non paga il caricamento."""
+        load_ms = await self.embedder.warmup()
+        print(f"[LTM] 🔥 Modello di embedding '{self.embedder.provider.name}' pronto in {load_ms:.0f} ms")
+
+    def close(self):
+        """Ferma il thread pool e chiude i file (shutdown dell'applicazione)."""
+        self._executor.shutdown(wait=True)
+        if self._store is not None:
+            self._store.close()
+        self.embedding_cache.close()
+        self.lexical.close()
+        self.recency.close()
+        self.links.close()
+
+    def get_stats(self) -> dict:
+        """Attese sul lock lettori/scrittore: misura la contesa tra ricerche e scritture."""
+        return {
+            "executor_threads": self._executor_threads,
+            "store": self._store.get_stats() if self._store is not None else None,
+            **self._rwlock.snapshot(),
+            "embedding": self.embedder.get_stats(),
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "lexical_index": self.lexical.get_stats(),
+            "recency_index": self.recency.get_stats(),
+            "link_index": self.links.get_stats(),
+            "change_feed": self.changes.get_stats(),
+        }
+
+    @property
+    def max_batch_size(self) -> int:
+        """Massimo numero di record accettati dal backend in una singola add/upsert."""
+        return self.store.max_batch_size
+
+    async def add_nodes(
+        self,
+        kind: MemoryKind,
+        nodes: Sequence[VectorDBNode],
+        embeddings: Optional[Sequence[Sequence[float]]] = None,
+    ):
+        """
+        Inserimento massivo (import, backup restore): un'unica upsert per blocco invece di una add per nodo.
+        Con `embeddings` i vettori vengono usati così come sono, senza ricalcolarli.
+        Upsert: reimportare lo stesso file è idempotente (i nodi reimportati ricevono però un seq
+        nuovo: tornano in cima ai recenti, con il loro `ingested_at` originale).
+        """
+        if not nodes:
+            return
+        if embeddings is None:
+            embeddings = await self.embed([n.descrizione for n in nodes])
+        # Blocchi piccoli: Chroma tiene il GIL durante l'upsert, tra un blocco e l'altro l'event loop riparte
+        step = max(1, min(self.max_batch_size, CONFIG.memory.long_term.write_chunk_size))
+        async with self._rwlock.write():
+            for start in range(0, len(nodes), step):
+                chunk = nodes[start:start + step]
+                metadatas = await self._run(self._stamp, kind, chunk, replace=True)
+                await self._run(
+                    self.store.upsert,
+                    kind,
+                    ids=[n.id_concetto for n in chunk],
+                    documents=[n.descrizione for n in chunk],
+                    metadatas=metadatas,
+                    embeddings=[np.asarray(e, dtype=np.float32) for e in embeddings[start:start + step]],
+                )
+                await self._run(self.lexical.upsert, kind, [(n.id_concetto, n.descrizione) for n in chunk])
+                self._publish_inserts(kind, chunk, metadatas)
+                # Import da backup: i z-links dei metadati entrano anche nel grafo dei legami
+                if any(n.metadata.get("z_links") for n in chunk):
+                    links = await self._run(
+                        self._weighted_z_links, kind, [n.id_concetto for n in chunk], metadatas,
+                        embeddings[start:start + step],
+                    )
+                    await self._run(self.links.link, kind, links)
+
+    async def iter_nodes(
+        self, kind: MemoryKind, page_size: int = 1000, include_embeddings: bool = False
+    ) -> AsyncIterator[Tuple[VectorDBNode, Optional[List[float]]]]:
+        """Scorre un'intera collezione a pagine (export/backup) senza caricarla tutta in memoria."""
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        offset = 0
+        while True:
+            async with self._rwlock.read():
+                page = await self._run(self.store.get, kind, limit=page_size, offset=offset, include=include)
+            ids = page["ids"]
+            embeddings = page.get("embeddings") if include_embeddings else None
+            for i, id_concetto in enumerate(ids):
+                node = VectorDBNode(
+                    id_concetto=id_concetto,
+                    descrizione=page["documents"][i] or "",
+                    metadata=page["metadatas"][i] or {},
+                )
+                yield node, ([float(x) for x in embeddings[i]] if embeddings is not None else None)
+            if len(ids) < page_size:
+                return
+            offset += len(ids)
+
+    async def count(self, kind: MemoryKind) -> int:
+        async with self._rwlock.read():
+            return await self._run(self.store.count, kind)
+
+    async def search(
+        self,
+        kind: MemoryKind,
+        query: Union[str, Sequence[str]],
+        n_results: int = 3,
+        where: Optional[Where] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        include: Optional[Include] = None,
+    ) -> dict:
+        """
+        Ricerca vettoriale con i filtri spinti nel backend invece di sovra-recuperare e filtrare in Python.
+        - `query`: un testo o una lista di testi (forma batch: un solo embedding batch e un'unica
+          interrogazione del backend; il risultato ha una lista per testo, nell'ordine dato).
+        - `where`: condizioni sui metadati (sintassi di Chroma), es. {"contesto_origine": "User Prompt"},
+          {"direct_write": "true"}, {"original_score": {"$gte": 2}}.
+        - `since`/`until`: istanti ISO 8601 UTC (`until` escluso). La finestra viene risolta
+          dall'indice di recenza e passata al backend come elenco di id ammessi, a pagine di
+          `time_filter_max_ids` documenti (vedi _query_window).
+        - `include`: proiezione dei campi ("documents", "metadatas", "distances", "embeddings");
+          gli id ci sono sempre. Escludere documenti ed embedding evita di leggerli e copiarli.
+        """
+        queries = [query] if isinstance(query, str) else list(query)
+        include = tuple(DEFAULT_QUERY_INCLUDE if include is None else include)
+        if not queries:
+            return {"ids": [], **{key: [] for key in include}}
+        query_embeddings = await self.embed(queries)
+        async with self._rwlock.read():
+            return await self._query_window(kind, query_embeddings, n_results, include, where, since, until)
+
+    async def _window_pages(
+        self, kind: MemoryKind, since: Optional[str], until: Optional[str]
+    ) -> AsyncIterator[List[str]]:
+        """
+        Id della finestra temporale dall'indice di recenza, dal più recente, a pagine di
+        `time_filter_max_ids` (paginazione per before_seq). Chiamare sotto lock.
+        """
+        limit = CONFIG.memory.long_term.time_filter_max_ids
+        before_seq = None
+        while True:
+            rows = await self._run(self.recency.recent, kind, limit, before_seq, since, until)
+            if rows:
+                yield [doc_id for _, doc_id, _ in rows]
+            if len(rows) < limit:
+                return
+            before_seq = rows[-1][0]
+
+    async def _query_window(
+        self,
+        kind: MemoryKind,
+        query_embeddings: Sequence[Vector],
+        n_results: int,
+        include: Include,
+        where: Optional[Where],
+        since: Optional[str],
+        until: Optional[str],
+    ) -> dict:
+        """
+        Interrogazione del backend ristretta alla finestra since/until. Una finestra più ampia di
+        `time_filter_max_ids` viene interrogata pagina per pagina e i migliori `n_results` di ogni
+        pagina sono fusi per distanza: nessun documento della finestra resta fuori, il costo cresce
+        con l'ampiezza della finestra. Chiamare sotto lock.
+        """
+        if since is None and until is None:
+            return await self._run(
+                self.store.query, kind, query_embeddings=query_embeddings, n_results=n_results,
+                include=include, where=where,
             )
+        include = tuple(include)
+        page_include = include if "distances" in include else (*include, "distances")
+        pages = []
+        async for ids in self._window_pages(kind, since, until):
+            pages.append(await self._run(
+                self.store.query, kind, query_embeddings=query_embeddings, n_results=n_results,
+                include=page_include, where=where, ids=ids,
+            ))
+        if len(pages) == 1 and page_include == include:
+            return pages[0]
+        return _merge_by_distance(pages, len(query_embeddings), n_results, include)
 
-    async def search_semantic(self, query: str, n_results: int = 3) -> dict:
-        """Recupero Vettoriale sui Fatti per la fase di Familiarity Check."""
-        async with self._lock:
-            return self.semantic_collection.query(
-                query_texts=[query],
-                n_results=n_results
+    async def search_semantic(self, query: Union[str, Sequence[str]], n_results: int = 3, **filters) -> dict:
+        """Recupero Vettoriale sui Fatti per la fase di Familiarity Check (filtri: vedi search)."""
+        return await self.search("semantic", query, n_results, **filters)
+
+    async def search_episodic(self, query: Union[str, Sequence[str]], n_results: int = 3, **filters) -> dict:
+        """
+        Recupero Vettoriale sulle Esperienze per la fase complessa di Recollection.
+        Con `since`/`until` la ricerca è ristretta a una finestra temporale ("ultima settimana"):
+        il costo dipende dall'ampiezza della finestra, non dalla lunghezza della storia.
+        """
+        return await self.search("episodic", query, n_results, **filters)
+
+    async def hybrid_search(
+        self,
+        query: str,
+        n_results: Optional[int] = None,
+        kind: MemoryKind = "semantic",
+        candidates: Optional[int] = None,
+        where: Optional[Where] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        expand_hops: Optional[int] = None,
+        expand_limit: Optional[int] = None,
+    ) -> List[MemoryHit]:
+        """
+        Ricerca ibrida: top-`candidates` vettoriali e top-`candidates` BM25, fusi con Reciprocal Rank
+        Fusion (score = Σ 1 / (k + rank)). I nomi propri e i numeri esatti li trova l'indice lessicale,
+        le parafrasi la ricerca vettoriale; un documento in cima a entrambe vince.
+        I filtri (`where`, `since`/`until`, come in search) valgono per entrambe le classifiche: i
+        candidati lessicali vengono verificati dal backend con un'unica get per id.
+        Con `expand_hops` > 0 (default `link_expand_hops`) ai risultati si aggiungono, in coda, fino a
+        `expand_limit` vicini nel grafo dei z-links (vedi expand_links).
+        """
+        settings = CONFIG.memory.long_term
+        n_results = settings.hybrid_top_k if n_results is None else n_results
+        candidates = max(n_results, candidates or settings.hybrid_candidates)
+        if n_results <= 0:
+            return []
+        query_embeddings = await self.embed([query])
+        filtered = bool(where) or since is not None or until is not None
+        lexical_metadata: Dict[str, dict] = {}
+        async with self._rwlock.read():
+            vector = await self._query_window(
+                kind, query_embeddings, candidates, ("documents", "metadatas"), where, since, until
+            )
+            lexical = await self._run(self.lexical.search, kind, query, candidates)
+            if filtered and lexical:
+                allowed_ids = [doc_id for doc_id, _, _ in lexical]
+                if since is not None or until is not None:
+                    window = await self._run(self.recency.in_window, kind, allowed_ids, since, until)
+                    allowed_ids = [doc_id for doc_id in allowed_ids if doc_id in window]
+                found = await self._run(
+                    self.store.get, kind, ids=allowed_ids, include=["metadatas"], where=where
+                ) if allowed_ids else {"ids": [], "metadatas": []}
+                lexical_metadata = dict(zip(found["ids"], found["metadatas"]))
+                lexical = [row for row in lexical if row[0] in lexical_metadata]
+
+        hits: Dict[str, MemoryHit] = {}
+        vector_ids = vector["ids"][0] if vector["ids"] else []
+        for rank, id_concetto in enumerate(vector_ids, start=1):
+            hits[id_concetto] = MemoryHit(
+                id_concetto=id_concetto,
+                descrizione=vector["documents"][0][rank - 1] or "",
+                metadata=vector["metadatas"][0][rank - 1] or {},
+                score=1 / (settings.rrf_k + rank),
+                vector_rank=rank,
             )
+        for rank, (id_concetto, text, _bm25) in enumerate(lexical, start=1):
+            hit = hits.get(id_concetto)
+            if hit is None:
+                hit = hits[id_concetto] = MemoryHit(id_concetto=id_concetto, descrizione=text)
+            hit.score += 1 / (settings.rrf_k + rank)
+            hit.lexical_rank = rank
+
+        ranked = sorted(hits.values(), key=lambda h: h.score, reverse=True)[:n_results]
+        # Metadati per i risultati arrivati solo dall'indice lessicale (già letti se c'erano filtri)
+        for hit in ranked:
+            if hit.vector_rank is None and hit.id_concetto in lexical_metadata:
+                hit.metadata = lexical_metadata[hit.id_concetto] or {}
+        missing = [h.id_concetto for h in ranked if h.vector_rank is None and h.id_concetto not in lexical_metadata]
+        if missing:
+            async with self._rwlock.read():
+                found = await self._run(self.store.get, kind, ids=missing, include=["metadatas"])
+            metadata = dict(zip(found["ids"], found["metadatas"]))
+            for hit in ranked:
+                if hit.vector_rank is None:
+                    hit.metadata = metadata.get(hit.id_concetto) or {}
 
-    async def search_episodic(self, query: str, n_results: int = 3) -> dict:
-        """Recupero Vettoriale sulle Esperienze per la fase complessa di Recollection."""
-        async with self._lock:
-            return self.episodic_collection.query(
-                query_texts=[query],
-                n_results=n_results
+        expand_hops = settings.link_expand_hops if expand_hops is None else expand_hops
+        if expand_hops > 0 and ranked:
+            ranked += await self.expand_links(
+                kind, ranked, expand_hops, expand_limit, where=where, since=since, until=until
             )
+        return ranked
+
+    async def expand_links(
+        self,
+        kind: MemoryKind,
+        hits: Sequence[MemoryHit],
+        hops: int = 1,
+        limit: Optional[int] = None,
+        where: Optional[Where] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[MemoryHit]:
+        """
+        Richiamo associativo: i vicini dei risultati nel grafo dei z-links, fino a `hops` salti e al
+        più `limit` documenti (default `link_expand_max`). Ogni salto è una lettura per indice dei
+        `link_fanout` legami più forti; il punteggio di un vicino è quello del documento da cui si
+        arriva per il peso del legame, quindi un vicino non supera mai chi lo ha portato.
+        Documenti e metadati dei vicini scelti arrivano dal backend con un'unica get per id.
+        Con `since`/`until` (come in search) si raggiungono solo vicini ingeriti nella finestra.
+        """
+        settings = CONFIG.memory.long_term
+        limit = settings.link_expand_max if limit is None else limit
+        if limit <= 0 or hops <= 0 or not hits:
+            return []
+        scores = {hit.id_concetto: hit.score for hit in hits}
+        expanded: Dict[str, MemoryHit] = {}
+        frontier = list(scores)
+        async with self._rwlock.read():
+            for hop in range(1, hops + 1):
+                links = await self._run(self.links.neighbours, kind, frontier, settings.link_fanout)
+                reached: Dict[str, MemoryHit] = {}
+                for source, target, weight in links:
+                    if target in scores or target in expanded:
+                        continue
+                    score = scores[source] * weight
+                    if target not in reached or score > reached[target].score:
+                        reached[target] = MemoryHit(
+                            id_concetto=target, descrizione="", score=score, link_hops=hop, linked_from=source
+                        )
+                if reached and (since is not None or until is not None):
+                    window = await self._run(self.recency.in_window, kind, list(reached), since, until)
+                    reached = {doc_id: hit for doc_id, hit in reached.items() if doc_id in window}
+                best = sorted(reached.values(), key=lambda h: h.score, reverse=True)[:limit - len(expanded)]
+                for hit in best:
+                    expanded[hit.id_concetto] = hit
+                    scores[hit.id_concetto] = hit.score
+                frontier = [hit.id_concetto for hit in best]
+                if not frontier or len(expanded) >= limit:
+                    break
+            if not expanded:
+                return []
+            found = await self._run(self.store.get, kind, ids=list(expanded), where=where)
+        records = {doc_id: i for i, doc_id in enumerate(found["ids"])}
+        result = []
+        for hit in sorted(expanded.values(), key=lambda h: h.score, reverse=True):
+            i = records.get(hit.id_concetto)
+            if i is None:
+                continue  # escluso dal filtro where (o eliminato nel frattempo)
+            hit.descrizione = found["documents"][i] or ""
+            hit.metadata = found["metadatas"][i] or {}
+            result.append(hit)
+        return result
+
+    async def get_recent(
+        self,
+        kind: MemoryKind = "semantic",
+        limit: int = 50,
+        before_seq: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> dict:
+        """
+        Documenti dal più recente (ordine di ingestione), letti dall'indice di recenza e poi per id
+        dal backend: nessuna scansione della collezione.
+        `since`/`until` sono istanti ISO 8601 UTC (come `ingested_at`), `until` escluso.
+        Paginazione per chiave: passare `next_before_seq` della risposta come `before_seq`
+        (None quando non ci sono altre pagine).
+        """
+        async with self._rwlock.read():
+            rows = await self._run(self.recency.recent, kind, limit, before_seq, since, until)
+            found = await self._run(self.store.get, kind, ids=[doc_id for _, doc_id, _ in rows]) if rows else None
+        records = {}
+        if found is not None:
+            records = {doc_id: (found["documents"][i], found["metadatas"][i]) for i, doc_id in enumerate(found["ids"])}
+        # Il backend restituisce gli id in ordine proprio: si riordina secondo l'indice
+        ordered = [(seq, doc_id, records[doc_id]) for seq, doc_id, _ in rows if doc_id in records]
+        return {
+            "ids": [doc_id for _, doc_id, _ in ordered],
+            "documents": [record[0] for _, _, record in ordered],
+            "metadatas": [record[1] for _, _, record in ordered],
+            "seqs": [seq for seq, _, _ in ordered],
+            "next_before_seq": rows[-1][0] if len(rows) == limit else None,
+        }
+
+    async def scan_recent(
+        self,
+        kind: MemoryKind,
+        limit: int,
+        before_seq: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[Tuple[int, str, Optional[str]]]:
+        """Solo l'indice di recenza: (seq, id, ingested_at) dal più recente, senza leggere il backend."""
+        async with self._rwlock.read():
+            return await self._run(self.recency.recent, kind, limit, before_seq, since, until)
 
     async def get_recent_semantic(self, limit: int = 50) -> dict:
         """Recupera gli ultimi fatti consolidati nella Memoria Semantica per la Dashboard testuale."""
-        async with self._lock:
-            return self.semantic_collection.get(limit=limit)
+        return await self.get_recent("semantic", limit=limit)
 
     async def delete_semantic_node(self, id_concetto: str):
         """Elimina chirurgicamente un fatto dalla memoria a lungo termine."""
-        async with self._lock:
-            self.semantic_collection.delete(ids=[id_concetto])
+        await self.delete_nodes("semantic", [id_concetto])
+
+    async def delete_nodes(self, kind: MemoryKind, ids: Sequence[str]):
+        """Elimina un insieme di documenti (es. episodi sostituiti da un riassunto) in un'unica scrittura."""
+        if not ids:
+            return
+        ids = list(ids)
+        async with self._rwlock.write():
+            await self._run(self.store.delete, kind, ids=ids)
+            await self._run(self.lexical.delete, kind, ids)
+            await self._run(self.recency.delete, kind, ids)
+            await self._run(self.links.delete, kind, ids)
+            for id_concetto in ids:
+                self.changes.publish("delete", id_concetto, {"kind": kind})
 
     async def clear_all(self):
         """Oblio totale: distrugge e ricrea fisicamente le collezioni vettoriali."""
-        async with self._lock:
-            try:
-                self.client.delete_collection(name=CONFIG.memory.long_term.semantic_collection)
-                self.client.delete_collection(name=CONFIG.memory.long_term.episodic_collection)
-            except ValueError:
-                pass # Se la collezione non esiste, chroma alza un value error che possiamo skippare
-            
-            self.semantic_collection = self.client.get_or_create_collection(name=CONFIG.memory.long_term.semantic_collection)
-            self.episodic_collection = self.client.get_or_create_collection(name=CONFIG.memory.long_term.episodic_collection)
+        async with self._rwlock.write():
+            await self._run(self.store.reset)
+            await self._run(self.lexical.clear)
+            await self._run(self.recency.clear)
+            await self._run(self.links.clear)
+            self.changes.publish("clear")
@@ -0,0 +1,525 @@
+"""
+Backend vettoriale nativo della Long-Term Memory (`memory.long_term.provider: native`).
+
+Pensato per collezioni da migliaia (non milioni) di vettori, senza l'albero di dipendenze
+di Chroma e con un avvio che costa quanto aprire un file SQLite:
+
+- vettori: un file float32 per collezione (`<collezione>.f32`, capacity × dim) mappato in
+  memoria con numpy.memmap; cresce per raddoppio, gli slot liberati dalle delete vengono riusati;
+- metadati: SQLite (`native_vectors.sqlite`) con id, slot, documento e metadati JSON;
+  l'ordine di inserimento (rowid) è quello restituito da get(), come in Chroma;
+- ricerca: forza bruta NumPy (distanza L2 al quadrato, come lo spazio di default di Chroma);
+  oltre `native_hnsw_threshold` vettori, se `hnswlib` è installato, un grafo HNSW in RAM.
+  Il grafo si costruisce in un thread in background (nel frattempo si resta sulla forza
+  bruta, le scritture arrivate durante la costruzione vengono riapplicate), è aggiornato a
+  ogni scrittura e salvato su disco alla chiusura: al riavvio si ricarica invece di ricostruirlo.
+
+Filtri: `where` (sintassi di Chroma) diventa una condizione SQL su json_extract dei metadati,
+`ids` una lista di slot; la ricerca considera solo gli slot ammessi (forza bruta sul
+sottoinsieme, oppure HNSW con filtro se il sottoinsieme è grande).
+
+Durabilità: i vettori vengono scritti e sincronizzati su disco prima del commit dei metadati,
+quindi una riga SQLite punta sempre a un vettore già persistito.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from clam.config import LongTermMemoryConfig
+from clam.memory.vector_store import DEFAULT_GET_INCLUDE, DEFAULT_QUERY_INCLUDE, VectorStore, Where
+
+INITIAL_CAPACITY = 1024
+METADATA_FILE = "native_vectors.sqlite"
+
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+try:
+    import hnswlib  # opzionale: senza, la ricerca resta a forza bruta
+except ImportError:
+    hnswlib = None
+
+
+def _where_sql(where: Where) -> Tuple[str, List[Any]]:
+    """Traduce un filtro `where` di Chroma in una condizione SQL sulla colonna JSON `metadata`."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(child) for child in value]
+            if not parts:
+                continue
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            for _, child_params in parts:
+                params.extend(child_params)
+            continue
+        if key.startswith("$"):
+            raise ValueError(f"Operatore where non supportato: '{key}'")
+        field = "json_extract(metadata, ?)"
+        path = '$."' + key.replace('"', '""') + '"'
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for op, operand in conditions.items():
+            if op in _COMPARISONS:
+                clauses.append(f"{field} {_COMPARISONS[op]} ?")
+                params.extend([path, operand])
+            elif op in ("$in", "$nin"):
+                operands = list(operand)
+                if not operands:
+                    clauses.append("0" if op == "$in" else "1")
+                    continue
+                negate = "NOT " if op == "$nin" else ""
+                clauses.append(f"{field} {negate}IN ({','.join('?' * len(operands))})")
+                params.extend([path, *operands])
+            else:
+                raise ValueError(f"Operatore where non supportato: '{op}'")
+    return " AND ".join(clauses) or "1", params
+
+
+class _Collection:
+    """Vettori di una collezione: matrice mappata su file + stato degli slot."""
+
+    def __init__(self, name: str, path: str, dim: Optional[int], capacity: int, slots: Dict[str, int], index_saved: bool):
+        self.name = name
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".hnsw"
+        self.dim = dim
+        self.capacity = capacity
+        self.ids = slots  # id → slot
+        self.slot_ids: Dict[int, str] = {slot: doc_id for doc_id, slot in slots.items()}
+        self.alive = np.zeros(capacity, dtype=bool)
+        if slots:
+            self.alive[list(slots.values())] = True
+        self.high_water = max(slots.values()) + 1 if slots else 0
+        self.free = [int(s) for s in np.flatnonzero(~self.alive[:self.high_water])][::-1]
+        self.matrix: Optional[np.memmap] = None
+        if dim is not None:
+            self.matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        # Norme al quadrato, calcolate alla prima query (l'avvio non legge la matrice)
+        self.sq_norms: Optional[np.ndarray] = None
+        self.hnsw = None
+        self.hnsw_building = False
+        # Scritture arrivate durante la costruzione del grafo: (op, slot, vettori)
+        self.hnsw_pending: List[Tuple[str, np.ndarray, Optional[np.ndarray]]] = []
+        # Il file .hnsw corrisponde ai vettori su disco (azzerato alla prima scrittura)
+        self.index_saved = index_saved
+        # Incrementata da reset(): una costruzione partita prima viene scartata
+        self.generation = 0
+
+    def open(self, dim: int) -> None:
+        """Prima scrittura: fissa la dimensione e crea il file."""
+        self.dim = dim
+        with open(self.path, "wb") as f:
+            f.truncate(self.capacity * dim * 4)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+
+    def grow(self, needed: int) -> None:
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        self.matrix.flush()
+        self.matrix = None
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - self.capacity, dtype=bool)])
+        if self.sq_norms is not None:
+            self.sq_norms = np.concatenate([self.sq_norms, np.zeros(capacity - self.capacity, dtype=np.float32)])
+        self.capacity = capacity
+
+    def allocate(self, count: int) -> List[int]:
+        slots = [self.free.pop() for _ in range(min(count, len(self.free)))]
+        missing = count - len(slots)
+        if missing:
+            self.grow(self.high_water + missing)
+            slots.extend(range(self.high_water, self.high_water + missing))
+            self.high_water += missing
+        return slots
+
+    @property
+    def live(self) -> int:
+        return len(self.ids)
+
+
+class NativeVectorStore(VectorStore):
+    name = "native"
+
+    def __init__(self, settings: LongTermMemoryConfig):
+        os.makedirs(settings.path, exist_ok=True)
+        self._settings = settings
+        self._dir = settings.path
+        self._names = {"semantic": settings.semantic_collection, "episodic": settings.episodic_collection}
+        self._db_lock = threading.Lock()
+        # Norme pigre (letture concorrenti) e passaggio di consegne col thread che costruisce l'HNSW
+        self._lazy_lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(settings.path, METADATA_FILE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY,
+                dim INTEGER,
+                capacity INTEGER NOT NULL,
+                index_saved INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS vectors (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                document TEXT,
+                metadata TEXT,
+                UNIQUE(collection, id),
+                UNIQUE(collection, slot)
+            );
+        ''')
+        self._db.commit()
+        self._collections = {kind: self._load(name) for kind, name in self._names.items()}
+        for col in self._collections.values():
+            self._maybe_build_index(col)
+
+    def _load(self, name: str) -> _Collection:
+        row = self._db.execute("SELECT dim, capacity, index_saved FROM collections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO collections (name, dim, capacity) VALUES (?, NULL, ?)", (name, INITIAL_CAPACITY))
+            self._db.commit()
+            row = (None, INITIAL_CAPACITY, 0)
+        slots = dict(self._db.execute("SELECT id, slot FROM vectors WHERE collection = ?", (name,)))
+        col = _Collection(name, os.path.join(self._dir, f"{name}.f32"), row[0], row[1], slots, bool(row[2]))
+        if hnswlib is not None and col.index_saved and col.dim and os.path.exists(col.index_path):
+            index = hnswlib.Index(space="l2", dim=col.dim)
+            try:
+                index.load_index(col.index_path, max_elements=col.capacity)
+                col.hnsw = index
+            except RuntimeError as e:
+                print(f"[LTM] ⚠️ Grafo HNSW '{name}' illeggibile ({e}): verrà ricostruito")
+        return col
+
+    def _collection(self, kind: str) -> _Collection:
+        try:
+            return self._collections[kind]
+        except KeyError:
+            raise ValueError(f"Collezione sconosciuta: '{kind}'") from None
+
+    @property
+    def max_batch_size(self) -> int:
+        return 100_000
+
+    # --- Scritture ---
+
+    def add(self, kind, ids, documents, metadatas, embeddings):
+        self._write(kind, ids, documents, metadatas, embeddings, overwrite=False)
+
+    def upsert(self, kind, ids, documents, metadatas, embeddings):
+        self._write(kind, ids, documents, metadatas, embeddings, overwrite=True)
+
+    def _write(self, kind, ids, documents, metadatas, embeddings, overwrite: bool) -> None:
+        col = self._collection(kind)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Servono un embedding per id, tutti della stessa dimensione")
+        if col.dim is None:
+            col.open(vectors.shape[1])
+        elif vectors.shape[1] != col.dim:
+            raise ValueError(f"Embedding di dimensione {vectors.shape[1]}, la collezione '{col.name}' ne ha {col.dim}")
+
+        # Duplicati nello stesso blocco: vince l'ultimo
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}
+        if not overwrite:
+            latest = {doc_id: i for doc_id, i in latest.items() if doc_id not in col.ids}
+        if not latest:
+            return
+        new_ids = [doc_id for doc_id in latest if doc_id not in col.ids]
+        for doc_id, slot in zip(new_ids, col.allocate(len(new_ids))):
+            col.ids[doc_id] = slot
+            col.slot_ids[slot] = doc_id
+        slots = np.array([col.ids[doc_id] for doc_id in latest], dtype=np.int64)
+        rows = np.array(list(latest.values()), dtype=np.int64)
+
+        col.matrix[slots] = vectors[rows]
+        col.matrix.flush()
+        col.alive[slots] = True
+        if col.sq_norms is not None:
+            col.sq_norms[slots] = np.einsum("ij,ij->i", vectors[rows], vectors[rows])
+        self._update_index(col, "add", slots, vectors[rows])
+
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE collections SET dim = ?, capacity = ?, index_saved = 0 WHERE name = ?",
+                (col.dim, col.capacity, col.name),
+            )
+            col.index_saved = False
+            self._db.executemany(
+                '''
+                INSERT INTO vectors (collection, id, slot, document, metadata) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(collection, id) DO UPDATE SET document = excluded.document, metadata = excluded.metadata
+                ''',
+                [
+                    (col.name, doc_id, col.ids[doc_id], documents[i], json.dumps(metadatas[i]) if metadatas[i] else None)
+                    for doc_id, i in latest.items()
+                ],
+            )
+            self._db.commit()
+        self._maybe_build_index(col)
+
+    def delete(self, kind, ids):
+        col = self._collection(kind)
+        slots = [col.ids.pop(doc_id) for doc_id in dict.fromkeys(ids) if doc_id in col.ids]
+        if not slots:
+            return
+        with self._db_lock:
+            self._db.executemany("DELETE FROM vectors WHERE collection = ? AND slot = ?", [(col.name, s) for s in slots])
+            self._db.execute("UPDATE collections SET index_saved = 0 WHERE name = ?", (col.name,))
+            self._db.commit()
+            col.index_saved = False
+        for slot in slots:
+            del col.slot_ids[slot]
+        col.alive[slots] = False
+        col.free.extend(slots)
+        self._update_index(col, "delete", np.array(slots, dtype=np.int64))
+
+    def reset(self):
+        with self._db_lock:
+            self._db.execute("DELETE FROM vectors")
+            self._db.execute("UPDATE collections SET dim = NULL, capacity = ?, index_saved = 0", (INITIAL_CAPACITY,))
+            self._db.commit()
+        for col in self._collections.values():
+            col.matrix = None
+            with self._lazy_lock:
+                col.hnsw, col.hnsw_building, col.hnsw_pending = None, False, []
+                col.generation += 1
+            for path in (col.path, col.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._collections = {kind: self._load(name) for kind, name in self._names.items()}
+
+    # --- Letture ---
+
+    def count(self, kind):
+        return self._collection(kind).live
+
+    # --- Grafo HNSW ---
+
+    def _maybe_build_index(self, col: _Collection) -> None:
+        """Avvia la costruzione del grafo in background se la collezione ha superato la soglia."""
+        if hnswlib is None or col.dim is None or col.live < self._settings.native_hnsw_threshold:
+            return
+        with self._lazy_lock:
+            if col.hnsw is not None or col.hnsw_building:
+                return
+            col.hnsw_building = True
+            col.hnsw_pending = []
+            slots = np.flatnonzero(col.alive)
+            vectors = np.array(col.matrix[slots])
+            generation = col.generation
+        threading.Thread(
+            target=self._build_index, args=(col, slots, vectors, generation), name=f"clam-hnsw-{col.name}", daemon=True
+        ).start()
+
+    def _build_index(self, col: _Collection, slots: np.ndarray, vectors: np.ndarray, generation: int) -> None:
+        start = time.perf_counter()
+        try:
+            index = hnswlib.Index(space="l2", dim=vectors.shape[1])
+            index.init_index(
+                max_elements=col.capacity,
+                M=self._settings.native_hnsw_m,
+                ef_construction=self._settings.native_hnsw_ef_construction,
+            )
+            index.add_items(vectors, slots)
+        except Exception as e:
+            print(f"[LTM] ⚠️ Costruzione del grafo HNSW '{col.name}' fallita: {e}. Resta la ricerca esatta.")
+            with self._lazy_lock:
+                if col.generation == generation:
+                    col.hnsw_building = False
+            return
+        with self._lazy_lock:
+            if col.generation != generation:
+                return
+            for op, pending_slots, pending_vectors in col.hnsw_pending:
+                self._apply_to_index(col, index, op, pending_slots, pending_vectors)
+            col.hnsw_pending = []
+            col.hnsw, col.hnsw_building = index, False
+        print(f"[LTM] 🧭 Grafo HNSW '{col.name}' pronto: {len(slots)} vettori in {time.perf_counter() - start:.1f} s")
+
+    def _update_index(self, col: _Collection, op: str, slots: np.ndarray, vectors: Optional[np.ndarray] = None) -> None:
+        with self._lazy_lock:
+            if col.hnsw_building:
+                col.hnsw_pending.append((op, slots.copy(), None if vectors is None else vectors.copy()))
+            elif col.hnsw is not None:
+                self._apply_to_index(col, col.hnsw, op, slots, vectors)
+
+    @staticmethod
+    def _apply_to_index(col: _Collection, index, op: str, slots: np.ndarray, vectors: Optional[np.ndarray]) -> None:
+        if op == "add":
+            if index.get_max_elements() < col.capacity:
+                index.resize_index(col.capacity)
+            # Uno slot riusato dopo una delete viene aggiornato e riattivato da hnswlib
+            index.add_items(vectors, slots)
+            return
+        for slot in slots:
+            try:
+                index.mark_deleted(int(slot))
+            except RuntimeError:
+                pass  # slot aggiunto e rimosso durante la costruzione: mai entrato nel grafo
+
+    def _sq_norms(self, col: _Collection) -> np.ndarray:
+        if col.sq_norms is None:
+            with self._lazy_lock:
+                if col.sq_norms is None:
+                    norms = np.zeros(col.capacity, dtype=np.float32)
+                    block = np.asarray(col.matrix[:col.high_water])
+                    norms[:col.high_water] = np.einsum("ij,ij->i", block, block)
+                    col.sq_norms = norms
+        return col.sq_norms
+
+    def _allowed_slots(self, col: _Collection, where: Optional[Where], ids: Optional[List[str]]) -> Optional[np.ndarray]:
+        """Slot che soddisfano i filtri (None = nessun filtro)."""
+        if not where and ids is None:
+            return None
+        allowed: Optional[set] = None
+        if ids is not None:
+            allowed = {col.ids[doc_id] for doc_id in ids if doc_id in col.ids}
+        if where and allowed != set():
+            sql, params = _where_sql(where)
+            with self._db_lock:
+                rows = self._db.execute(
+                    f"SELECT slot FROM vectors WHERE collection = ? AND {sql}", [col.name, *params]
+                ).fetchall()
+            matched = {slot for (slot,) in rows}
+            allowed = matched if allowed is None else allowed & matched
+        return np.array(sorted(allowed), dtype=np.int64)
+
+    def _search_subset(self, col: _Collection, queries: np.ndarray, k: int, slots: np.ndarray):
+        """Top-k limitato agli slot ammessi."""
+        index = col.hnsw
+        if index is not None and len(slots) > self._settings.native_hnsw_threshold:
+            allowed = set(slots.tolist())
+            index.set_ef(max(self._settings.native_hnsw_ef_search, k))
+            try:
+                labels, distances = index.knn_query(queries, k=k, filter=lambda label: label in allowed)
+                return labels.astype(np.int64), distances
+            except RuntimeError:
+                pass  # filtro troppo selettivo per il grafo: si ripiega sulla forza bruta
+        matrix = np.asarray(col.matrix[slots])
+        distances = self._sq_norms(col)[slots][np.newaxis, :] - 2.0 * (queries @ matrix.T)
+        distances += np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return slots[top], np.maximum(np.take_along_axis(distances, top, axis=1), 0.0)
+
+    def _search(self, col: _Collection, queries: np.ndarray, k: int):
+        index = col.hnsw
+        if index is not None:
+            index.set_ef(max(self._settings.native_hnsw_ef_search, k))
+            slots, distances = index.knn_query(queries, k=k)
+            return slots.astype(np.int64), distances
+        # Forza bruta: |m - q|² = |m|² - 2 m·q + |q|² su tutta la matrice in un'unica moltiplicazione
+        matrix = col.matrix[:col.high_water]
+        distances = self._sq_norms(col)[:col.high_water][np.newaxis, :] - 2.0 * (queries @ matrix.T)
+        distances += np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+        distances[:, ~col.alive[:col.high_water]] = np.inf
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        slots = np.take_along_axis(top, order, axis=1)
+        return slots, np.maximum(np.take_along_axis(distances, slots, axis=1), 0.0)
+
+    def _rows_by_slot(self, col: _Collection, slots: List[int]) -> Dict[int, tuple]:
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT slot, document, metadata FROM vectors WHERE collection = ? AND slot IN ({','.join('?' * len(slots))})",
+                [col.name, *slots],
+            ).fetchall()
+        return {slot: (document, json.loads(metadata) if metadata else None) for slot, document, metadata in rows}
+
+    def query(self, kind, query_embeddings, n_results, include=DEFAULT_QUERY_INCLUDE, where=None, ids=None):
+        col = self._collection(kind)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        result: Dict[str, Any] = {key: ([] if key in include else None) for key in ("documents", "metadatas", "distances", "embeddings")}
+        result["ids"] = []
+        allowed = self._allowed_slots(col, where, ids) if col.live else None
+        k = min(n_results, col.live if allowed is None else len(allowed))
+        if k <= 0:
+            for key in ("ids", *include):
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+        if allowed is None:
+            all_slots, all_distances = self._search(col, queries, k)
+        else:
+            all_slots, all_distances = self._search_subset(col, queries, k, allowed)
+        rows = self._rows_by_slot(col, sorted({int(s) for s in all_slots.ravel()}))
+        for slots, distances in zip(all_slots, all_distances):
+            slots = [int(s) for s in slots]
+            result["ids"].append([col.slot_ids[s] for s in slots])
+            if "documents" in include:
+                result["documents"].append([rows[s][0] for s in slots])
+            if "metadatas" in include:
+                result["metadatas"].append([rows[s][1] for s in slots])
+            if "distances" in include:
+                result["distances"].append([float(d) for d in distances])
+            if "embeddings" in include:
+                result["embeddings"].append(np.asarray(col.matrix[slots]))
+        return result
+
+    def get(self, kind, ids=None, limit=None, offset=None, include=DEFAULT_GET_INCLUDE, where=None):
+        col = self._collection(kind)
+        query = "SELECT id, slot, document, metadata FROM vectors WHERE collection = ?"
+        params: List[Any] = [col.name]
+        if where:
+            sql, where_params = _where_sql(where)
+            query += f" AND {sql}"
+            params.extend(where_params)
+        if ids is not None:
+            if not ids:
+                query += " AND 0"
+            else:
+                query += f" AND id IN ({','.join('?' * len(ids))})"
+                params.extend(ids)
+        query += " ORDER BY rowid"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else int(limit), int(offset or 0)])
+        with self._db_lock:
+            rows = self._db.execute(query, params).fetchall()
+        return {
+            "ids": [r[0] for r in rows],
+            "documents": [r[2] for r in rows] if "documents" in include else None,
+            "metadatas": [json.loads(r[3]) if r[3] else None for r in rows] if "metadatas" in include else None,
+            "embeddings": (
+                np.asarray(col.matrix[[r[1] for r in rows]]) if rows else np.zeros((0, col.dim or 0), dtype=np.float32)
+            ) if "embeddings" in include else None,
+        }
+
+    def close(self):
+        for col in self._collections.values():
+            if col.matrix is not None:
+                col.matrix.flush()
+            with self._lazy_lock:
+                index = None if col.hnsw_building else col.hnsw
+            if index is not None and not col.index_saved:
+                index.save_index(col.index_path)
+                with self._db_lock:
+                    self._db.execute("UPDATE collections SET index_saved = 1 WHERE name = ?", (col.name,))
+                    self._db.commit()
+        with self._db_lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "collections": {
+                kind: {
+                    "count": col.live,
+                    "dim": col.dim,
+                    "capacity": col.capacity,
+                    "index": "hnsw" if col.hnsw is not None else "hnsw_building" if col.hnsw_building else "brute_force",
+                }
+                for kind, col in self._collections.items()
+            },
+            "hnswlib": hnswlib is not None,
+        }
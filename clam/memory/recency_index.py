@@ -0,0 +1,172 @@
+"""
+Indice di recenza (SQLite) delle collezioni della Long-Term Memory.
+
+Chroma (e il backend nativo) restituiscono i documenti in ordine di archiviazione, non di
+arrivo: "gli ultimi N fatti" non si possono chiedere al backend vettoriale. Ogni documento
+riceve all'ingestione un numero di sequenza crescente e un timestamp UTC (ISO 8601, come nel
+GraphDB), copiati anche nei suoi metadati (`ingest_seq`, `ingested_at`); questa tabella li
+indicizza per rispondere senza scorrere la collezione a:
+
+- ultimi N (ORDER BY seq DESC sull'indice della chiave primaria);
+- intervalli temporali (indice su kind + ingested_at);
+- paginazione per chiave (`before_seq`: la pagina successiva parte dall'ultimo seq visto,
+  stabile anche se nel frattempo arrivano documenti nuovi).
+
+Chiamate sincrone: girano nel thread pool della LTM.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (seq, id, ingested_at)
+RecencyRow = Tuple[int, str, Optional[str]]
+
+
+class RecencyIndex:
+    """Sequenza e timestamp di ingestione dei documenti LTM, partizionati per collezione (`kind`)."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # AUTOINCREMENT: un seq non viene mai riusato, nemmeno dopo delete o clear
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS ltm_recency (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                ingested_at TEXT,
+                UNIQUE(kind, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_ltm_recency_time ON ltm_recency(kind, ingested_at);
+        ''')
+        self._db.commit()
+
+    def register(self, kind: str, docs: Sequence[Tuple[str, str]], replace: bool) -> Dict[str, Tuple[int, str]]:
+        """
+        Registra (id, ingested_at) e restituisce id → (seq, ingested_at) effettivi.
+        `replace=False` (semantica di add): un id già presente conserva seq e timestamp.
+        `replace=True` (semantica di upsert): il documento riceve un seq nuovo, torna in cima ai recenti.
+        """
+        assigned: Dict[str, Tuple[int, str]] = {}
+        with self._lock:
+            for doc_id, ingested_at in docs:
+                if replace:
+                    self._db.execute("DELETE FROM ltm_recency WHERE kind = ? AND id = ?", (kind, doc_id))
+                row = self._db.execute(
+                    '''
+                    INSERT INTO ltm_recency (kind, id, ingested_at) VALUES (?, ?, ?)
+                    ON CONFLICT(kind, id) DO NOTHING
+                    RETURNING seq, ingested_at
+                    ''',
+                    (kind, doc_id, ingested_at),
+                ).fetchone()
+                if row is None:
+                    row = self._db.execute(
+                        "SELECT seq, ingested_at FROM ltm_recency WHERE kind = ? AND id = ?", (kind, doc_id)
+                    ).fetchone()
+                assigned[doc_id] = (row[0], row[1])
+            self._db.commit()
+        return assigned
+
+    def rebuild(self, kind: str, docs: Iterable[Tuple[str, Optional[int], Optional[str]]]) -> int:
+        """
+        Ricostruisce la partizione da (id, ingest_seq, ingested_at) letti dai metadati, in ordine di
+        archiviazione. I documenti già numerati riprendono il loro seq; quelli precedenti all'indice
+        ricevono seq negativi nell'ordine di archiviazione, quindi risultano i più vecchi.
+        """
+        docs = list(docs)
+        legacy = [d for d in docs if d[1] is None]
+        rows = [(seq, kind, doc_id, ingested_at) for doc_id, seq, ingested_at in docs if seq is not None]
+        rows += [(i - len(legacy), kind, doc_id, ingested_at) for i, (doc_id, _, ingested_at) in enumerate(legacy)]
+        with self._lock:
+            self._db.execute("DELETE FROM ltm_recency WHERE kind = ?", (kind,))
+            # OR REPLACE: un seq duplicato (metadati copiati a mano) tiene l'ultimo documento
+            self._db.executemany(
+                "INSERT OR REPLACE INTO ltm_recency (seq, kind, id, ingested_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+        return len(rows)
+
+    def delete(self, kind: str, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM ltm_recency WHERE kind = ? AND id = ?", [(kind, i) for i in ids])
+            self._db.commit()
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        with self._lock:
+            if kind is None:
+                self._db.execute("DELETE FROM ltm_recency")
+            else:
+                self._db.execute("DELETE FROM ltm_recency WHERE kind = ?", (kind,))
+            self._db.commit()
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM ltm_recency WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def recent(
+        self,
+        kind: str,
+        limit: int,
+        before_seq: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[RecencyRow]:
+        """
+        Documenti dal più recente, al massimo `limit`. `before_seq` è il cursore della pagina
+        precedente; `since` (incluso) e `until` (escluso) filtrano per istante di ingestione.
+        """
+        clauses, params = ["kind = ?"], [kind]
+        if before_seq is not None:
+            clauses.append("seq < ?")
+            params.append(before_seq)
+        if since is not None:
+            clauses.append("ingested_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ingested_at < ?")
+            params.append(until)
+        with self._lock:
+            return self._db.execute(
+                f"SELECT seq, id, ingested_at FROM ltm_recency WHERE {' AND '.join(clauses)} ORDER BY seq DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+
+    def in_window(
+        self, kind: str, ids: Sequence[str], since: Optional[str] = None, until: Optional[str] = None
+    ) -> set[str]:
+        """Gli id, tra quelli dati, ingeriti nella finestra `since` (incluso) - `until` (escluso)."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ingested_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ingested_at < ?")
+            params.append(until)
+        window = "".join(f" AND {clause}" for clause in clauses)
+        found: set[str] = set()
+        ids = list(ids)
+        with self._lock:
+            # A blocchi: resta sotto il limite di parametri di SQLite
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                found.update(row[0] for row in self._db.execute(
+                    f"SELECT id FROM ltm_recency WHERE kind = ? AND id IN ({','.join('?' * len(chunk))}){window}",
+                    (kind, *chunk, *params),
+                ))
+        return found
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT kind, COUNT(*) FROM ltm_recency GROUP BY kind").fetchall()
+        return dict(rows)
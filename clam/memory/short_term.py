@@ -1,21 +1,55 @@
 import asyncio
+import os
+import time
 import aiosqlite
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from pydantic import BaseModel
 from clam.core.models import MemoryNode
+from clam.config import CONFIG, resolve_data_path
+from clam.memory.sql_query import KeysetCursor, build_select, next_cursor
+from clam.memory.change_feed import ChangeFeed
+
+# Colonne della tabella memory_nodes, nell'ordine dei campi di MemoryNode.
+NODE_COLUMNS = (
+    "id_concetto", "descrizione", "confidence_score",
+    "timestamp_creazione", "timestamp_ultimo_accesso", "contesto_origine",
+)
+
+class SnapshotReport(BaseModel):
+    """Esito di uno snapshot dello scratchpad (per log e telemetria)."""
+    path: str
+    nodes: int
+    size_bytes: int
+    duration_ms: float
 
 class ShortTermBuffer:
     """
     Gestisce la Memoria Volatile (Scratchpad) usando aiosqlite in memory.
     Implementa rigorosamente asyncio.Lock() per prevenire race conditions letali
     sui database asincroni (Direttiva '10-Year Rule' sulla sicurezza concorrenziale).
+
+    Warm restart: il buffer viene copiato periodicamente su file con la Backup API di SQLite
+    (eseguita nel thread di aiosqlite, quindi fuori dall'event loop) e ripristinato al connect.
+    Così un riavvio (anche un --reload di uvicorn) non butta via i nodi non ancora promossi.
     """
     def __init__(self):
         self._db: Optional[aiosqlite.Connection] = None
         self._lock = asyncio.Lock()
 
+        snapshot_path = CONFIG.memory.short_term.snapshot_path
+        self.snapshot_path: Optional[str] = resolve_data_path(snapshot_path) if snapshot_path else None
+        # Contatori di mutazione: lo snapshot viene saltato se nulla è cambiato dall'ultimo.
+        self._mutations = 0
+        self._snapshot_mutations = 0
+        self.last_snapshot: Optional[SnapshotReport] = None
+        # Log ordinato delle mutazioni (insert/update/delete/clear) per i consumer incrementali.
+        self.changes = ChangeFeed("stm", CONFIG.memory.short_term.change_feed_retention)
+
     async def connect(self):
-        """Inizializza il database in RAM e crea la tabella se non esiste."""
+        """Inizializza il database in RAM, ripristina l'eventuale snapshot e crea la tabella se non esiste."""
         self._db = await aiosqlite.connect(":memory:")
+        await self._restore_snapshot()
         await self._db.execute('''
             CREATE TABLE IF NOT EXISTS memory_nodes (
                 id_concetto TEXT PRIMARY KEY,
@@ -26,6 +60,8 @@ class ShortTermBuffer:
                 contesto_origine TEXT
             )
         ''')
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_nodes_score ON memory_nodes(confidence_score)')
+        await self._db.execute('CREATE INDEX IF NOT EXISTS idx_nodes_last_access ON memory_nodes(timestamp_ultimo_accesso)')
         await self._db.commit()
 
     async def disconnect(self):
@@ -33,6 +69,69 @@ class ShortTermBuffer:
         if self._db:
             await self._db.close()
 
+    async def _restore_snapshot(self):
+        """Warm restart: copia lo snapshot su disco dentro il database in RAM appena aperto."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+
+        start = time.perf_counter()
+        try:
+            source = await aiosqlite.connect(self.snapshot_path)
+            try:
+                await source.backup(self._db)
+            finally:
+                await source.close()
+            async with self._db.execute('SELECT COUNT(*) FROM memory_nodes') as cursor:
+                (count,) = await cursor.fetchone()
+        except Exception as e:
+            # Snapshot corrotto o di uno schema incompatibile: si riparte da un buffer vuoto.
+            print(f"[STM Snapshot] Ripristino fallito ({e}). Avvio con buffer vuoto.")
+            await self._db.close()
+            self._db = await aiosqlite.connect(":memory:")
+            return
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"[STM Snapshot] ♻️ Ripristinati {count} nodi da {self.snapshot_path} in {elapsed_ms:.1f} ms")
+
+    async def snapshot(self, force: bool = False) -> Optional[SnapshotReport]:
+        """
+        Salva una copia consistente del buffer su disco.
+        Viene saltato (ritorna None) se il buffer non è cambiato dall'ultimo snapshot, salvo force=True.
+        La scrittura avviene su un file temporaneo poi rinominato atomicamente, così un crash
+        a metà non lascia mai uno snapshot troncato.
+        """
+        if not self.snapshot_path:
+            return None
+
+        tmp_path = f"{self.snapshot_path}.tmp"
+        async with self._lock:
+            if not self._db:
+                raise RuntimeError("Errore: Database non connesso.")
+            if not force and self._mutations == self._snapshot_mutations:
+                return None
+
+            mutations = self._mutations
+            start = time.perf_counter()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            target = await aiosqlite.connect(tmp_path)
+            try:
+                await self._db.backup(target)
+            finally:
+                await target.close()
+            async with self._db.execute('SELECT COUNT(*) FROM memory_nodes') as cursor:
+                (count,) = await cursor.fetchone()
+
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot_mutations = mutations
+        self.last_snapshot = SnapshotReport(
+            path=self.snapshot_path,
+            nodes=count,
+            size_bytes=os.path.getsize(self.snapshot_path),
+            duration_ms=(time.perf_counter() - start) * 1000,
+        )
+        return self.last_snapshot
+
     async def add_node(self, node: MemoryNode):
         """Aggiunge in modo sicuro un nuovo nodo al buffer intercettando eventuali collisioni di ID."""
         async with self._lock:
@@ -52,47 +151,152 @@ class ShortTermBuffer:
                 node.contesto_origine
             ))
             await self._db.commit()
+            self._mutations += 1
+            self.changes.publish("insert", node.id_concetto, node.model_dump())
+
+    async def add_nodes(self, nodes: Sequence[MemoryNode]):
+        """Inserimento massivo (import): una sola transazione; i nodi già presenti vengono sovrascritti."""
+        if not nodes:
+            return
+        async with self._lock:
+            if not self._db:
+                raise RuntimeError("Errore: Impossibile aggiungere nodi. Database non connesso.")
+            await self._db.executemany(f'''
+                INSERT OR REPLACE INTO memory_nodes ({", ".join(NODE_COLUMNS)})
+                VALUES ({", ".join("?" for _ in NODE_COLUMNS)})
+            ''', [tuple(getattr(node, col) for col in NODE_COLUMNS) for node in nodes])
+            await self._db.commit()
+            self._mutations += len(nodes)
+            for node in nodes:
+                self.changes.publish("insert", node.id_concetto, node.model_dump())
 
     async def get_all_nodes(self) -> List[MemoryNode]:
-        """Tira fuori tutti i nodi dal buffer (utile per GC e Critic da ciclare)."""
+        """Tira fuori tutti i nodi dal buffer. Preferire query_nodes/iter_nodes con filtri mirati."""
+        return await self.query_nodes()
+
+    @staticmethod
+    def _node_filters(
+        min_score: Optional[int] = None,
+        max_score: Optional[int] = None,
+        min_age_minutes: Optional[float] = None,
+        max_age_minutes: Optional[float] = None,
+        contesto_origine: Optional[str] = None,
+    ) -> Tuple[List[str], List[Any]]:
+        """Traduce i filtri in clausole WHERE. L'età è misurata dall'ultimo accesso, come nel GC."""
+        where: List[str] = []
+        params: List[Any] = []
+        if min_score is not None:
+            where.append("confidence_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("confidence_score <= ?")
+            params.append(max_score)
+
+        now = datetime.now(timezone.utc)
+        if min_age_minutes is not None:
+            where.append("timestamp_ultimo_accesso <= ?")
+            params.append((now - timedelta(minutes=min_age_minutes)).isoformat())
+        if max_age_minutes is not None:
+            where.append("timestamp_ultimo_accesso >= ?")
+            params.append((now - timedelta(minutes=max_age_minutes)).isoformat())
+        if contesto_origine is not None:
+            where.append("contesto_origine = ?")
+            params.append(contesto_origine)
+        return where, params
+
+    async def query_nodes(
+        self,
+        min_score: Optional[int] = None,
+        max_score: Optional[int] = None,
+        min_age_minutes: Optional[float] = None,
+        max_age_minutes: Optional[float] = None,
+        contesto_origine: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        order_by: str = "timestamp_creazione",
+        descending: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[KeysetCursor] = None,
+    ) -> List[Union[MemoryNode, Dict[str, Any]]]:
+        """
+        Lettura filtrata del buffer.
+        Senza `columns` restituisce MemoryNode completi; con `columns` restituisce dict leggeri
+        con le sole colonne richieste (più id_concetto e la colonna di ordinamento, usate dal cursore).
+        `after` è il cursore keyset (valore_ordinamento, id_concetto) dell'ultima riga della pagina precedente.
+        """
+        where, params = self._node_filters(min_score, max_score, min_age_minutes, max_age_minutes, contesto_origine)
+        sql, params, selected = build_select(
+            "memory_nodes", "id_concetto", NODE_COLUMNS, where, params,
+            columns=columns, order_by=order_by, descending=descending, limit=limit, after=after,
+        )
         async with self._lock:
             if not self._db:
                 raise RuntimeError("Errore: Impossibile leggere nodi. Database non connesso.")
-            
-            async with self._db.execute('SELECT * FROM memory_nodes') as cursor:
+            async with self._db.execute(sql, params) as cursor:
                 rows = await cursor.fetchall()
-                
-            nodes = []
-            for row in rows:
-                nodes.append(MemoryNode(
-                    id_concetto=row[0],
-                    descrizione=row[1],
-                    confidence_score=row[2],
-                    timestamp_creazione=row[3],
-                    timestamp_ultimo_accesso=row[4],
-                    contesto_origine=row[5]
-                ))
-            return nodes
+
+        if columns:
+            return [dict(zip(selected, row)) for row in rows]
+        return [MemoryNode(**dict(zip(selected, row))) for row in rows]
+
+    async def iter_nodes(self, page_size: int = 500, **query) -> AsyncIterator[Union[MemoryNode, Dict[str, Any]]]:
+        """
+        Streaming a pagine (keyset) sopra query_nodes: il lock viene preso solo per la lettura
+        di ogni pagina, quindi chi consuma può scrivere sul buffer durante l'iterazione.
+        """
+        order_by = query.get("order_by", "timestamp_creazione")
+        after: Optional[KeysetCursor] = query.pop("after", None)
+        while True:
+            page = await self.query_nodes(limit=page_size, after=after, **query)
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            after = next_cursor(last if isinstance(last, dict) else last.model_dump(), "id_concetto", order_by)
+
+    async def count_nodes(self, **filters) -> int:
+        """Conta i nodi che soddisfano i filtri (stessi argomenti di query_nodes)."""
+        where, params = self._node_filters(**filters)
+        sql = "SELECT COUNT(*) FROM memory_nodes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        async with self._lock:
+            if not self._db:
+                raise RuntimeError("Errore: Impossibile leggere nodi. Database non connesso.")
+            async with self._db.execute(sql, params) as cursor:
+                (count,) = await cursor.fetchone()
+        return count
 
     async def update_score(self, id_concetto: str, delta: int, new_timestamp: str):
         """Aggiorna lo score (positivo o negativo) di un nodo. Invocato tipicamente dal Critic o in rinforzo."""
         async with self._lock:
             if not self._db:
                 raise RuntimeError("Errore: Database non connesso.")
-            await self._db.execute('''
+            async with self._db.execute(f'''
                 UPDATE memory_nodes 
                 SET confidence_score = confidence_score + ?, timestamp_ultimo_accesso = ?
                 WHERE id_concetto = ?
-            ''', (delta, new_timestamp, id_concetto))
+                RETURNING {", ".join(NODE_COLUMNS)}
+            ''', (delta, new_timestamp, id_concetto)) as cursor:
+                updated = await cursor.fetchone()
             await self._db.commit()
+            self._mutations += 1
+            if updated:
+                self.changes.publish("update", id_concetto, dict(zip(NODE_COLUMNS, updated)))
 
     async def delete_node(self, id_concetto: str):
         """Oblio: Rimuove fisicamente il nodo dal buffer. Usato durante la promozione o il decadimento."""
         async with self._lock:
             if not self._db:
                 raise RuntimeError("Errore: Database non connesso.")
-            await self._db.execute('DELETE FROM memory_nodes WHERE id_concetto = ?', (id_concetto,))
+            async with self._db.execute(
+                f"DELETE FROM memory_nodes WHERE id_concetto = ? RETURNING {', '.join(NODE_COLUMNS)}", (id_concetto,)
+            ) as cursor:
+                deleted = await cursor.fetchone()
             await self._db.commit()
+            self._mutations += 1
+            if deleted:
+                self.changes.publish("delete", id_concetto, dict(zip(NODE_COLUMNS, deleted)))
 
     async def clear_all(self):
         """Svuota completamente il buffer in RAM (Formattazione)."""
@@ -101,3 +305,5 @@ class ShortTermBuffer:
                 raise RuntimeError("Errore: Database non connesso.")
             await self._db.execute('DELETE FROM memory_nodes')
             await self._db.commit()
+            self._mutations += 1
+            self.changes.publish("clear")
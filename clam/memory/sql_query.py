@@ -0,0 +1,75 @@
+"""
+Costruttore di SELECT condiviso da ShortTermBuffer e GraphDB.
+
+Filtri, proiezione di colonne, ordinamento e paginazione keyset vengono tradotti
+in SQL parametrizzato qui, così i due store espongono la stessa semantica di query
+senza duplicare la logica (e senza mai interpolare input dell'utente nella stringa SQL).
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Cursore keyset: (valore della colonna di ordinamento, chiave primaria) dell'ultima riga letta.
+KeysetCursor = Tuple[Any, str]
+
+
+def build_select(
+    table: str,
+    primary_key: str,
+    allowed_columns: Sequence[str],
+    where: List[str],
+    params: List[Any],
+    columns: Optional[Sequence[str]] = None,
+    order_by: Optional[str] = None,
+    descending: bool = False,
+    limit: Optional[int] = None,
+    after: Optional[KeysetCursor] = None,
+) -> Tuple[str, List[Any], List[str]]:
+    """
+    Compone la query e restituisce (sql, parametri, colonne selezionate).
+
+    La chiave primaria e la colonna di ordinamento vengono sempre incluse nella proiezione:
+    servono a costruire il cursore della pagina successiva.
+    """
+    order_col = order_by or primary_key
+    for col in list(columns or []) + [order_col]:
+        if col not in allowed_columns:
+            raise ValueError(f"Colonna non ammessa: '{col}'")
+
+    if columns:
+        selected = list(dict.fromkeys([primary_key, order_col, *columns]))
+    else:
+        selected = list(allowed_columns)
+
+    clauses = list(where)
+    query_params = list(params)
+    if after is not None:
+        # Row-value comparison: (order_col, pk) > (?, ?) sfrutta l'indice senza OFFSET.
+        op = "<" if descending else ">"
+        if order_col == primary_key:
+            clauses.append(f"{primary_key} {op} ?")
+            query_params.append(after[1])
+        else:
+            clauses.append(f"({order_col}, {primary_key}) {op} (?, ?)")
+            query_params.extend([after[0], after[1]])
+
+    sql = f"SELECT {', '.join(selected)} FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+
+    direction = "DESC" if descending else "ASC"
+    if order_col == primary_key:
+        sql += f" ORDER BY {primary_key} {direction}"
+    else:
+        sql += f" ORDER BY {order_col} {direction}, {primary_key} {direction}"
+
+    if limit is not None:
+        sql += " LIMIT ?"
+        query_params.append(int(limit))
+
+    return sql, query_params, selected
+
+
+def next_cursor(row: dict, primary_key: str, order_by: Optional[str]) -> KeysetCursor:
+    """Cursore keyset da passare come `after` per leggere la pagina successiva."""
+    order_col = order_by or primary_key
+    return (row[order_col], row[primary_key])
@@ -0,0 +1,144 @@
+"""
+Backend vettoriale della Long-Term Memory (`memory.long_term.provider`).
+
+LongTermMemory parla con una VectorStore sincrona (eseguita nel suo thread pool) che
+espone le poche operazioni che CLAM usa davvero: add/upsert, query per vettore, get a
+pagine o per id, delete, count, reset. I risultati hanno la stessa forma dei dict di
+Chroma ({"ids": ..., "documents": ..., "metadatas": ..., "distances"/"embeddings": ...}),
+così i consumer non dipendono dal backend.
+
+Filtri (spinti nel backend, non applicati dopo in Python):
+- `where`: condizioni sui metadati nella sintassi di Chroma, es. {"contesto_origine": "User Prompt"},
+  {"original_score": {"$gte": 2}}, {"$and": [...]} / {"$or": [...]}; operatori $eq $ne $gt $gte
+  $lt $lte $in $nin;
+- `ids`: la ricerca considera solo questi documenti (es. la finestra temporale dell'indice di recenza).
+
+- "chromadb": PersistentClient di Chroma, importato e aperto solo al primo utilizzo.
+- "native": matrice float32 memory-mapped + metadati SQLite (clam/memory/native_vector_store.py).
+
+Cambiare provider non migra i dati: usare `python -m clam.memory.bulk_io export/import`.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from clam.config import LongTermMemoryConfig
+
+Include = Sequence[str]
+Where = Dict[str, Any]
+DEFAULT_GET_INCLUDE = ("documents", "metadatas")
+DEFAULT_QUERY_INCLUDE = ("documents", "metadatas", "distances")
+
+
+class VectorStore:
+    """Interfaccia comune dei backend. `kind` è la collezione CoALA ("semantic" / "episodic")."""
+
+    name: str = ""
+
+    @property
+    def max_batch_size(self) -> int:
+        raise NotImplementedError
+
+    def add(self, kind: str, ids: List[str], documents: List[str], metadatas: List[Optional[dict]],
+            embeddings: List[Any]) -> None:
+        """Inserisce i record nuovi; gli id già presenti restano invariati (semantica di Chroma.add)."""
+        raise NotImplementedError
+
+    def upsert(self, kind: str, ids: List[str], documents: List[str], metadatas: List[Optional[dict]],
+               embeddings: List[Any]) -> None:
+        raise NotImplementedError
+
+    def query(self, kind: str, query_embeddings: List[Any], n_results: int,
+              include: Include = DEFAULT_QUERY_INCLUDE, where: Optional[Where] = None,
+              ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Top-`n_results` per ogni query tra i documenti che soddisfano `where` e (se dati) appartengono a `ids`."""
+        raise NotImplementedError
+
+    def get(self, kind: str, ids: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Include = DEFAULT_GET_INCLUDE,
+            where: Optional[Where] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def delete(self, kind: str, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def count(self, kind: str) -> int:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Svuota entrambe le collezioni."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"provider": self.name}
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB in locale con persistenza su disco."""
+
+    name = "chromadb"
+
+    def __init__(self, settings: LongTermMemoryConfig):
+        # Import qui: chromadb e il suo albero di dipendenze si caricano solo se il provider è in uso
+        import chromadb
+
+        self._names = {"semantic": settings.semantic_collection, "episodic": settings.episodic_collection}
+        # Il path di persistenza evita di fargli scaricare un server intero, creando DB localmente.
+        self.client = chromadb.PersistentClient(path=settings.path)
+        self._collections = {kind: self.client.get_or_create_collection(name=name) for kind, name in self._names.items()}
+
+    def _collection(self, kind: str):
+        try:
+            return self._collections[kind]
+        except KeyError:
+            raise ValueError(f"Collezione sconosciuta: '{kind}'") from None
+
+    @property
+    def max_batch_size(self) -> int:
+        return self.client.get_max_batch_size()
+
+    def add(self, kind, ids, documents, metadatas, embeddings):
+        # Chroma rifiuta i metadati vuoti
+        self._collection(kind).add(
+            ids=ids, documents=documents, metadatas=[m or None for m in metadatas], embeddings=embeddings
+        )
+
+    def upsert(self, kind, ids, documents, metadatas, embeddings):
+        self._collection(kind).upsert(
+            ids=ids, documents=documents, metadatas=[m or None for m in metadatas], embeddings=embeddings
+        )
+
+    def query(self, kind, query_embeddings, n_results, include=DEFAULT_QUERY_INCLUDE, where=None, ids=None):
+        return self._collection(kind).query(
+            query_embeddings=query_embeddings, n_results=n_results, include=list(include), where=where or None, ids=ids
+        )
+
+    def get(self, kind, ids=None, limit=None, offset=None, include=DEFAULT_GET_INCLUDE, where=None):
+        return self._collection(kind).get(
+            ids=ids, limit=limit, offset=offset, include=list(include), where=where or None
+        )
+
+    def delete(self, kind, ids):
+        self._collection(kind).delete(ids=ids)
+
+    def count(self, kind):
+        return self._collection(kind).count()
+
+    def reset(self):
+        for name in self._names.values():
+            try:
+                self.client.delete_collection(name=name)
+            except ValueError:
+                pass # Se la collezione non esiste, chroma alza un value error che possiamo skippare
+        self._collections = {kind: self.client.get_or_create_collection(name=name) for kind, name in self._names.items()}
+
+
+def create_vector_store(settings: LongTermMemoryConfig) -> VectorStore:
+    if settings.provider == "chromadb":
+        return ChromaVectorStore(settings)
+    if settings.provider == "native":
+        from clam.memory.native_vector_store import NativeVectorStore
+        return NativeVectorStore(settings)
+    raise ValueError(f"Provider LTM sconosciuto: '{settings.provider}' (chromadb | native)")